@@ -0,0 +1,73 @@
+"""Steady-state tracemalloc peak of scan_target and scan_targets (every mode) per ADB granularity.
+
+The scan path works in the ADB's preallocated arena, so once the ADB exists the peak of a scan must not grow
+with the pixel count N; exits with status 1 if it grows by more than --tolerance-kib from the smallest to the
+largest granularity.
+
+    python -m benchmarks.allocations [--granularities 128x64 256x124 512x256] [--reach 4.8] [--scenes 3]
+"""
+
+import argparse
+import sys
+
+from benchmarks.scan import TARGET_IDS, _peak_kib, nearest_target, scenes
+from visibility_scanner.scanner import SCAN_MODES, scan_target, scan_targets
+from visibility_scanner.world_scanners import BlockCache, get_area
+
+
+def _ops(eye, occluders, granularity):
+    ops = {f"scan_targets[{mode}]": (lambda mode=mode: scan_targets(eye, TARGET_IDS, occluders,
+                                                                    adb_granularity=granularity, mode=mode))
+           for mode in SCAN_MODES}
+    target = nearest_target(occluders, eye)
+    if target is not None:
+        ops["scan_target"] = lambda: scan_target(eye, target, occluders, adb_granularity=granularity)
+    return ops
+
+
+def run(granularities, reach: float = 4.8, n_scenes: int = 3, repeats: int = 3):
+    """Peak KiB per (op, granularity): the largest over the scenes of the steady-state calls."""
+    world = [(eye, get_area(eye, reach=reach, cache=BlockCache())) for eye in scenes(n_scenes)]
+    peaks = {}
+    for granularity in granularities:
+        for eye, occluders in world:
+            for op, fn in _ops(eye, occluders, granularity).items():
+                # the first call builds the ADB, its arena and the compiled kernels
+                fn()
+                for _ in range(repeats):
+                    key = (op, granularity)
+                    peaks[key] = max(peaks.get(key, 0.0), _peak_kib(fn))
+    return peaks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--granularities", nargs="+", default=["128x64", "256x124", "512x256"])
+    parser.add_argument("--reach", type=float, default=4.8)
+    parser.add_argument("--scenes", type=int, default=3)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--tolerance-kib", type=float, default=64.0)
+    args = parser.parse_args()
+
+    granularities = [tuple(int(v) for v in g.lower().split("x")) for g in args.granularities]
+    granularities.sort(key=lambda g: g[0] * g[1])
+    peaks = run(granularities, args.reach, args.scenes, args.repeats)
+
+    small, large = granularities[0], granularities[-1]
+    ops = sorted({op for op, _ in peaks})
+    print(f"{'op':>25} " + " ".join(f"{g[0]}x{g[1]}".rjust(10) for g in granularities) + f" {'growth':>10}")
+    failed = False
+    for op in ops:
+        row = [peaks.get((op, g)) for g in granularities]
+        growth = row[-1] - row[0] if row[0] is not None and row[-1] is not None else 0.0
+        bad = growth > args.tolerance_kib
+        failed |= bad
+        print(f"{op:>25} " + " ".join(f"{p:>7.0f}KiB" if p is not None else f"{'-':>10}" for p in row)
+              + f" {growth:>+7.0f}KiB" + (" FAIL" if bad else ""))
+    n_small, n_large = small[0] * small[1], large[0] * large[1]
+    print(f"N {n_small} -> {n_large}; peaks may not grow by more than {args.tolerance_kib:.0f}KiB")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
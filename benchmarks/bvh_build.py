@@ -0,0 +1,104 @@
+"""Build + traversal cost of the BVH builders on unit-cube occluders.
+
+    python -m benchmarks.bvh_build [--sizes 2000 5000 ...] [--granularity 256 124]
+"""
+
+import argparse
+import math
+import time
+
+import numpy as np
+
+from visibility_scanner.scanner import (
+    HighResADB,
+    build_bvh,
+    build_bvh_sah_nb,
+    rasterize_with_bvh_nb,
+)
+
+
+def unit_cube_prims(n: int, seed: int = 0):
+    """n distinct unit blocks filling roughly half of a cube centred on the origin."""
+    rng = np.random.default_rng(seed)
+    side = int(math.ceil((2.0 * n) ** (1.0 / 3.0)))
+    cells = rng.choice(side ** 3, size=n, replace=False)
+    x = cells % side
+    y = (cells // side) % side
+    z = cells // (side * side)
+    prim_min = np.stack((x, y, z), axis=1).astype(np.float64) - side // 2
+    prim_max = prim_min + 1.0
+    prim_id = np.arange(n, dtype=np.int32)
+    return prim_min, prim_max, prim_id
+
+
+def _best_of(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(sizes, granularity=(256, 124), repeats=3):
+    adb = HighResADB(*granularity)
+    directions = np.ascontiguousarray(np.stack((adb.dx, adb.dy, adb.dz), axis=1).astype(np.float64))
+    eye = np.array([0.5, 0.62, 0.5], dtype=np.float64)
+
+    # compile outside the timed region
+    warm_min, warm_max, warm_id = unit_cube_prims(64)
+    warm = build_bvh_sah_nb(warm_min, warm_max, 4, 12)
+    rasterize_with_bvh_nb(eye, directions, *warm[:7], warm_min, warm_max, warm_id,
+                          np.full(adb.N, np.inf), np.full(adb.N, -1, dtype=np.int32), np.inf)
+
+    rows = []
+    for n in sizes:
+        prim_min, prim_max, prim_id = unit_cube_prims(n)
+        # keep the eye in an empty cell so rays actually travel through the scene
+        keep = ~np.all(prim_min == np.floor(eye), axis=1)
+        prim_min, prim_max, prim_id = prim_min[keep], prim_max[keep], np.arange(int(keep.sum()), dtype=np.int32)
+
+        row = {"prims": int(prim_min.shape[0])}
+        depths = {}
+        builders = {
+            "median_py": lambda: build_bvh(prim_min, prim_max, prim_id, max_leaf_size=4),
+            "sah_nb": lambda: build_bvh_sah_nb(prim_min, prim_max, 4, 12),
+        }
+        for name, build in builders.items():
+            row[f"{name}_build_ms"] = 1e3 * _best_of(build, repeats)
+            tree = build()
+            depth = np.full(adb.N, np.inf)
+            top = np.full(adb.N, -1, dtype=np.int32)
+
+            def traverse():
+                depth.fill(np.inf)
+                top.fill(-1)
+                rasterize_with_bvh_nb(eye, directions, *tree[:7], prim_min, prim_max, prim_id,
+                                      depth, top, np.inf)
+
+            row[f"{name}_trav_ms"] = 1e3 * _best_of(traverse, repeats)
+            row[f"{name}_nodes"] = int(tree[0].shape[0])
+            depths[name] = depth.copy()
+        row["depth_match"] = bool(np.allclose(depths["median_py"], depths["sah_nb"], equal_nan=True))
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2048, 5000, 10000, 20000, 50000])
+    parser.add_argument("--granularity", type=int, nargs=2, default=[256, 124])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = run(args.sizes, tuple(args.granularity), args.repeats)
+    print(f"{'prims':>7} | {'median build':>12} {'trav':>8} {'total':>8} | {'sah build':>10} {'trav':>8} {'total':>8} | match")
+    for r in rows:
+        mt = r["median_py_build_ms"] + r["median_py_trav_ms"]
+        st = r["sah_nb_build_ms"] + r["sah_nb_trav_ms"]
+        print(f"{r['prims']:>7} | {r['median_py_build_ms']:>10.1f}ms {r['median_py_trav_ms']:>6.1f}ms {mt:>6.1f}ms |"
+              f" {r['sah_nb_build_ms']:>8.1f}ms {r['sah_nb_trav_ms']:>6.1f}ms {st:>6.1f}ms | {r['depth_match']}")
+
+
+if __name__ == "__main__":
+    main()
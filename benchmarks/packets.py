@@ -0,0 +1,62 @@
+"""Per-ray vs packet BVH traversal (rasterize_with_bvh_nb vs rasterize_with_bvh_packets_nb) per ADB granularity
+and reach, over the full sphere and over the ROI of the ores ahead, and whether both give identical buffers.
+
+    python -m benchmarks.packets [--granularities 256x124 512x256] [--reaches 4.8 8 16] [--repeats 5]
+"""
+
+import argparse
+
+import numpy as np
+
+from benchmarks.rasterizers import _best_of, mined_out_area, ores_ahead
+from visibility_scanner.scanner import PACKET_TILE, HighResADB
+
+METHODS = ("bvh", "packet")
+
+
+def run(granularities, reaches, repeats: int = 5):
+    rows = []
+    for granularity in granularities:
+        adb = HighResADB(*granularity)
+        for reach in reaches:
+            eye, aabbs, ids = mined_out_area(reach)
+            roi = adb.roi_indices(ores_ahead(aabbs, reach), eye).copy()
+            row = {"granularity": f"{granularity[0]}x{granularity[1]}", "reach": reach,
+                   "occluders": int(aabbs.shape[0]), "roi_frac": roi.size / adb.N, "match": True}
+            for suffix, pixels in (("", None), ("_roi", roi)):
+                out = {}
+                for method in METHODS:
+                    def raster():
+                        adb.reset_depth()
+                        adb.rasterize_occluders(aabbs, eye, occluder_ids=ids, max_depth=float("inf"),
+                                                method=method, roi=pixels)
+
+                    raster()  # compile, and build the BVH both methods share
+                    row[f"{method}{suffix}_ms"] = 1e3 * _best_of(raster, repeats)
+                    out[method] = (adb.depth.copy(), adb.top_occluder_idx.copy())
+                row["match"] &= all(np.array_equal(a, b) for a, b in zip(out["bvh"], out["packet"]))
+            rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--granularities", nargs="+", default=["256x124", "512x256"])
+    parser.add_argument("--reaches", type=float, nargs="+", default=[4.8, 8.0, 16.0])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    granularities = [tuple(int(v) for v in g.lower().split("x")) for g in args.granularities]
+    rows = run(granularities, args.reaches, args.repeats)
+    print(f"{'adb':>8} {'reach':>5} {'occluders':>9} | {'per-ray':>9} {'packet':>9} {'':>6} |"
+          f" {'roi':>4} {'per-ray':>9} {'packet':>9} {'':>6} | match")
+    for r in rows:
+        print(f"{r['granularity']:>8} {r['reach']:>5.1f} {r['occluders']:>9} | {r['bvh_ms']:>7.2f}ms"
+              f" {r['packet_ms']:>7.2f}ms {r['bvh_ms'] / r['packet_ms']:>5.1f}x |"
+              f" {100 * r['roi_frac']:>3.0f}% {r['bvh_roi_ms']:>7.2f}ms {r['packet_roi_ms']:>7.2f}ms"
+              f" {r['bvh_roi_ms'] / r['packet_roi_ms']:>5.1f}x | {r['match']}")
+    print(f"packets of {PACKET_TILE}x{PACKET_TILE} pixels")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Coarse rasterization cost of the brute-force, BVH, occupancy-grid and packet BVH paths vs reach,
+over the full sphere and over the ROI of the ore candidates ahead of the player.
+
+    python -m benchmarks.rasterizers [--reaches 4.8 8 12 16] [--granularity 256 124]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from visibility_scanner.scanner import HighResADB, RASTER_METHODS
+
+
+def mined_out_area(reach: float, solid_frac: float = 0.9, seed: int = 0):
+    """Unit blocks within reach of an eye standing in a 1x2 tunnel along +x, with random air pockets."""
+    rng = np.random.default_rng(seed)
+    eye = np.array([0.5, 1.62, 0.5], dtype=np.float64)
+    r = int(np.ceil(reach)) + 1
+    g = np.arange(-r, r + 1)
+    x, y, z = (a.ravel() for a in np.meshgrid(g, g + 1, g, indexing="ij"))
+    centre = np.stack((x, y, z), axis=1) + 0.5
+    in_reach = np.linalg.norm(centre - eye, axis=1) <= reach
+    tunnel = (z == 0) & ((y == 0) | (y == 1)) & (x <= 2)
+    solid = in_reach & ~tunnel & (rng.random(x.size) < solid_frac)
+
+    lo = np.stack((x[solid], y[solid], z[solid]), axis=1).astype(np.float64)
+    aabbs = np.empty((lo.shape[0], 6), dtype=np.float64)
+    aabbs[:, 0::2] = lo
+    aabbs[:, 1::2] = lo + 1.0
+    ids = np.arange(lo.shape[0], dtype=np.int32)
+    return eye, aabbs, ids
+
+
+def ores_ahead(aabbs: np.ndarray, reach: float):
+    """Blocks in the wall and floor/ceiling of the next few blocks of tunnel (the usual strip-mining targets)."""
+    x, y, z = aabbs[:, 0], aabbs[:, 2], aabbs[:, 4]
+    ahead = (x >= 1) & (x <= min(reach, 4.0)) & (np.abs(z) <= 1) & (y >= -1) & (y <= 2)
+    return aabbs[ahead]
+
+
+def _best_of(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(reaches, granularity=(256, 124), repeats=3):
+    methods = [m for m in RASTER_METHODS if m != "auto"]
+    adb = HighResADB(*granularity)
+
+    # compile outside the timed region
+    eye, aabbs, ids = mined_out_area(2.0)
+    for method in methods:
+        adb.reset_depth()
+        adb.rasterize_occluders(aabbs, eye, occluder_ids=ids, max_depth=float("inf"), method=method)
+
+    rows = []
+    for reach in reaches:
+        eye, aabbs, ids = mined_out_area(reach)
+        roi = adb.roi_indices(ores_ahead(aabbs, reach), eye)
+        row = {"reach": reach, "occluders": int(aabbs.shape[0]), "roi_frac": roi.size / adb.N}
+        depths = {}
+        for method in methods:
+            for suffix, pixels in (("", None), ("_roi", roi)):
+                def raster():
+                    adb.reset_depth()
+                    adb.rasterize_occluders(aabbs, eye, occluder_ids=ids, max_depth=float("inf"),
+                                            method=method, roi=pixels)
+
+                row[f"{method}{suffix}_ms"] = 1e3 * _best_of(raster, repeats)
+                depths[method + suffix] = adb.depth.copy()
+        row["depth_match"] = all(np.allclose(depths["brute"], depths[m]) for m in methods)
+        row["depth_match"] &= all(np.allclose(depths["brute"][roi], depths[m + "_roi"][roi]) for m in methods)
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reaches", type=float, nargs="+", default=[4.8, 8.0, 12.0, 16.0])
+    parser.add_argument("--granularity", type=int, nargs=2, default=[256, 124])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = run(args.reaches, tuple(args.granularity), args.repeats)
+    print(f"{'reach':>6} {'occluders':>9} | {'brute':>9} {'bvh':>9} {'grid':>9} {'packet':>9} |"
+          f" {'roi':>4} {'brute':>9} {'bvh':>9} {'grid':>9} {'packet':>9} | match")
+    for r in rows:
+        print(f"{r['reach']:>6.1f} {r['occluders']:>9} | {r['brute_ms']:>7.1f}ms {r['bvh_ms']:>7.1f}ms"
+              f" {r['grid_ms']:>7.1f}ms {r['packet_ms']:>7.1f}ms | {100 * r['roi_frac']:>3.0f}%"
+              f" {r['brute_roi_ms']:>7.1f}ms {r['bvh_roi_ms']:>7.1f}ms {r['grid_roi_ms']:>7.1f}ms"
+              f" {r['packet_roi_ms']:>7.1f}ms | {r['depth_match']}")
+
+
+if __name__ == "__main__":
+    main()
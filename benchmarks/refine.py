@@ -0,0 +1,100 @@
+"""Compiled vs Python analytic refine: time per call and bit-for-bit agreement of the depth/id buffers.
+
+    python -m benchmarks.refine [--scenes 20] [--reach 5.0] [--granularity 256 124] [--max-depth 4.8]
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from visibility_scanner.scanner import (
+    HighResADB,
+    _parse_block_string,
+    _positions_within_reach,
+    _rasterize_coarse,
+    get_blockcache,
+    make_aabb_from_block,
+)
+
+ORE = "minecraft:deepslate_iron_ore"
+PARTIAL_BLOCKS = (
+    "minecraft:stone_slab[type=top,waterlogged=false]",
+    "minecraft:stone_slab[type=bottom,waterlogged=false]",
+    "minecraft:oak_stairs[facing=north,half=bottom,shape=straight,waterlogged=false]",
+    "minecraft:glass_pane[east=true,north=false,south=false,waterlogged=false,west=true]",
+)
+
+
+def tunnel_scene(seed: int, reach: float):
+    """Eye in a 1x2 tunnel along +x through deepslate with ores, partial blocks, water and air pockets."""
+    rnd = random.Random(seed)
+    palette = PARTIAL_BLOCKS + (ORE, "minecraft:air", "minecraft:water[level=0]")
+    eye = np.array([0.5 + rnd.uniform(-0.3, 0.3), 1.62, 0.5 + rnd.uniform(-0.3, 0.3)])
+    blocks = []
+    for x, y, z in _positions_within_reach(eye[0], eye[1], eye[2], reach, -90.0, 90.0).tolist():
+        if z == 0 and y in (0, 1) and x <= 2:
+            block = "minecraft:air"
+        else:
+            r = rnd.random()
+            block = palette[int(r * 40)] if r < len(palette) / 40 else "minecraft:deepslate[axis=y]"
+        base, short_type, meta = _parse_block_string(block)
+        blocks.append(((x, y, z), base, short_type, meta))
+    return eye, blocks
+
+
+def run(scenes: int, reach: float, granularity=(256, 124), max_depth: float = float("inf")):
+    cache = get_blockcache()
+    adb = HighResADB(*granularity)
+    rows = []
+    for seed in range(scenes):
+        eye, blocks = tunnel_scene(seed, reach)
+        pos_to_id = {tuple(b[0]): i for i, b in enumerate(blocks)}
+        targets = [make_aabb_from_block(b[0]) for b in blocks if b[1] == ORE]
+        if not targets:
+            continue
+        _rasterize_coarse(adb, eye, blocks, pos_to_id, max_depth=max_depth)
+        depth0 = adb.depth.copy()
+        top0 = adb.top_occluder_idx.copy()
+
+        row = {"seed": seed, "targets": len(targets)}
+        out = {}
+        for use_numba in (False, True):
+            def refine():
+                adb.depth[:] = depth0
+                adb.top_occluder_idx[:] = top0
+                cache.analytic_refine_depth_in_targets_cone(adb, eye, targets, blocks, max_depth, 0.5, 0.5,
+                                                            pos_to_id, use_numba=use_numba)
+
+            refine()  # compile / warm the geometry cache
+            t0 = time.perf_counter()
+            refine()
+            row["nb_ms" if use_numba else "py_ms"] = 1e3 * (time.perf_counter() - t0)
+            out[use_numba] = (adb.depth.copy(), adb.top_occluder_idx.copy())
+        row["match"] = (np.array_equal(out[False][0], out[True][0]) and
+                        np.array_equal(out[False][1], out[True][1]))
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenes", type=int, default=20)
+    parser.add_argument("--reach", type=float, default=5.0)
+    parser.add_argument("--granularity", type=int, nargs=2, default=[256, 124])
+    parser.add_argument("--max-depth", type=float, default=float("inf"), help="ray length, as scan_targets(reach=)")
+    args = parser.parse_args()
+
+    rows = run(args.scenes, args.reach, tuple(args.granularity), args.max_depth)
+    print(f"{'seed':>4} {'targets':>7} | {'python':>9} {'numba':>9} | match")
+    for r in rows:
+        print(f"{r['seed']:>4} {r['targets']:>7} | {r['py_ms']:>7.1f}ms {r['nb_ms']:>7.1f}ms | {r['match']}")
+    py = sum(r["py_ms"] for r in rows)
+    nb = sum(r["nb_ms"] for r in rows)
+    print(f"total python {py:.1f}ms, numba {nb:.1f}ms ({py / max(nb, 1e-9):.1f}x), "
+          f"{sum(r['match'] for r in rows)}/{len(rows)} identical")
+
+
+if __name__ == "__main__":
+    main()
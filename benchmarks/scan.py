@@ -0,0 +1,171 @@
+"""Scans per second, p50/p99 latency and peak allocations of get_area, get_line, scan_target and scan_targets
+(per_target and parallel modes, and per_target with rays ending at the reach) in a procedural world served by
+a fake minescript, across ADB granularities and reaches.
+
+    python -m benchmarks.scan [--granularities 256x124 512x256] [--reaches 4.8 8] [--scenes 10]
+                              [--out results.jsonl] [--label NAME] [--compare baseline.jsonl]
+
+Every row is also appended to --out as one JSON line keyed by (op, granularity, reach), so runs of
+different commits can be compared with --compare.
+"""
+
+import argparse
+import json
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.synthetic_world import DEEPSLATE_ORES, STONE_ORES, TUNNEL_Y, VoxelWorld, install_fake_minescript
+
+fake_minescript = install_fake_minescript(VoxelWorld(seed=0))
+
+from visibility_scanner.scanner import scan_target, scan_targets  # noqa: E402
+from visibility_scanner.world_scanners import BlockCache, get_area, get_line  # noqa: E402
+
+TARGET_IDS = list(DEEPSLATE_ORES + STONE_ORES)
+OPS = ("get_area", "get_line", "scan_target", "scan_targets", "scan_targets_parallel", "scan_targets_reach")
+
+
+def scenes(count: int, seed: int = 0):
+    """Eye positions spread along the strip-mining tunnel of the world."""
+    rng = np.random.default_rng(seed)
+    for x in rng.integers(-2000, 2000, size=count).tolist():
+        yield (x + 0.5 + rng.uniform(-0.3, 0.3), TUNNEL_Y + 1.62, 0.5 + rng.uniform(-0.3, 0.3))
+
+
+def nearest_target(snapshot, eye):
+    rows = np.flatnonzero(snapshot.base_mask(TARGET_IDS))
+    if rows.size == 0:
+        return None
+    d = np.linalg.norm(snapshot.positions[rows] + 0.5 - np.asarray(eye), axis=1)
+    return tuple(snapshot.positions[rows[int(np.argmin(d))]].tolist())
+
+
+def _ops(eye, reach, granularity):
+    """Callables for each op at one eye position; get_area uses a fresh cache so every call fetches and parses."""
+    occluders = get_area(eye, reach=reach, cache=BlockCache())
+    target = nearest_target(occluders, eye)
+    ops = {
+        "get_area": lambda: get_area(eye, reach=reach, cache=BlockCache()),
+        "scan_targets": lambda: scan_targets(eye, TARGET_IDS, occluders, adb_granularity=granularity),
+        "scan_targets_parallel": lambda: scan_targets(eye, TARGET_IDS, occluders, adb_granularity=granularity,
+                                                      mode="parallel"),
+        "scan_targets_reach": lambda: scan_targets(eye, TARGET_IDS, occluders, adb_granularity=granularity,
+                                                   reach=reach),
+    }
+    if target is not None:
+        ops["get_line"] = lambda: get_line(eye, target, cache=BlockCache())
+        ops["scan_target"] = lambda: scan_target(eye, target, occluders, adb_granularity=granularity)
+    return ops
+
+
+def _peak_kib(fn) -> float:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024.0
+    finally:
+        tracemalloc.stop()
+
+
+def run(granularities, reaches, n_scenes: int = 10, repeats: int = 3):
+    rows = []
+    for granularity in granularities:
+        for reach in reaches:
+            eyes = list(scenes(n_scenes))
+            # compile and warm the geometry caches outside the timed region
+            for fn in _ops(eyes[0], reach, granularity).values():
+                fn()
+
+            times = {op: [] for op in OPS}
+            peaks = {op: [] for op in OPS}
+            blocks = []
+            for eye in eyes:
+                ops = _ops(eye, reach, granularity)
+                blocks.append(len(get_area(eye, reach=reach, cache=BlockCache())))
+                for op, fn in ops.items():
+                    for _ in range(repeats):
+                        t0 = time.perf_counter()
+                        fn()
+                        times[op].append(time.perf_counter() - t0)
+                    peaks[op].append(_peak_kib(fn))
+
+            for op in OPS:
+                if not times[op]:
+                    continue
+                ms = 1e3 * np.asarray(times[op])
+                rows.append({
+                    "op": op,
+                    "granularity": f"{granularity[0]}x{granularity[1]}",
+                    "reach": reach,
+                    "calls": int(ms.size),
+                    "blocks_mean": float(np.mean(blocks)),
+                    "per_s": float(1e3 / ms.mean()),
+                    "p50_ms": float(np.percentile(ms, 50)),
+                    "p99_ms": float(np.percentile(ms, 99)),
+                    "peak_kib": float(np.max(peaks[op])),
+                })
+    return rows
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _key(row):
+    return row["op"], row["granularity"], row["reach"]
+
+
+def load_baseline(path: str, label=None):
+    """Last row per (op, granularity, reach) in a results file, optionally only rows with `label`."""
+    baseline = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            if label is None or row.get("label") == label:
+                baseline[_key(row)] = row
+    return baseline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--granularities", nargs="+", default=["256x124", "512x256"])
+    parser.add_argument("--reaches", type=float, nargs="+", default=[4.8, 8.0])
+    parser.add_argument("--scenes", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--out", default=None, help="append the results to this JSONL file")
+    parser.add_argument("--label", default=None)
+    parser.add_argument("--compare", default=None, help="JSONL results to compare against")
+    parser.add_argument("--compare-label", default=None)
+    args = parser.parse_args()
+
+    granularities = [tuple(int(v) for v in g.lower().split("x")) for g in args.granularities]
+    rows = run(granularities, args.reaches, args.scenes, args.repeats)
+    baseline = load_baseline(args.compare, args.compare_label) if args.compare else {}
+
+    print(f"{'op':>21} {'adb':>8} {'reach':>5} {'blocks':>6} | {'per s':>8} {'p50':>9} {'p99':>9} {'peak':>9}"
+          + (" | vs base" if baseline else ""))
+    for r in rows:
+        line = (f"{r['op']:>21} {r['granularity']:>8} {r['reach']:>5.1f} {r['blocks_mean']:>6.0f} | {r['per_s']:>8.1f}"
+                f" {r['p50_ms']:>7.2f}ms {r['p99_ms']:>7.2f}ms {r['peak_kib']:>6.0f}KiB")
+        base = baseline.get(_key(r))
+        if base is not None:
+            line += f" | {base['p50_ms'] / max(r['p50_ms'], 1e-9):.2f}x"
+        print(line)
+
+    if args.out:
+        meta = {"bench": "scan", "time": time.time(), "commit": _commit(), "label": args.label,
+                "scenes": args.scenes, "repeats": args.repeats}
+        with open(args.out, "a", encoding="utf-8") as f:
+            for r in rows:
+                f.write(json.dumps({**meta, **r}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
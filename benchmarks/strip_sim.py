@@ -0,0 +1,559 @@
+"""Headless strip-mining simulator: runs mining_script.py or nether_mining.py unmodified against a simulated
+player in a procedural world on a virtual tick clock, and reports blocks per minute, ores per hour and the
+time spent in each state (strip mining, ore excursions, gravel swaps, fall recovery, ...).
+
+    python -m benchmarks.strip_sim [--script mining_script] [--minutes 10] [--seed 0] [--out sim.jsonl]
+
+Minescript round-trips and the scanner's compute are free in game time (the clock only moves when the
+script waits, sleeps or pulls an event), so a run is deterministic for a seed and faster than real time;
+the wall time spent between ticks is reported per state as `compute_s`.
+"""
+
+import argparse
+import json
+import math
+import os
+import queue
+import random
+import runpy
+import sys
+import time
+import types
+from collections import Counter, deque
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.synthetic_world import TUNNEL_Y, NetherVoxelWorld, VoxelWorld
+from visibility_scanner import warmup
+
+BlockPos = Tuple[int, int, int]
+
+TICKS_PER_SECOND = 20
+REACH = 4.5  # survival block interaction range
+EYE_HEIGHT = 1.62
+SNEAK_EYE_HEIGHT = 1.27
+HALF_WIDTH = 0.3
+HEIGHT = 1.8
+SNEAK_HEIGHT = 1.5
+WALK_SPEED = 0.2158  # blocks per tick
+SNEAK_FACTOR = 0.3
+GRAVITY = 0.08
+DRAG = 0.98
+BREAK_COOLDOWN = 5  # ticks between two blocks broken by a held attack
+START_TUNNEL = 6  # blocks of tunnel dug behind the start position
+CALLS_PER_TICK = 1000  # a loop making this many Minescript calls without waiting is charged one tick
+
+PASSABLE = frozenset(("minecraft:air", "minecraft:cave_air", "minecraft:void_air",
+                      "minecraft:lava", "minecraft:water"))
+FLUIDS = frozenset(("minecraft:lava", "minecraft:water"))
+FALLING = frozenset(("minecraft:gravel", "minecraft:sand"))
+
+# (substring of the block id, hardness, preferred tool); first match wins
+BLOCK_HARDNESS = (
+    ("ancient_debris", 30.0, "pickaxe"),
+    ("iron_bars", 5.0, "pickaxe"),
+    ("cobbled_deepslate", 3.5, "pickaxe"),
+    ("deepslate_", 4.5, "pickaxe"),
+    ("_ore", 3.0, "pickaxe"),
+    ("deepslate", 3.0, "pickaxe"),
+    ("blackstone", 1.5, "pickaxe"),
+    ("basalt", 1.25, "pickaxe"),
+    ("netherrack", 0.4, "pickaxe"),
+    ("stone", 1.5, "pickaxe"),
+    ("gravel", 0.6, "shovel"),
+    ("sand", 0.5, "shovel"),
+    ("glass", 0.3, None),
+)
+HOTBAR_TOOLS = {0: "pickaxe", 8: "shovel"}  # pickaxe in slot 1, shovel in slot 9
+TOOL_SPEED = 8.0 + 5 ** 2 + 1  # diamond with Efficiency V
+
+# innermost script function on the stack -> state
+STATE_OF_FUNCTION = {
+    "gravel_mine": "gravel",
+    "check_and_recover_from_fall": "fall_recovery",
+    "emergency_lava_stop": "lava_stop",
+    "mine_ore_vein_continuous": "ore_excursion",
+    "quick_ore_scan": "ore_excursion",
+    "mine_single_block_simple": "path_clearing",
+    "handle_basalt_blackstone_mining": "basalt_mode",
+    "perform_strip_mining": "strip",
+    "mining_time": "main_loop",
+}
+
+SCRIPTS = {
+    "mining_script": VoxelWorld,
+    "nether_mining": NetherVoxelWorld,
+}
+
+
+class SimulationEnd(Exception):
+    pass
+
+
+def _base(bs: str) -> str:
+    return bs.split("[", 1)[0].split("{", 1)[0]
+
+
+def is_ore(base: str) -> bool:
+    return base.endswith("_ore") or base == "minecraft:ancient_debris"
+
+
+def break_ticks(base: str, tool: Optional[str]) -> int:
+    """Ticks a held attack needs to break the block, like the vanilla dig-speed formula."""
+    name = base.replace("minecraft:", "")
+    hardness, preferred = 1.5, "pickaxe"
+    for key, h, t in BLOCK_HARDNESS:
+        if key in name:
+            hardness, preferred = h, t
+            break
+    right_tool = preferred is None or tool == preferred
+    speed = TOOL_SPEED if (preferred is not None and tool == preferred) else 1.0
+    damage = speed / hardness / (30.0 if right_tool else 100.0)
+    return 1 if damage >= 1.0 else int(math.ceil(1.0 / damage))
+
+# ------------------------------
+# world
+# ------------------------------
+
+class SimWorld:
+    """A generated world plus every block the simulation changed."""
+
+    def __init__(self, generator: VoxelWorld):
+        self.generator = generator
+        self._blocks: Dict[BlockPos, str] = {}
+
+    def prefetch(self, positions: List[BlockPos]) -> None:
+        missing = [p for p in positions if p not in self._blocks]
+        if missing:
+            self._blocks.update(zip(missing, self.generator.blocks(missing)))
+
+    def get(self, pos: BlockPos) -> str:
+        bs = self._blocks.get(pos)
+        if bs is None:
+            bs = self._blocks[pos] = self.generator.block(*pos)
+        return bs
+
+    def set(self, pos: BlockPos, bs: str) -> str:
+        old = self.get(pos)
+        self._blocks[pos] = bs
+        return old
+
+    def solid(self, pos: BlockPos) -> bool:
+        return _base(self.get(pos)) not in PASSABLE
+
+# ------------------------------
+# simulation
+# ------------------------------
+
+class Simulation:
+    """Simulated player, world and tick clock behind a fake `minescript` module."""
+
+    def __init__(self, script: str = "mining_script", minutes: float = 10.0, seed: int = 0,
+                 cave_threshold: float = 0.80, ore_threshold: float = 0.86, gravel_threshold: Optional[float] = 0.83,
+                 verbose: bool = False):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.script = script
+        self.script_path = os.path.join(root, f"{script}.py")
+        self.seed = int(seed)
+        self.verbose = verbose
+        self.world = SimWorld(SCRIPTS[script](seed=seed, cave_threshold=cave_threshold, ore_threshold=ore_threshold,
+                                                   tunnel=False, gravel_threshold=gravel_threshold))
+
+        self.tick = 0
+        self.stop_tick = int(minutes * 60 * TICKS_PER_SECOND)
+        self.limit_tick = self.stop_tick + 30 * TICKS_PER_SECOND
+        self._sleep_debt = 0.0
+        self._calls_this_tick = 0
+
+        # player: feet position, look, keys, tool
+        self.x, self.y, self.z = 0.5, float(TUNNEL_Y), 0.5  # at the face, like a player starting the script
+        self.yaw, self.pitch = -90.0, 0.0  # facing +x
+        self.vy = 0.0
+        self.keys = Counter()
+        self.slot = 0
+        self.screen: Optional[str] = None
+        self._break_pos: Optional[BlockPos] = None
+        self._break_progress = 0
+        self._cooldown = 0
+        self._fall_start: Optional[float] = None
+        # a few blocks of already dug tunnel behind the player, on a solid floor
+        for x in range(-START_TUNNEL, 1):
+            for dy in (0, 1):
+                self.world.set((x, TUNNEL_Y + dy, 0), "minecraft:air")
+            self.world.set((x, TUNNEL_Y - 1, 0), "minecraft:stone")
+
+        # metrics
+        self.broken = Counter()
+        self.calls = Counter()
+        self.state_ticks = Counter()
+        self.state_entries = Counter()
+        self.state_compute = Counter()
+        self._state = None
+        self._last_wall = None
+        self.falls = 0
+        self.lava_contacts = 0
+        self.log = deque(maxlen=50)
+        self.queues: List = []
+
+    # ---- clock ----
+
+    def advance(self, ticks: int = 1) -> None:
+        for _ in range(int(ticks)):
+            if self.tick >= self.limit_tick:
+                raise SimulationEnd("tick limit")
+            self._sample_state()
+            self._physics()
+            self.tick += 1
+            self._calls_this_tick = 0
+            self._emit("tick", types.SimpleNamespace(type="tick", time=self.now()))
+
+    def now(self) -> float:
+        return (self.tick + self._sleep_debt) / TICKS_PER_SECOND
+
+    def sleep(self, seconds: float) -> None:
+        self._sleep_debt += max(0.0, float(seconds)) * TICKS_PER_SECOND
+        whole = int(self._sleep_debt)
+        self._sleep_debt -= whole
+        self.advance(whole)
+
+    def _sample_state(self) -> None:
+        state = "other"
+        frame = sys._getframe(1)
+        while frame is not None:
+            if frame.f_globals.get("__file__") == self.script_path and frame.f_code.co_name in STATE_OF_FUNCTION:
+                state = STATE_OF_FUNCTION[frame.f_code.co_name]
+                break
+            frame = frame.f_back
+        wall = time.perf_counter()
+        if self._last_wall is not None:
+            self.state_compute[state] += wall - self._last_wall
+        self._last_wall = wall
+        if state != self._state:
+            self.state_entries[state] += 1
+            self._state = state
+        self.state_ticks[state] += 1
+
+    def _emit(self, kind: str, event) -> None:
+        for q in self.queues:
+            if kind in q.kinds:
+                q.pending.append(event)
+
+    def _call(self, name: str) -> None:
+        self.calls[name] += 1
+        self._calls_this_tick += 1
+        if self._calls_this_tick >= CALLS_PER_TICK:
+            self.advance(1)
+
+    # ---- geometry ----
+
+    def _box_cells(self, x: float, y: float, z: float):
+        eps = 1e-6
+        for bx in range(math.floor(x - HALF_WIDTH + eps), math.floor(x + HALF_WIDTH - eps) + 1):
+            for by in range(math.floor(y + eps), math.floor(y + self._height() - eps) + 1):
+                for bz in range(math.floor(z - HALF_WIDTH + eps), math.floor(z + HALF_WIDTH - eps) + 1):
+                    yield bx, by, bz
+
+    def _height(self) -> float:
+        return SNEAK_HEIGHT if self.keys["sneak"] else HEIGHT
+
+    def _collides(self, x: float, y: float, z: float) -> bool:
+        return any(self.world.solid(c) for c in self._box_cells(x, y, z))
+
+    def _supported(self, x: float, y: float, z: float) -> bool:
+        if y - math.floor(y) > 1e-6:
+            return False
+        eps = 1e-6
+        by = int(math.floor(y)) - 1
+        return any(self.world.solid((bx, by, bz))
+                   for bx in range(math.floor(x - HALF_WIDTH + eps), math.floor(x + HALF_WIDTH - eps) + 1)
+                   for bz in range(math.floor(z - HALF_WIDTH + eps), math.floor(z + HALF_WIDTH - eps) + 1))
+
+    def look_dir(self) -> Tuple[float, float, float]:
+        yaw, pitch = math.radians(self.yaw), math.radians(self.pitch)
+        return -math.sin(yaw) * math.cos(pitch), -math.sin(pitch), math.cos(yaw) * math.cos(pitch)
+
+    def raycast(self, max_distance: float) -> Optional[Tuple[BlockPos, float, str]]:
+        """First non-fluid, non-air block along the view ray within `max_distance` (voxel DDA)."""
+        ox, oy, oz = self.x, self.y + (SNEAK_EYE_HEIGHT if self.keys["sneak"] else EYE_HEIGHT), self.z
+        d = self.look_dir()
+        cell = [math.floor(ox), math.floor(oy), math.floor(oz)]
+        step, t_max, t_delta = [0, 0, 0], [math.inf] * 3, [math.inf] * 3
+        for a, (o, v) in enumerate(zip((ox, oy, oz), d)):
+            if v > 1e-12:
+                step[a], t_max[a], t_delta[a] = 1, (cell[a] + 1 - o) / v, 1.0 / v
+            elif v < -1e-12:
+                step[a], t_max[a], t_delta[a] = -1, (o - cell[a]) / -v, -1.0 / v
+        t, side = 0.0, "up"
+        while t <= max_distance:
+            pos = (cell[0], cell[1], cell[2])
+            if _base(self.world.get(pos)) not in PASSABLE:
+                return pos, t, side
+            a = min(range(3), key=lambda i: t_max[i])
+            t = t_max[a]
+            cell[a] += step[a]
+            t_max[a] += t_delta[a]
+            side = (("east", "west"), ("up", "down"), ("south", "north"))[a][step[a] > 0]
+        return None
+
+    # ---- physics ----
+
+    def _physics(self) -> None:
+        if self.tick >= self.stop_tick:
+            self.screen = "Chat screen"  # the player pressed T
+
+        # digging
+        if self._cooldown > 0:
+            self._cooldown -= 1
+        hit = self.raycast(REACH) if self.keys["attack"] else None
+        if hit is None:
+            self._break_pos, self._break_progress = None, 0
+        elif self._cooldown == 0:
+            pos = hit[0]
+            if pos != self._break_pos:
+                self._break_pos, self._break_progress = pos, 0
+            self._break_progress += 1
+            if self._break_progress >= break_ticks(_base(self.world.get(pos)), HOTBAR_TOOLS.get(self.slot)):
+                self._break(pos)
+                self._break_pos, self._break_progress = None, 0
+                self._cooldown = BREAK_COOLDOWN
+
+        # walking
+        on_ground = self._supported(self.x, self.y, self.z)
+        move = (1 if self.keys["forward"] else 0) - (1 if self.keys["backward"] else 0)
+        if move:
+            speed = WALK_SPEED * (SNEAK_FACTOR if self.keys["sneak"] else 1.0) * move
+            yaw = math.radians(self.yaw)
+            for dx, dz in ((-math.sin(yaw) * speed, 0.0), (0.0, math.cos(yaw) * speed)):
+                nx, nz = self.x + dx, self.z + dz
+                if self._collides(nx, self.y, nz):
+                    continue
+                if self.keys["sneak"] and on_ground and not self._supported(nx, self.y, nz):
+                    continue  # sneaking never walks off an edge
+                self.x, self.z = nx, nz
+
+        # gravity and jumping
+        if self.keys["jump"] and on_ground:
+            self.vy = 0.42
+        on_ground = self._supported(self.x, self.y, self.z)
+        if self.vy > 0 or not on_ground:
+            if self._fall_start is None:
+                self._fall_start = self.y
+            ny = self.y + self.vy
+            if self.vy < 0 and self._collides(self.x, ny, self.z):
+                ny, self.vy = float(math.floor(ny) + 1), 0.0
+            elif self.vy > 0 and self._collides(self.x, ny, self.z):
+                ny, self.vy = self.y, 0.0
+            self.y = ny
+            self.vy = (self.vy - GRAVITY) * DRAG
+        if self._fall_start is not None and self._supported(self.x, self.y, self.z) and self.vy <= 0:
+            if self._fall_start - self.y >= 1.0:
+                self.falls += 1
+            self._fall_start, self.vy = None, 0.0
+
+        if any(_base(self.world.get(c)) == "minecraft:lava" for c in self._box_cells(self.x, self.y, self.z)):
+            self.lava_contacts += 1
+            if self._fall_start is not None and self._fall_start - self.y >= 1.0:
+                self.falls += 1
+            raise SimulationEnd("lava contact")
+
+    def _set_block(self, pos: BlockPos, bs: str) -> None:
+        old = self.world.set(pos, bs)
+        self._emit("block_update", types.SimpleNamespace(type="block_update", position=list(pos),
+                                                          old_state=old, new_state=bs, time=self.now()))
+
+    def _break(self, pos: BlockPos) -> None:
+        self.broken[_base(self.world.get(pos))] += 1
+        self._set_block(pos, "minecraft:air")
+        # falling blocks above slide down one block
+        x, y, z = pos
+        while _base(self.world.get((x, y + 1, z))) in FALLING:
+            self._set_block((x, y, z), self.world.get((x, y + 1, z)))
+            self._set_block((x, y + 1, z), "minecraft:air")
+            y += 1
+
+    # ---- fake minescript ----
+
+    def module(self) -> types.ModuleType:
+        sim = self
+        m = types.ModuleType("minescript")
+
+        def api(fn):
+            def wrapper(*args, **kwargs):
+                sim._call(fn.__name__)
+                return fn(*args, **kwargs)
+            wrapper.__name__ = fn.__name__
+            setattr(m, fn.__name__, wrapper)
+            return wrapper
+
+        @api
+        def echo(*args, **kwargs):
+            text = " ".join(str(a) for a in args)
+            sim.log.append((sim.tick, text))
+            if sim.verbose:
+                print(f"[{sim.tick / TICKS_PER_SECOND:8.2f}s] {text}")
+
+        @api
+        def player_position():
+            return [sim.x, sim.y, sim.z]
+
+        @api
+        def player_orientation():
+            return [sim.yaw, sim.pitch]
+
+        @api
+        def player_set_orientation(yaw, pitch):
+            sim.yaw, sim.pitch = float(yaw), max(-90.0, min(90.0, float(pitch)))
+            return True
+
+        @api
+        def player_get_targeted_block(max_distance: float = 20.0):
+            hit = sim.raycast(float(max_distance))
+            if hit is None:
+                return None
+            pos, dist, side = hit
+            return types.SimpleNamespace(position=list(pos), distance=dist, side=side, type=sim.world.get(pos))
+
+        @api
+        def getblock(x, y, z):
+            return sim.world.get((int(math.floor(x)), int(math.floor(y)), int(math.floor(z))))
+
+        @api
+        def getblocklist(positions):
+            cells = [(int(math.floor(p[0])), int(math.floor(p[1])), int(math.floor(p[2]))) for p in positions]
+            sim.world.prefetch(cells)
+            return [sim.world.get(c) for c in cells]
+
+        @api
+        def screen_name():
+            return sim.screen
+
+        @api
+        def player_inventory():
+            return [types.SimpleNamespace(item=f"minecraft:diamond_{tool}", count=1, nbt=None, slot=slot,
+                                          selected=(slot == sim.slot))
+                    for slot, tool in HOTBAR_TOOLS.items()]
+
+        @api
+        def press_key_bind(key_mapping_name: str, pressed: bool):
+            if pressed and key_mapping_name.startswith("key.hotbar."):
+                sim.slot = int(key_mapping_name.rsplit(".", 1)[1]) - 1
+
+        for key in ("forward", "backward", "left", "right", "jump", "sneak", "sprint", "attack", "use"):
+            def press(pressed: bool, _key=key):
+                sim.keys[_key] = bool(pressed)
+            press.__name__ = f"player_press_{key}"
+            api(press)
+
+        class EventQueue:
+            def __init__(self):
+                self.kinds = set()
+                self.pending = deque()
+                sim.queues.append(self)
+
+            def register_tick_listener(self):
+                self.kinds.add("tick")
+
+            def register_block_update_listener(self):
+                self.kinds.add("block_update")
+
+            def unregister_all(self):
+                self.kinds.clear()
+                self.pending.clear()
+
+            def get(self, block: bool = True, timeout: Optional[float] = None):
+                if not self.pending and block:
+                    sim.advance(1)
+                if not self.pending:
+                    raise queue.Empty
+                return self.pending.popleft()
+
+        m.EventQueue = EventQueue
+        m.EventType = types.SimpleNamespace(TICK="tick", BLOCK_UPDATE="block_update")
+        return m
+
+    # ---- run ----
+
+    def run(self) -> Dict:
+        """Run the script until the simulated T press (or a lava contact / the tick limit)."""
+        sys.modules["minescript"] = self.module()
+        saved = time.sleep, time.time, time.monotonic
+        epoch = saved[1]()
+        time.sleep = self.sleep
+        time.time = lambda: epoch + self.now()
+        time.monotonic = self.now
+        for name in [n for n in sys.modules if n.startswith(("visibility_scanner.world_scanners", "control.", "aim."))]:
+            del sys.modules[name]  # re-import so module-level caches and clocks bind to this run
+        random.seed(self.seed)
+        # compile the scanner before the clock starts; the script's own warmup.start() then finds it done
+        warmup.start()
+        warmup.wait()
+
+        end_reason = "stopped"
+        wall0 = time.perf_counter()
+        try:
+            runpy.run_path(self.script_path, run_name="__sim__")
+        except SimulationEnd as e:
+            end_reason = str(e)
+        finally:
+            time.sleep, time.time, time.monotonic = saved
+        return self.metrics(end_reason, time.perf_counter() - wall0)
+
+    def metrics(self, end_reason: str, wall_s: float) -> Dict:
+        sim_s = self.tick / TICKS_PER_SECOND
+        blocks = sum(self.broken.values())
+        ores = {k: v for k, v in self.broken.items() if is_ore(k)}
+        return {
+            "script": self.script,
+            "seed": self.seed,
+            "end_reason": end_reason,
+            "sim_s": sim_s,
+            "wall_s": wall_s,
+            "speedup": sim_s / max(wall_s, 1e-9),
+            "blocks": blocks,
+            "blocks_per_min": 60.0 * blocks / max(sim_s, 1e-9),
+            "ores": sum(ores.values()),
+            "ores_per_hour": 3600.0 * sum(ores.values()) / max(sim_s, 1e-9),
+            "ores_by_type": ores,
+            "distance": self.x - 0.5,
+            "falls": self.falls,
+            "lava_contacts": self.lava_contacts,
+            "state_s": {k: v / TICKS_PER_SECOND for k, v in self.state_ticks.most_common()},
+            "state_entries": dict(self.state_entries),
+            "compute_s": dict(self.state_compute),
+            "minescript_calls": sum(self.calls.values()),
+            "calls_per_s": sum(self.calls.values()) / max(sim_s, 1e-9),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--script", choices=sorted(SCRIPTS), default="mining_script")
+    parser.add_argument("--minutes", type=float, default=10.0, help="simulated minutes before pressing T")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--caves", type=float, default=0.80, help="cave noise threshold (lower = more caves)")
+    parser.add_argument("--ores", type=float, default=0.86, help="ore noise threshold (lower = more ore)")
+    parser.add_argument("--no-gravel", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="print the script's chat messages")
+    parser.add_argument("--out", default=None, help="append the metrics to this JSONL file")
+    parser.add_argument("--label", default=None)
+    args = parser.parse_args()
+
+    sim = Simulation(args.script, args.minutes, args.seed, args.caves, args.ores,
+                     None if args.no_gravel else 0.83, args.verbose)
+    r = sim.run()
+
+    print(f"{r['script']} seed {r['seed']}: {r['sim_s'] / 60:.1f} simulated min in {r['wall_s']:.1f}s "
+          f"({r['speedup']:.1f}x real time), ended: {r['end_reason']}")
+    print(f"  {r['blocks']} blocks ({r['blocks_per_min']:.1f}/min), {r['ores']} ores ({r['ores_per_hour']:.0f}/h), "
+          f"{r['distance']:.1f} blocks of tunnel, {r['falls']} falls, {r['minescript_calls']} Minescript calls "
+          f"({r['calls_per_s']:.0f}/s)")
+    for state, seconds in r["state_s"].items():
+        print(f"  {state:>14}: {seconds:>8.1f}s game time {100 * seconds / max(r['sim_s'], 1e-9):>5.1f}%"
+              f"  {r['state_entries'].get(state, 0):>5} entries  {r['compute_s'].get(state, 0.0):>7.2f}s compute")
+
+    if args.out:
+        with open(args.out, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"bench": "strip_sim", "time": time.time(), "label": args.label, **r}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
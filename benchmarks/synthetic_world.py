@@ -0,0 +1,163 @@
+"""Procedural voxel worlds and a fake `minescript` module serving it, so the world scanners run without Minecraft.
+
+    from benchmarks.synthetic_world import VoxelWorld, install_fake_minescript
+    fake = install_fake_minescript(VoxelWorld(seed=0))   # before importing visibility_scanner.world_scanners
+"""
+
+import sys
+import types
+from typing import Optional
+
+import numpy as np
+
+TUNNEL_Y = -40
+LAVA_LEVEL = -46
+
+STONE_ORES = ("minecraft:iron_ore", "minecraft:coal_ore", "minecraft:copper_ore")
+DEEPSLATE_ORES = (
+    "minecraft:deepslate_iron_ore",
+    "minecraft:deepslate_diamond_ore",
+    "minecraft:deepslate_redstone_ore",
+    "minecraft:deepslate_gold_ore",
+)
+PARTIAL_BLOCKS = (
+    "minecraft:cobbled_deepslate_slab[type=bottom,waterlogged=false]",
+    "minecraft:cobbled_deepslate_slab[type=top,waterlogged=false]",
+    "minecraft:stone_brick_stairs[facing=east,half=bottom,shape=straight,waterlogged=false]",
+    "minecraft:stone_brick_stairs[facing=north,half=top,shape=outer_left,waterlogged=false]",
+    "minecraft:glass_pane[east=true,north=false,south=false,waterlogged=false,west=true]",
+    "minecraft:iron_bars[east=false,north=true,south=true,waterlogged=false,west=false]",
+)
+
+
+def _hash01(x, y, z, salt: int) -> np.ndarray:
+    """Deterministic per-block noise in [0, 1)."""
+    with np.errstate(over="ignore"):
+        h = (x.astype(np.uint64) * np.uint64(0x9E3779B185EBCA87)
+             ^ y.astype(np.uint64) * np.uint64(0xC2B2AE3D27D4EB4F)
+             ^ z.astype(np.uint64) * np.uint64(0x165667B19E3779F9)
+             ^ np.uint64(salt) * np.uint64(0x27D4EB2F165667C5))
+        h ^= h >> np.uint64(31)
+        h *= np.uint64(0xBF58476D1CE4E5B9)
+        h ^= h >> np.uint64(29)
+    return (h >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def _value_noise(x, y, z, cell: int, salt: int) -> np.ndarray:
+    """Trilinear value noise on a lattice of `cell` blocks, in [0, 1)."""
+    fx, fy, fz = x / cell, y / cell, z / cell
+    x0, y0, z0 = np.floor(fx).astype(np.int64), np.floor(fy).astype(np.int64), np.floor(fz).astype(np.int64)
+    tx, ty, tz = fx - x0, fy - y0, fz - z0
+    tx, ty, tz = (t * t * (3.0 - 2.0 * t) for t in (tx, ty, tz))
+    out = np.zeros(x.shape, dtype=np.float64)
+    for dx in (0, 1):
+        wx = tx if dx else 1.0 - tx
+        for dy in (0, 1):
+            wy = ty if dy else 1.0 - ty
+            for dz in (0, 1):
+                wz = tz if dz else 1.0 - tz
+                out += wx * wy * wz * _hash01(x0 + dx, y0 + dy, z0 + dz, salt)
+    return out
+
+
+class VoxelWorld:
+    """Stone over deepslate with ore veins, caves, lava pockets and scattered slabs, stairs and panes.
+
+    A 1x2 tunnel runs along +x at y = TUNNEL_Y (feet) and z = 0, the usual strip-mining spot; `gravel_threshold`
+    adds gravel pockets (0.83 is ~3% of blocks).
+    """
+
+    def __init__(self, seed: int = 0, cave_threshold: float = 0.74, ore_threshold: float = 0.80,
+                 partial_frac: float = 0.02, tunnel: bool = True, gravel_threshold: Optional[float] = None):
+        # the value noise is bell-shaped around 0.5: 0.74 carves ~12% of blocks into caves, 0.80 turns ~6% into ore
+        self.seed = int(seed)
+        self.cave_threshold = cave_threshold
+        self.ore_threshold = ore_threshold
+        self.partial_frac = partial_frac
+        self.tunnel = tunnel
+        self.gravel_threshold = gravel_threshold
+
+    def blocks(self, positions) -> list:
+        pos = np.asarray(positions, dtype=np.int64).reshape((-1, 3))
+        x, y, z = pos[:, 0], pos[:, 1], pos[:, 2]
+        s = self.seed * 16
+
+        deep = y < np.where(_hash01(x, 0 * y, z, s + 1) < 0.5, -1, 0)
+        names = np.where(deep, "minecraft:deepslate[axis=y]", "minecraft:stone").astype(object)
+
+        vein = _value_noise(x, y, z, 3, s + 2) > self.ore_threshold
+        pick = _hash01(x, y, z, s + 3)
+        deep_ore = np.array(DEEPSLATE_ORES, dtype=object)[(pick * len(DEEPSLATE_ORES)).astype(np.int64)]
+        stone_ore = np.array(STONE_ORES, dtype=object)[(pick * len(STONE_ORES)).astype(np.int64)]
+        names = np.where(vein, np.where(deep, deep_ore, stone_ore), names)
+
+        partial = _hash01(x, y, z, s + 4) < self.partial_frac
+        names = np.where(partial, np.array(PARTIAL_BLOCKS, dtype=object)[(pick * len(PARTIAL_BLOCKS)).astype(np.int64)], names)
+
+        if self.gravel_threshold is not None:
+            names = np.where(_value_noise(x, y, z, 4, s + 6) > self.gravel_threshold, "minecraft:gravel", names)
+
+        cave = _value_noise(x, y, z, 8, s + 5) > self.cave_threshold
+        names = np.where(cave, np.where(y < LAVA_LEVEL, "minecraft:lava[level=0]", "minecraft:air"), names)
+
+        if self.tunnel:
+            tunnel = (z == 0) & ((y == TUNNEL_Y) | (y == TUNNEL_Y + 1))
+            names = np.where(tunnel, "minecraft:air", names)
+        return names.tolist()
+
+    def block(self, x: int, y: int, z: int) -> str:
+        return self.blocks([(x, y, z)])[0]
+
+
+class NetherVoxelWorld(VoxelWorld):
+    """Netherrack with basalt and blackstone deltas, quartz, nether gold and ancient debris, lava below the tunnel."""
+
+    def blocks(self, positions) -> list:
+        pos = np.asarray(positions, dtype=np.int64).reshape((-1, 3))
+        x, y, z = pos[:, 0], pos[:, 1], pos[:, 2]
+        s = self.seed * 16 + 8
+
+        delta = _value_noise(x, y, z, 12, s + 1)
+        names = np.where(delta > 0.72, "minecraft:basalt[axis=y]",
+                         np.where(delta < 0.28, "minecraft:blackstone", "minecraft:netherrack")).astype(object)
+
+        vein = _value_noise(x, y, z, 3, s + 2) > self.ore_threshold
+        pick = _hash01(x, y, z, s + 3)
+        ore = np.where(pick < 0.02, "minecraft:ancient_debris",
+                       np.where(pick < 0.35, "minecraft:nether_gold_ore", "minecraft:nether_quartz_ore"))
+        names = np.where(vein, ore, names)
+
+        if self.gravel_threshold is not None:
+            names = np.where(_value_noise(x, y, z, 4, s + 6) > self.gravel_threshold, "minecraft:gravel", names)
+
+        cave = _value_noise(x, y, z, 8, s + 5) > self.cave_threshold
+        names = np.where(cave, np.where(y < LAVA_LEVEL, "minecraft:lava[level=0]", "minecraft:air"), names)
+
+        if self.tunnel:
+            tunnel = (z == 0) & ((y == TUNNEL_Y) | (y == TUNNEL_Y + 1))
+            names = np.where(tunnel, "minecraft:air", names)
+        return names.tolist()
+
+
+def install_fake_minescript(world: VoxelWorld) -> types.ModuleType:
+    """Register a `minescript` module whose block queries read `world`; returns it so callers can swap
+    `fake.world` and read the `getblocklist_calls` / `blocks_served` counters."""
+    fake = types.ModuleType("minescript")
+    fake.world = world
+    fake.getblocklist_calls = 0
+    fake.blocks_served = 0
+
+    def getblocklist(positions):
+        fake.getblocklist_calls += 1
+        fake.blocks_served += len(positions)
+        return fake.world.blocks(positions)
+
+    def getblock(x, y, z):
+        fake.blocks_served += 1
+        return fake.world.block(int(x), int(y), int(z))
+
+    fake.getblocklist = getblocklist
+    fake.getblock = getblock
+    fake.echo = lambda *args, **kwargs: None
+    sys.modules["minescript"] = fake
+    return fake
@@ -0,0 +1,63 @@
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from control.tick_scheduler import TickScheduler
+from visibility_scanner.world_scanners import BlockCache
+
+BlockPos = Tuple[int, int, int]
+
+AIR_IDS = frozenset(("minecraft:air", "minecraft:cave_air", "minecraft:void_air"))
+
+# ------------------------------
+# block watch
+# ------------------------------
+
+class BlockWatch:
+    """Watched block positions that wake a waiting miner on the block-update event that breaks them.
+
+    Every block update the client reports also refreshes the block cache, so blocks that change while
+    the scheduler is waiting never need another getblock round-trip.
+    """
+
+    def __init__(self, scheduler: TickScheduler, cache: Optional[BlockCache] = None):
+        self.scheduler = scheduler
+        self.cache = cache
+        self._watched: Set[BlockPos] = set()
+        self._broken: Dict[BlockPos, str] = {}
+        scheduler.subscribe("block_update", self._on_block_update)
+
+    def _on_block_update(self, event) -> None:
+        x, y, z = (int(v) for v in event.position)
+        if self.cache is not None:
+            self.cache.put(x, y, z, event.new_state)
+        pos = (x, y, z)
+        if pos in self._watched and event.new_state.split('[', 1)[0] in AIR_IDS:
+            self._broken[pos] = event.new_state
+
+    def watch(self, positions: Iterable[BlockPos]) -> None:
+        for p in positions:
+            pos = (int(p[0]), int(p[1]), int(p[2]))
+            self._watched.add(pos)
+            self._broken.pop(pos, None)
+
+    def unwatch(self, positions: Iterable[BlockPos]) -> None:
+        for p in positions:
+            pos = (int(p[0]), int(p[1]), int(p[2]))
+            self._watched.discard(pos)
+            self._broken.pop(pos, None)
+
+    def clear(self) -> None:
+        self._watched.clear()
+        self._broken.clear()
+
+    def is_broken(self, pos: BlockPos) -> bool:
+        return (int(pos[0]), int(pos[1]), int(pos[2])) in self._broken
+
+    def wait_for_break(self, max_ticks: int) -> Optional[BlockPos]:
+        """Wait up to `max_ticks` for any watched block to turn into air; the broken position or None.
+
+        Returns on the event itself rather than at the next poll; None also when a reentrant
+        scheduler task (the stop check) interrupts the wait.
+        """
+        if not self._broken:
+            self.scheduler.wait_ticks(max_ticks, until=lambda: bool(self._broken))
+        return next(iter(self._broken), None)
@@ -0,0 +1,81 @@
+from typing import Callable, Dict, Optional, Tuple
+
+import minescript as m
+
+from control.tick_scheduler import TickScheduler
+
+TARGET_DISTANCE = 5
+
+# ------------------------------
+# game state
+# ------------------------------
+
+class GameState:
+    """What the checks know about the player on one game tick.
+
+    Each field is read from Minescript the first time a check asks for it and then shared by every other
+    check on the same tick, so one loop iteration costs at most one round-trip per field.
+    """
+
+    __slots__ = ("tick", "_values", "_fetched")
+
+    def __init__(self, tick: int, fetched: Callable[[str], None]):
+        self.tick = tick
+        self._values: Dict[str, object] = {}
+        self._fetched = fetched
+
+    def _get(self, field: str, read: Callable[[], object]):
+        if field not in self._values:
+            self._values[field] = read()
+            self._fetched(field)
+        return self._values[field]
+
+    @property
+    def position(self) -> Tuple[float, float, float]:
+        return self._get("position", m.player_position)
+
+    @property
+    def orientation(self) -> Tuple[float, float]:
+        return self._get("orientation", m.player_orientation)
+
+    @property
+    def targeted_block(self):
+        """The block under the crosshair within TARGET_DISTANCE blocks, or None."""
+        return self._get("targeted_block", lambda: m.player_get_targeted_block(max_distance=TARGET_DISTANCE))
+
+    @property
+    def screen_name(self) -> Optional[str]:
+        return self._get("screen_name", m.screen_name)
+
+    @property
+    def hotbar_slot(self) -> Optional[int]:
+        """The selected hotbar slot (0-8), or None if it is empty."""
+        return self._get("hotbar_slot", lambda: next(
+            (item.slot for item in m.player_inventory() if item.selected), None))
+
+class GameStateTracker:
+    """Hands out the GameState of the scheduler's current tick.
+
+    The script must call invalidate() after it moves or turns the player itself within a tick (aiming,
+    fall recovery), otherwise the checks would keep seeing where the player was before.
+    """
+
+    def __init__(self, scheduler: TickScheduler):
+        self.scheduler = scheduler
+        self._state: Optional[GameState] = None
+        self.round_trips: Dict[str, int] = {}
+
+    def _fetched(self, field: str) -> None:
+        self.round_trips[field] = self.round_trips.get(field, 0) + 1
+
+    def current(self) -> GameState:
+        tick = self.scheduler.poll()
+        if self._state is None or self._state.tick != tick:
+            self._state = GameState(tick, self._fetched)
+        return self._state
+
+    def invalidate(self) -> None:
+        self._state = None
+
+    def reset_stats(self) -> None:
+        self.round_trips.clear()
@@ -0,0 +1,143 @@
+import queue
+from typing import Any, Callable, Dict, List, Optional
+
+import minescript as m
+
+# ------------------------------
+# tick scheduler
+# ------------------------------
+
+class TickTask:
+    """A periodic task; `fn` returning a truthy value reports that it acted (stop, recovery, ore mined...)."""
+
+    __slots__ = ("name", "period", "priority", "fn", "reentrant", "next_tick")
+
+    def __init__(self, name: str, period: int, priority: int, fn: Callable[[], object], reentrant: bool, next_tick: int):
+        self.name = name
+        self.period = period
+        self.priority = priority
+        self.fn = fn
+        self.reentrant = reentrant
+        self.next_tick = next_tick
+
+class TickScheduler:
+    """Cooperative scheduler that counts real game ticks from Minescript tick events.
+
+    wait_ticks() blocks on the event queue instead of sleeping and only runs reentrant tasks (cheap checks
+    such as the chat/stop check); every other task runs from run_due(), which the mining loops call at the
+    points where it is safe to turn, recover or mine something else. Ticks that arrive while the script is
+    busy are counted on the next call, so periods follow the game rather than the loop.
+    """
+
+    def __init__(self, events=None, tick_timeout: float = 0.5):
+        self._events = events
+        self.tick_timeout = tick_timeout
+        self.tick = 0
+        self._tasks: List[TickTask] = []
+        self._handlers: Dict[str, List[Callable[[Any], None]]] = {}
+        self._dispatching = False
+
+    def _queue(self):
+        if self._events is None:
+            self._events = m.EventQueue()
+            self._events.register_tick_listener()
+            for kind in self._handlers:
+                getattr(self._events, f"register_{kind}_listener")()
+        return self._events
+
+    def close(self) -> None:
+        if self._events is not None:
+            self._events.unregister_all()
+            self._events = None
+
+    def subscribe(self, kind: str, fn: Callable[[Any], None]) -> None:
+        """Forward events of `kind` ("block_update", "chunk", ...) arriving on the tick queue to `fn`."""
+        if kind not in self._handlers:
+            self._handlers[kind] = []
+            if self._events is not None:
+                getattr(self._events, f"register_{kind}_listener")()
+        self._handlers[kind].append(fn)
+
+    def every(self, period: int, fn: Callable[[], object], priority: int = 0,
+              name: Optional[str] = None, reentrant: bool = False) -> TickTask:
+        """Run `fn` every `period` ticks; lower priorities run first when several tasks are due."""
+        task = TickTask(name or fn.__name__, max(1, int(period)), priority, fn, reentrant, self.tick + max(1, int(period)))
+        self._tasks.append(task)
+        self._tasks.sort(key=lambda t: t.priority)
+        return task
+
+    def cancel(self, task: TickTask) -> None:
+        if task in self._tasks:
+            self._tasks.remove(task)
+
+    def postpone(self, task: TickTask, ticks: int = 0) -> None:
+        """Restart the task's period from now, plus `ticks` extra ticks."""
+        task.next_tick = self.tick + task.period + int(ticks)
+
+    def _dispatch(self, event) -> bool:
+        """Count a tick event (True) or hand any other event to its subscribers."""
+        if event.type == m.EventType.TICK:
+            self.tick += 1
+            return True
+        for fn in self._handlers.get(event.type, ()):
+            fn(event)
+        return False
+
+    def _pull(self, block: bool) -> bool:
+        try:
+            event = self._queue().get(block=block, timeout=self.tick_timeout if block else None)
+        except queue.Empty:
+            return False
+        return self._dispatch(event)
+
+    def _catch_up(self) -> None:
+        while True:
+            try:
+                event = self._queue().get(block=False)
+            except queue.Empty:
+                return
+            self._dispatch(event)
+
+    def poll(self) -> int:
+        """Count the ticks (and dispatch the events) that arrived since the last call, without waiting."""
+        self._catch_up()
+        return self.tick
+
+    def _run(self, reentrant_only: bool) -> Optional[str]:
+        for task in list(self._tasks):
+            if self.tick < task.next_tick or (reentrant_only and not task.reentrant):
+                continue
+            acted = task.fn()
+            task.next_tick = max(task.next_tick, self.tick + task.period)
+            if acted:
+                return task.name
+        return None
+
+    def wait_ticks(self, ticks: int, until: Optional[Callable[[], bool]] = None) -> bool:
+        """Block for `ticks` game ticks, or until `until()` holds after an event.
+
+        False as soon as a reentrant task acts (e.g. the player pressed T).
+        """
+        self._catch_up()
+        target = self.tick + int(ticks)
+        while self.tick < target:
+            if until is not None and until():
+                return True
+            if self._pull(True) and self._run(reentrant_only=True) is not None:
+                return False
+        return True
+
+    def run_due(self) -> Optional[str]:
+        """Run every due task in priority order and return the name of the first one that acted.
+
+        Tasks after the one that acted stay due for the next call; nested calls (a task that itself
+        reaches a safe point) do nothing.
+        """
+        if self._dispatching:
+            return None
+        self._dispatching = True
+        try:
+            self._catch_up()
+            return self._run(reentrant_only=False)
+        finally:
+            self._dispatching = False
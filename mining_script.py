@@ -1,5 +1,9 @@
-from visibility_scanner.scanner import scan_targets, scan_target
-from visibility_scanner.world_scanners import get_area, get_line
+from visibility_scanner.scanner import scan_targets, scan_target, scan_targets_ranked
+from visibility_scanner.world_scanners import AreaView, get_block_cache, get_blocks, get_line
+from visibility_scanner import instrumentation, warmup
+from control.tick_scheduler import TickScheduler
+from control.block_watch import BlockWatch
+from control.game_state import GameStateTracker
 import aim.player_aim
 
 import threading
@@ -31,6 +35,13 @@ target_ids = [
 ]
 
 reach = 4.8
+block_cache = get_block_cache()  # every block read goes through here; invalidate what the script breaks
+area_view = AreaView(reach=reach, cache=block_cache)  # incremental get_area shared by every ore scan
+lava_max_age = 1.0  # seconds a cached block may be reused by the lava check (lava spreads one block per 30 ticks in the overworld)
+lava_ids = ("minecraft:lava", "minecraft:flowing_lava")
+scheduler = TickScheduler()  # periodic checks run against game ticks
+block_watch = BlockWatch(scheduler, block_cache)  # block-update events wake the miner and refresh the cache
+game_state = GameStateTracker(scheduler)  # player state read once per tick and shared by every check
 previous_target = m.player_position()
 
 # Global flag to control the mining loop
@@ -38,20 +49,25 @@ mining_active = True
 recently_mined_positions = set()  # Track recently mined positions to avoid repeats
 original_y_level = None  # Track original Y level
 fall_recovery_active = False  # Track if we're in fall recovery mode
-last_y_check_time = 0
-y_check_interval = 0.5  # Check Y level every 0.5 seconds
+y_check_interval_ticks = 10  # Check Y level every 10 ticks (0.5 seconds)
+scanner_profile_path = None  # set to a .jsonl path to record per-stage scanner timings for the session
+
+def on_warmup_done(result):
+    if "error" in result:
+        m.echo(f"Scanner warm-up failed ({result['error']}); the first scan will compile instead")
+    elif "skipped" in result:
+        m.echo(f"Scanner warm-up skipped ({result['skipped']})")
+    elif result["seconds"] > 5.0:
+        m.echo(f"Scanner kernels compiled in {result['seconds']:.0f}s - run 'python -m visibility_scanner.warmup' "
+               "once to cache them on disk")
+
+warmup.start(on_done=on_warmup_done)  # load or compile the scanner kernels while the script starts up
 
 def wait_ticks(ticks):
-    """Wait for specified number of Minecraft ticks (20 ticks = 1 second)"""
+    """Wait for specified number of Minecraft ticks (20 ticks = 1 second) on the game's tick events"""
     if not mining_active:
         return False
-    start_time = time.time()
-    target_time = start_time + (ticks / 20.0)
-    while mining_active and time.time() < target_time:
-        if check_for_t_press():
-            return False
-        time.sleep(0.01)  # Small sleep to prevent CPU overload
-    return mining_active
+    return scheduler.wait_ticks(ticks) and mining_active
 
 def stop_mining():
     global mining_active
@@ -59,7 +75,7 @@ def stop_mining():
 
 def check_for_t_press():
     """Check if T key is pressed to stop mining"""
-    screen = m.screen_name()
+    screen = game_state.current().screen_name
     if screen and "chat" in screen.lower():
         
         stop_mining()
@@ -96,6 +112,7 @@ def gravel_mine():
     m.player_press_attack(True)
     wait_ticks(20)  # 20 ticks = 1 second
     m.player_press_attack(False)
+    block_cache.clear()  # falling gravel can change whole columns
     
     # Switch back to pickaxe (hotbar slot 1)
     if mining_active:
@@ -110,8 +127,9 @@ def check_for_lava():
         return False
     
     # Get player position and orientation
-    px, py, pz = m.player_position()
-    yaw, pitch = m.player_orientation()
+    state = game_state.current()
+    px, py, pz = state.position
+    yaw, pitch = state.orientation
     
     # Get the direction the player is facing (for strip mining, usually one of the cardinal directions)
     # For strip mining, we're typically facing north/south/east/west
@@ -145,16 +163,15 @@ def check_for_lava():
                 check_positions.append((int(px - distance), int(py), int(pz + dz)))
                 check_positions.append((int(px - distance), int(py + 1), int(pz + dz)))
     
+    if not check_positions:
+        return False
+    
     # Remove duplicate positions
     check_positions = list(set(check_positions))
     
-    # Check each position
-    for check_x, check_y, check_z in check_positions:
-        block_type = m.getblock(check_x, check_y, check_z)
-        if block_type and ("lava" in block_type.lower() or "flowing_lava" in block_type.lower()):
-            return True
-    
-    return False
+    # One batched read of the whole volume, matched against the lava ids once per palette entry
+    probe = get_blocks(check_positions, cache=block_cache, max_age=lava_max_age)
+    return bool(probe.base_mask(lava_ids).any())
 
 def check_and_recover_from_fall(locked_yaw, locked_pitch):
     """Check if player fell and attempt to recover by jumping for 3 seconds"""
@@ -249,14 +266,8 @@ def check_and_recover_from_fall(locked_yaw, locked_pitch):
     return True
 
 def monitor_fall_continuously(locked_yaw, locked_pitch):
-    """Continuous fall monitoring that runs in parallel with mining"""
-    global mining_active, original_y_level, fall_recovery_active, last_y_check_time
-    
-    current_time = time.time()
-    if current_time - last_y_check_time < y_check_interval:
-        return True
-        
-    last_y_check_time = current_time
+    """Continuous fall monitoring, scheduled every y_check_interval_ticks while strip mining"""
+    global mining_active, original_y_level, fall_recovery_active
     
     if not mining_active or fall_recovery_active:
         return True
@@ -264,7 +275,7 @@ def monitor_fall_continuously(locked_yaw, locked_pitch):
     if original_y_level is None:
         return True
         
-    current_y = m.player_position()[1]
+    current_y = game_state.current().position[1]
     y_difference = original_y_level - current_y
     
     # Trigger on any Y change >= 1 block
@@ -298,7 +309,7 @@ def lock_to_cardinal_direction():
     if not mining_active:
         return
     
-    current_yaw, current_pitch = m.player_orientation()
+    current_yaw, current_pitch = game_state.current().orientation
     
     # Normalize yaw to 0-360
     normalized_yaw = current_yaw % 360
@@ -319,6 +330,7 @@ def lock_to_cardinal_direction():
     target_pitch = 0
     
     aim.player_aim.ultra_fast_rotate_to(target_yaw, target_pitch)
+    game_state.invalidate()
     return target_yaw, target_pitch
 
 def emergency_lava_stop():
@@ -357,6 +369,7 @@ def mine_at_angle(yaw, pitch, check_gravel=True):
         
     # Use hybrid rotation - instant for small moves, fast smooth for larger
     aim.player_aim.hybrid_rotate_to(yaw, pitch, fast_threshold=15.0)
+    game_state.invalidate()
     wait_ticks(1)  # Only 1 tick for aiming to settle
 
     # Check for gravel initially for both pitch angles
@@ -375,7 +388,7 @@ def mine_at_angle(yaw, pitch, check_gravel=True):
             return False
             
         target_x, target_y, target_z = targeted_block.position
-        original_block_type = m.getblock(target_x, target_y, target_z)
+        original_block_type = block_cache.get(target_x, target_y, target_z, max_age=0)
         
         # If it's air, no need to mine
         if not original_block_type or original_block_type == "minecraft:air":
@@ -388,30 +401,34 @@ def mine_at_angle(yaw, pitch, check_gravel=True):
         max_mining_ticks = 50  # Reduced to 2.5 seconds max
         
         block_broken = False
+        block_watch.watch([(target_x, target_y, target_z)])
         
-        while mining_active and start_ticks < max_mining_ticks:
-            if check_for_t_press():
-                break
-                
-            # CONTINUOUS GRAVEL CHECK
-            if check_gravel and pitch in [0, 20]:
-                current_targeted_block = m.player_get_targeted_block(max_distance=5)
-                if current_targeted_block and current_targeted_block.type and "gravel" in current_targeted_block.type.lower():
-                    m.player_press_attack(False)
-                    wait_ticks(1)
-                    gravel_mine()
-                    return True
-                
-            # Check if block is broken
-            current_block_type = m.getblock(target_x, target_y, target_z)
-            if current_block_type == "minecraft:air":
-                block_broken = True
-                break
+        try:
+            while mining_active and start_ticks < max_mining_ticks:
+                if check_for_t_press():
+                    break
+                    
+                # CONTINUOUS GRAVEL CHECK
+                if check_gravel and pitch in [0, 20]:
+                    current_targeted_block = game_state.current().targeted_block
+                    if current_targeted_block and current_targeted_block.type and "gravel" in current_targeted_block.type.lower():
+                        m.player_press_attack(False)
+                        wait_ticks(1)
+                        gravel_mine()
+                        return True
                 
-            wait_ticks(1)
-            start_ticks += 1
-        
+                # Wake on the block-update event that breaks it instead of polling getblock
+                if block_watch.wait_for_break(1) is not None:
+                    block_broken = True
+                    break
+                    
+                start_ticks += 1
+        finally:
+            block_watch.unwatch([(target_x, target_y, target_z)])
         
+        if not block_broken:
+            # the attack stays held, so the block can still break after the last poll
+            area_view.mark_dirty([(target_x, target_y, target_z)])
         
     return False
 
@@ -462,7 +479,7 @@ def mine_single_block_simple(x, y, z):
     time.sleep(0.2)
     
     # Check if block was mined
-    return m.getblock(x, y, z) == "minecraft:air"
+    return block_cache.get(x, y, z, max_age=0) == "minecraft:air"
 
 def is_ore_block(block_type):
     """Check if a block is an ore"""
@@ -507,37 +524,41 @@ def mine_ore_vein_continuous():
     ores_mined = 0
     max_ores_in_vein = 20
     
+    ranked_scan = None
+    
     while mining_active and ores_mined < max_ores_in_vein:
         px, py, pz = m.player_position()
+        eye = (px, py + 1.62, pz)
         
-        occluders = get_area(position=(px, py + 1.62, pz))
+        # One ranked scan covers the whole cluster - only rescan once the player moved
+        if ranked_scan is None or ranked_scan.is_stale(eye):
+            occluders = area_view.get(eye)
 
-        # Filter out recently mined positions from occluders
-        filtered_occluders = []
-        for occluder in occluders:
-            pos, base, simple, meta = occluder
-            if pos not in recently_mined_positions:
-                filtered_occluders.append(occluder)
-        
-        aim_result = scan_targets(
-            position=(px, py + 1.62, pz), 
-            target_ids=target_ids, 
-            occluders=filtered_occluders, 
-            previous_target=previous_target
-        )
+            # Filter out recently mined positions from occluders
+            filtered_occluders = occluders.without(recently_mined_positions)
+            
+            ranked_scan = scan_targets_ranked(
+                position=eye, 
+                target_ids=target_ids, 
+                occluders=filtered_occluders,
+                reach=reach
+            )
 
-        if aim_result is None:
+        if not ranked_scan.targets:
             break
             
+        aim_result = ranked_scan.targets[0]
         previous_target = aim_result.optimal_pos
         x, y, z = aim_result.world_pos
         
         # Skip if this position was recently mined
         if (x, y, z) in recently_mined_positions:
+            ranked_scan.discard((x, y, z))
             continue
         
         if not is_player_close_to_ore(x, y, z):
             recently_mined_positions.add((x, y, z))
+            ranked_scan.discard((x, y, z))
             continue
         
         # RELEASE SNEAK for ore mining
@@ -548,41 +569,39 @@ def mine_ore_vein_continuous():
         time.sleep(0.5)
         
         # Get the ore type for logging
-        ore_type = m.getblock(x, y, z)
+        ore_type = block_cache.get(x, y, z)
         
         # Mine the ore completely
         m.player_press_attack(True)
         
-        # Use time-based mining instead of block change detection
+        # Longest time to keep mining before giving up on the ore
         mining_time = get_mining_time_for_ore(ore_type)
         
-        start_time = time.time()
-        ore_mined = False
+        # Wait for the block-update event that breaks it instead of polling getblock
+        block_watch.watch([(x, y, z)])
+        ore_mined = block_watch.wait_for_break(int(mining_time * 20)) is not None
+        block_watch.unwatch([(x, y, z)])
         
-        while mining_active and (time.time() - start_time) < mining_time:
-            # Check for T press
-            if check_for_t_press():
-                break
-                
-            # Check if block is actually gone (air)
-            current_block = m.getblock(x, y, z)
-            if current_block == "minecraft:air":
-                ore_mined = True
-                break
-                
-            time.sleep(0.1)
+        if not ore_mined and mining_active:
+            # One confirming read in case the break event was missed
+            ore_mined = block_cache.get(x, y, z, max_age=0) == "minecraft:air"
         
         m.player_press_attack(False)
         
         if ore_mined:
             ores_mined += 1
             recently_mined_positions.add((x, y, z))
+            area_view.mark_dirty([(x, y, z)])
+            
+            # Re-check only the ores behind the block that just broke
+            ranked_scan.invalidate([(x, y, z)])
             
             # Small delay before looking for next ore
             time.sleep(0.5)
         else:
             m.echo(f"✗ FAILED: Could not mine {ore_type} completely")
             recently_mined_positions.add((x, y, z))
+            area_view.mark_dirty([(x, y, z)])
             break
     
     # After ore vein mining, return to CURRENT orientation and re-enable sneak
@@ -656,77 +675,79 @@ def perform_strip_mining():
     pitch_angles = [0, 20]  
     
     # Stuck detection variables
-    movement_check_start = time.time()
     last_position = m.player_position()
     consecutive_stuck_checks = 0
     stuck_threshold = 3
     
-    while mining_active:
-        if check_for_t_press():
-            break
+    def fall_check():
+        # True after a fall recovery, so stuck detection starts over
+        return not monitor_fall_continuously(locked_yaw, locked_pitch)
+    
+    def stuck_check():
+        # CONTINUOUS MOVEMENT STUCK CHECK (every 20 ticks; if you have swift sneak, change this to 40)
+        nonlocal last_position, consecutive_stuck_checks
+        current_pos = game_state.current().position
+        distance_moved = math.sqrt(
+            (current_pos[0] - last_position[0])**2 + 
+            (current_pos[2] - last_position[2])**2
+        )
         
-        # CONTINUOUS FALL DETECTION CHECK
-        if not monitor_fall_continuously(locked_yaw, locked_pitch):
-            # After fall recovery, RESET stuck detection
-            last_position = m.player_position()
-            movement_check_start = time.time()
+        if distance_moved < 0.3:
+            consecutive_stuck_checks += 1
+            
+            # IMMEDIATE STUCK DETECTION: If ANY check shows 0.00 movement, trigger immediately
+            if distance_moved == 0.00 or consecutive_stuck_checks >= stuck_threshold:
+                return True
+        else:
+            # Reset counter if we moved
             consecutive_stuck_checks = 0
-            m.echo("🔄 Reset stuck detection after fall recovery")
-            continue
         
-        # LAVA CHECK
-        if check_for_lava():
-            m.echo("LAVA DETECTED! Stopping strip mining.")
-            m.player_press_forward(False)
-            emergency_lava_stop()
-            return False
-            
-        # Get current pitch angle
-        step_pitch = pitch_angles[current_pitch_index]
-        
-        # Mine at current angle
-        mine_at_angle(locked_yaw, step_pitch, True)
-        
-        # Switch to next pitch angle for next iteration
-        current_pitch_index = (current_pitch_index + 1) % len(pitch_angles)
-        
-        # CONTINUOUS MOVEMENT STUCK CHECK
-        current_time = time.time()
-        if current_time - movement_check_start >= 1.0:  # Check every second (if you have swift sneak, change this to 2.0, otherwise stay at 1.0)
-            current_pos = m.player_position()
-            distance_moved = math.sqrt(
-                (current_pos[0] - last_position[0])**2 + 
-                (current_pos[2] - last_position[2])**2
-            )
-            
-            
-            if distance_moved < 0.3:
-                consecutive_stuck_checks += 1
-                
-                # IMMEDIATE STUCK DETECTION: If ANY check shows 0.00 movement, trigger immediately
-                if distance_moved == 0.00:
-                    break
-                    
-                if consecutive_stuck_checks >= stuck_threshold:
-                    break
-            else:
-                # Reset counter if we moved
+        # Update for next check
+        last_position = current_pos
+        return False
+    
+    def ore_scan():
+        # Ore check - if ore found, handle it and continue mining
+        return mining_active and ore_check()
+    
+    stuck_task = scheduler.every(20, stuck_check, priority=3, name="stuck")
+    strip_tasks = [
+        scheduler.every(y_check_interval_ticks, fall_check, priority=2, name="fall"),
+        stuck_task,
+        scheduler.every(2, ore_scan, priority=4, name="ore"),
+    ]
+    
+    try:
+        while mining_active:
+            # Chat, lava, fall, stuck and ore checks, whichever are due on this tick
+            fired = scheduler.run_due()
+            if fired == "lava":
+                return False
+            if fired == "stuck":
+                break
+            if fired in ("fall", "ore"):
+                # Reset stuck detection since we moved for fall recovery or ore mining
+                game_state.invalidate()
+                last_position = game_state.current().position
                 consecutive_stuck_checks = 0
+                scheduler.postpone(stuck_task)
+                if fired == "fall":
+                    m.echo("🔄 Reset stuck detection after fall recovery")
+                continue
+                
+            # Get current pitch angle
+            step_pitch = pitch_angles[current_pitch_index]
             
-            # Update for next check
-            last_position = current_pos
-            movement_check_start = current_time
+            # Mine at current angle
+            mine_at_angle(locked_yaw, step_pitch, True)
             
-        # Ore check - if ore found, handle it and continue mining
-        if mining_active and ore_check():
-            # Ore was mined, but continue strip mining instead of returning
-            # Reset stuck detection since we moved for ore mining
-            last_position = m.player_position()
-            movement_check_start = time.time()
-            consecutive_stuck_checks = 0
-            continue
-        
-        wait_ticks(1)
+            # Switch to next pitch angle for next iteration
+            current_pitch_index = (current_pitch_index + 1) % len(pitch_angles)
+            
+            wait_ticks(1)
+    finally:
+        for task in strip_tasks:
+            scheduler.cancel(task)
     
     # If we broke out of the loop due to stuck detection, handle it
     if mining_active and (consecutive_stuck_checks >= stuck_threshold or consecutive_stuck_checks > 0):
@@ -778,27 +799,28 @@ def quick_ore_scan():
     
     temp_mined_positions = set()
     
+    ranked_scan = None
+    
     while mining_active and ores_mined < max_quick_ores:
         px, py, pz = m.player_position()
+        eye = (px, py + 1.62, pz)
         
-        occluders = get_area(position=(px, py + 1.62, pz))
+        if ranked_scan is None or ranked_scan.is_stale(eye):
+            occluders = area_view.get(eye)
 
-        filtered_occluders = []
-        for occluder in occluders:
-            pos, base, simple, meta = occluder
-            if pos not in recently_mined_positions and pos not in temp_mined_positions:
-                filtered_occluders.append(occluder)
-        
-        aim_result = scan_targets(
-            position=(px, py + 1.62, pz), 
-            target_ids=target_ids, 
-            occluders=filtered_occluders, 
-            previous_target=previous_target
-        )
+            filtered_occluders = occluders.without(recently_mined_positions | temp_mined_positions)
+            
+            ranked_scan = scan_targets_ranked(
+                position=eye, 
+                target_ids=target_ids, 
+                occluders=filtered_occluders,
+                reach=reach
+            )
 
-        if aim_result is None:
+        if not ranked_scan.targets:
             break
             
+        aim_result = ranked_scan.targets[0]
         previous_target = aim_result.optimal_pos
         x, y, z = aim_result.world_pos
         
@@ -810,25 +832,21 @@ def quick_ore_scan():
         aim.player_aim.hybrid_rotate_to(aim_result.target_angle[0], aim_result.target_angle[1], fast_threshold=15.0)
         wait_ticks(1)  # Only 1 tick
         
-        ore_type = m.getblock(x, y, z)
+        ore_type = block_cache.get(x, y, z)
         
         # Mine using targeting system
         m.player_press_attack(True)
         
-        start_ticks = 0
         max_mining_ticks = int(get_mining_time_for_ore(ore_type) * 20 * 0.5)  # 50% faster mining
         
-        ore_mined = False
+        # Wait for the block-update event that breaks it instead of polling getblock
+        block_watch.watch([(x, y, z)])
+        ore_mined = block_watch.wait_for_break(max_mining_ticks) is not None
+        block_watch.unwatch([(x, y, z)])
         
-        while mining_active and start_ticks < max_mining_ticks:
-            if check_for_t_press():
-                break
-            current_block = m.getblock(x, y, z)
-            if current_block == "minecraft:air":
-                ore_mined = True
-                break
-            wait_ticks(1)
-            start_ticks += 1
+        if not ore_mined and mining_active:
+            # One confirming read in case the break event was missed
+            ore_mined = block_cache.get(x, y, z, max_age=0) == "minecraft:air"
             
         m.player_press_attack(False)
         
@@ -836,10 +854,13 @@ def quick_ore_scan():
             ores_mined += 1
             temp_mined_positions.add((x, y, z))
             recently_mined_positions.add((x, y, z))
+            area_view.mark_dirty([(x, y, z)])
+            ranked_scan.invalidate([(x, y, z)])
             wait_ticks(3)  # Reduced from 6 ticks
         else:
             temp_mined_positions.add((x, y, z))
             recently_mined_positions.add((x, y, z))
+            area_view.mark_dirty([(x, y, z)])
             break
     
     # After ore mining, return to CURRENT orientation
@@ -860,21 +881,18 @@ def ore_check():
     if not mining_active:
         return False
 
-    px, py, pz = m.player_position()
+    px, py, pz = game_state.current().position
     
-    occluders = get_area(position=(px, py + 1.62, pz))
+    occluders = area_view.get((px, py + 1.62, pz))
 
-    filtered_occluders = []
-    for occluder in occluders:
-        pos, base, simple, meta = occluder
-        if pos not in recently_mined_positions:
-            filtered_occluders.append(occluder)
+    filtered_occluders = occluders.without(recently_mined_positions)
     
     aim_result = scan_targets(
         position=(px, py + 1.62, pz), 
         target_ids=target_ids, 
         occluders=filtered_occluders, 
-        previous_target=previous_target
+        previous_target=previous_target,
+        reach=reach
     )
 
     if aim_result is None:
@@ -885,27 +903,39 @@ def ore_check():
 
 def mining_time():
     """Main mining loop using tick-based timing"""
-    global mining_active, previous_target, recently_mined_positions, original_y_level, fall_recovery_active, last_y_check_time
+    global mining_active, previous_target, recently_mined_positions, original_y_level, fall_recovery_active
     
     mining_active = True
     previous_target = m.player_position()
     recently_mined_positions.clear()
+    if scanner_profile_path:
+        instrumentation.reset()
+        instrumentation.enable()
+    block_cache.clear()
     original_y_level = None
     fall_recovery_active = False
-    last_y_check_time = time.time()
     
     # Lock to cardinal direction at start
     lock_to_cardinal_direction()
     
-    # Convert time intervals to tick intervals
+    # Tick periods of the checks
     ore_check_interval_ticks = 30
     chat_check_interval_ticks = 3
     lava_check_interval_ticks = 6
     
-    last_ore_check_ticks = 0
-    last_chat_check_ticks = 0
-    last_lava_check_ticks = 0
-    current_tick = 0
+    def lava_check():
+        if check_for_lava():
+            m.echo("MAIN LOOP: Lava detected - emergency stop!")
+            emergency_lava_stop()
+            return True
+        return False
+    
+    # The chat check also runs while waiting for ticks; lava runs wherever a loop calls scheduler.run_due()
+    main_tasks = [
+        scheduler.every(chat_check_interval_ticks, check_for_t_press, priority=0, name="chat", reentrant=True),
+        scheduler.every(lava_check_interval_ticks, lava_check, priority=1, name="lava"),
+    ]
+    last_ore_check_tick = scheduler.tick
     
     m.player_press_sneak(True)
     wait_ticks(2)
@@ -914,52 +944,46 @@ def mining_time():
     
     try:
         while mining_active:
-            current_tick += 1
-            
-            # Check for T press
-            if current_tick - last_chat_check_ticks >= chat_check_interval_ticks:
-                if check_for_t_press():
-                    break
-                last_chat_check_ticks = current_tick
-            
-            # Lava detection
-            if current_tick - last_lava_check_ticks >= lava_check_interval_ticks:
-                if check_for_lava():
-                    m.echo("MAIN LOOP: Lava detected - emergency stop!")
-                    emergency_lava_stop()
-                    break
-                last_lava_check_ticks = current_tick
+            if scheduler.run_due() in ("chat", "lava"):
+                break
             
             # Use targeting-based strip mining
             ore_mined_in_cycle = perform_strip_mining()
             
             if ore_mined_in_cycle:
-                last_ore_check_ticks = current_tick + 30
+                last_ore_check_tick = scheduler.tick + 30
                 continue
             
             # Less frequent full ore vein scans
-            if current_tick - last_ore_check_ticks >= ore_check_interval_ticks:
+            if scheduler.tick - last_ore_check_tick >= ore_check_interval_ticks:
                 if len(recently_mined_positions) > 30:
                     recently_mined_positions = set(list(recently_mined_positions)[-15:])
                 
                 if random.random() < 0.4:
                     vein_mined = mine_ore_vein_continuous()
                     if vein_mined:
-                        last_ore_check_ticks = current_tick + 40
+                        last_ore_check_tick = scheduler.tick + 40
                     else:
-                        last_ore_check_ticks = current_tick
+                        last_ore_check_tick = scheduler.tick
                 else:
-                    last_ore_check_ticks = current_tick + 10
+                    last_ore_check_tick = scheduler.tick + 10
             
             # Small tick delay to prevent CPU overload
             wait_ticks(1)
             
     finally:
+        for task in main_tasks:
+            scheduler.cancel(task)
+        scheduler.close()
         m.player_press_sneak(False)
         m.player_press_forward(False)
         m.player_press_attack(False)
         m.player_press_backward(False)
         m.player_press_jump(False)  # Ensure jump is released
+        if scanner_profile_path:
+            instrumentation.dump_jsonl(scanner_profile_path)
+            instrumentation.disable()
+            m.echo(instrumentation.report())
         m.echo("Mining script stopped completely.")
 
 # Start the mining script immediately
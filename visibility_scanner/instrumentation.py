@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import deque
+from functools import wraps
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# ------------------------------
+# consts
+# ------------------------------
+
+DEFAULT_WINDOW = 1024
+HISTOGRAM_EDGES_MS = (0.1, 0.3, 1.0, 3.0, 10.0, 30.0, 100.0, 300.0)
+
+# ------------------------------
+# state
+# ------------------------------
+
+_enabled = False
+_window = DEFAULT_WINDOW
+_stages: Dict[str, StageStats] = {}
+_local = threading.local()
+
+def enable(window: int = DEFAULT_WINDOW) -> None:
+    """Start recording; each stage keeps its last `window` calls for the percentiles and histograms."""
+    global _enabled, _window
+    if window != _window:
+        _window = int(window)
+        _stages.clear()
+    _enabled = True
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+def is_enabled() -> bool:
+    return _enabled
+
+def reset() -> None:
+    _stages.clear()
+
+# ------------------------------
+# stage stats
+# ------------------------------
+
+class StageStats:
+    """Lifetime totals of one stage plus a rolling window of its recent calls."""
+
+    def __init__(self, name: str, window: int):
+        self.name = name
+        self.calls = 0
+        self.total_s = 0.0
+        self.totals: Dict[str, float] = {}
+        self.samples: Deque[Tuple[float, Dict[str, float]]] = deque(maxlen=window)
+
+    def add(self, seconds: float, counts: Dict[str, float]) -> None:
+        self.calls += 1
+        self.total_s += seconds
+        for k, v in counts.items():
+            self.totals[k] = self.totals.get(k, 0.0) + v
+        self.samples.append((seconds, counts))
+
+    def histogram(self, edges_ms: Sequence[float] = HISTOGRAM_EDGES_MS) -> List[int]:
+        """Calls in the window per wall-time bucket: [< edges[0], [edges[0], edges[1]), ..., >= edges[-1]]."""
+        ms = np.array([s for s, _ in self.samples], dtype=np.float64) * 1e3
+        return np.bincount(np.searchsorted(np.asarray(edges_ms), ms, side="right"),
+                           minlength=len(edges_ms) + 1).tolist()
+
+    def summary(self) -> Dict[str, Any]:
+        ms = np.array([s for s, _ in self.samples], dtype=np.float64) * 1e3
+        out: Dict[str, Any] = {
+            "stage": self.name,
+            "calls": self.calls,
+            "total_ms": 1e3 * self.total_s,
+            "window": int(ms.size),
+        }
+        if ms.size:
+            out.update(p50_ms=float(np.percentile(ms, 50)), p99_ms=float(np.percentile(ms, 99)),
+                       max_ms=float(ms.max()), histogram=self.histogram())
+        for k in sorted(self.totals):
+            vals = [c[k] for _, c in self.samples if k in c]
+            out[f"{k}_mean"] = float(np.mean(vals)) if vals else 0.0
+        return out
+
+def _stats_for(name: str) -> StageStats:
+    stats = _stages.get(name)
+    if stats is None:
+        stats = _stages[name] = StageStats(name, _window)
+    return stats
+
+# ------------------------------
+# recording
+# ------------------------------
+
+class _Stage:
+    __slots__ = ("name", "counts", "t0")
+    enabled = True
+
+    def __init__(self, name: str):
+        self.name = name
+        self.counts: Dict[str, float] = {}
+
+    def note(self, **counts: float) -> None:
+        for k, v in counts.items():
+            self.counts[k] = self.counts.get(k, 0.0) + float(v)
+
+    def __enter__(self) -> _Stage:
+        _stack().append(self)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        seconds = time.perf_counter() - self.t0
+        _stack().pop()
+        _stats_for(self.name).add(seconds, self.counts)
+
+class _NullStage:
+    __slots__ = ()
+    enabled = False
+
+    def note(self, **counts: float) -> None:
+        pass
+
+    def __enter__(self) -> _NullStage:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+_NULL_STAGE = _NullStage()
+
+def _stack() -> List[_Stage]:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def stage(name: str):
+    """Context manager timing one call of `name`; a shared no-op object while recording is off."""
+    return _Stage(name) if _enabled else _NULL_STAGE
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """Decorator recording every call of the function as stage `name`."""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+def note(**counts: float) -> None:
+    """Add counts (occluders, rays, blocks...) to the innermost stage running on this thread."""
+    if _enabled:
+        stack = _stack()
+        if stack:
+            stack[-1].note(**counts)
+
+def record(name: str, seconds: float, **counts: float) -> None:
+    """Record a call timed elsewhere."""
+    if _enabled:
+        _stats_for(name).add(seconds, {k: float(v) for k, v in counts.items()})
+
+# ------------------------------
+# queries
+# ------------------------------
+
+def stats(name: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Summary per stage (calls, total, p50/p99/max over the window, mean counts, histogram)."""
+    if name is not None:
+        return {name: _stages[name].summary()} if name in _stages else {}
+    return {n: s.summary() for n, s in _stages.items()}
+
+def report() -> str:
+    """One line per stage, slowest total first; short enough for m.echo."""
+    lines = []
+    for s in sorted(stats().values(), key=lambda s: -s["total_ms"]):
+        line = f"{s['stage']}: {s['calls']} calls, {s['total_ms']:.1f}ms"
+        if s["window"]:
+            line += f", p50 {s['p50_ms']:.2f}ms p99 {s['p99_ms']:.2f}ms"
+        lines.append(line)
+    return "\n".join(lines)
+
+def dump_jsonl(path: str, label: Optional[str] = None) -> int:
+    """Append one JSON line per stage summary to `path`; returns the number of lines written."""
+    now = time.time()
+    rows = list(stats().values())
+    with open(path, "a", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps({"time": now, "label": label, **row}) + "\n")
+    return len(rows)
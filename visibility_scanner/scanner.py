@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 import math
-from typing import Tuple, Optional, List, Dict, Any, FrozenSet, Mapping, NamedTuple, Sequence
+import os
+from typing import Tuple, Optional, List, Dict, Any, FrozenSet, Mapping, NamedTuple, Sequence, Union
 from functools import lru_cache
 from numba import types
 from numba.typed import Dict
@@ -9,13 +10,23 @@ from numba.typed import Dict
 import numpy as np
 import numba as nb
 
+from visibility_scanner import instrumentation
+
 # ------------------------------
 # consts
 # ------------------------------
 
 EPS = 1e-12
 INF = 1e300
-BVH_THRESHOLD = 2048
+BVH_THRESHOLD = 16              # fewer occluders than this are cheaper brute-forced than put in a BVH
+GRID_MAX_CELLS = 1 << 24
+SCAN_MODES = ("per_target", "single_pass", "parallel")
+RASTER_METHODS = ("auto", "brute", "bvh", "grid", "packet")
+PACKET_TILE = 8                 # ray packets of the packet raster method are PACKET_TILE^2 pixel tiles
+OCCLUSION_EYE_BINS = 4          # eye sub-block offset bins per axis
+OCCLUSION_FACE_PATCHES = 2      # face patches per face edge
+OCCLUSION_MAX_D2 = 56           # largest stencil (squared block offset, reach 8)
+OCCLUSION_TABLE_VERSION = 1
 
 
 # ------------------------------
@@ -32,6 +43,7 @@ class TargetInfo(NamedTuple):
     target_angle: tuple[float, float]
     yaw_bounds: tuple[float, float]
     pitch_bounds: tuple[float, float]
+    solid_angle: float = 0.0
 
 
 # ------------------------------
@@ -127,6 +139,186 @@ def build_bvh(prims_min: np.ndarray, prims_max: np.ndarray, prim_ids: np.ndarray
     return (node_min, node_max, node_left_arr, node_right_arr,
             node_first_arr, node_count_arr, leaf_prim_indices_arr, postorder_arr)
 
+
+@nb.njit(cache=True)
+def build_bvh_sah_nb(prims_min: np.ndarray, prims_max: np.ndarray,
+                     max_leaf_size: int = 4, n_bins: int = 12):
+    Na = prims_min.shape[0]
+    max_nodes = max(1, 2 * Na - 1)
+
+    node_min = np.empty((max_nodes, 3), dtype=np.float64)
+    node_max = np.empty((max_nodes, 3), dtype=np.float64)
+    node_left = np.full(max_nodes, -1, dtype=np.int32)
+    node_right = np.full(max_nodes, -1, dtype=np.int32)
+    node_first = np.zeros(max_nodes, dtype=np.int32)
+    node_count = np.zeros(max_nodes, dtype=np.int32)
+    leaf_prim_indices = np.arange(Na).astype(np.int32)
+
+    centroids = 0.5 * (prims_min + prims_max)
+
+    stack_node = np.empty(max_nodes, dtype=np.int32)
+    stack_start = np.empty(max_nodes, dtype=np.int32)
+    stack_end = np.empty(max_nodes, dtype=np.int32)
+    sp = 0
+    stack_node[0] = 0; stack_start[0] = 0; stack_end[0] = Na
+    sp = 1
+    n_nodes = 1
+
+    bin_count = np.empty(n_bins, dtype=np.int64)
+    bin_min = np.empty((n_bins, 3), dtype=np.float64)
+    bin_max = np.empty((n_bins, 3), dtype=np.float64)
+    right_area = np.empty(n_bins, dtype=np.float64)
+    right_count = np.empty(n_bins, dtype=np.int64)
+
+    while sp > 0:
+        sp -= 1
+        node = stack_node[sp]
+        start = stack_start[sp]
+        end = stack_end[sp]
+        cnt = end - start
+
+        if cnt == 0:
+            for a in range(3):
+                node_min[node, a] = INF
+                node_max[node, a] = -INF
+            node_first[node] = 0
+            node_count[node] = 0
+            continue
+
+        cmin0 = INF; cmin1 = INF; cmin2 = INF
+        cmax0 = -INF; cmax1 = -INF; cmax2 = -INF
+        for a in range(3):
+            node_min[node, a] = INF
+            node_max[node, a] = -INF
+        for i in range(start, end):
+            pi = leaf_prim_indices[i]
+            for a in range(3):
+                if prims_min[pi, a] < node_min[node, a]:
+                    node_min[node, a] = prims_min[pi, a]
+                if prims_max[pi, a] > node_max[node, a]:
+                    node_max[node, a] = prims_max[pi, a]
+            c0 = centroids[pi, 0]; c1 = centroids[pi, 1]; c2 = centroids[pi, 2]
+            if c0 < cmin0: cmin0 = c0
+            if c0 > cmax0: cmax0 = c0
+            if c1 < cmin1: cmin1 = c1
+            if c1 > cmax1: cmax1 = c1
+            if c2 < cmin2: cmin2 = c2
+            if c2 > cmax2: cmax2 = c2
+
+        if cnt <= max_leaf_size or cnt == 1:
+            node_first[node] = start
+            node_count[node] = cnt
+            continue
+
+        best_cost = INF
+        best_axis = -1
+        best_split = -1
+        for axis in range(3):
+            if axis == 0:
+                lo = cmin0; ext = cmax0 - cmin0
+            elif axis == 1:
+                lo = cmin1; ext = cmax1 - cmin1
+            else:
+                lo = cmin2; ext = cmax2 - cmin2
+            if ext <= EPS:
+                continue
+            scale = n_bins / ext
+
+            for b in range(n_bins):
+                bin_count[b] = 0
+                for a in range(3):
+                    bin_min[b, a] = INF
+                    bin_max[b, a] = -INF
+            for i in range(start, end):
+                pi = leaf_prim_indices[i]
+                b = int((centroids[pi, axis] - lo) * scale)
+                if b >= n_bins:
+                    b = n_bins - 1
+                bin_count[b] += 1
+                for a in range(3):
+                    if prims_min[pi, a] < bin_min[b, a]:
+                        bin_min[b, a] = prims_min[pi, a]
+                    if prims_max[pi, a] > bin_max[b, a]:
+                        bin_max[b, a] = prims_max[pi, a]
+
+            # sweep from the right to get the area/count of every right partition
+            r0 = INF; r1 = INF; r2 = INF
+            R0 = -INF; R1 = -INF; R2 = -INF
+            rc = 0
+            for b in range(n_bins - 1, 0, -1):
+                if bin_count[b] > 0:
+                    rc += bin_count[b]
+                    r0 = min(r0, bin_min[b, 0]); r1 = min(r1, bin_min[b, 1]); r2 = min(r2, bin_min[b, 2])
+                    R0 = max(R0, bin_max[b, 0]); R1 = max(R1, bin_max[b, 1]); R2 = max(R2, bin_max[b, 2])
+                right_count[b] = rc
+                if rc > 0:
+                    e0 = R0 - r0; e1 = R1 - r1; e2 = R2 - r2
+                    right_area[b] = e0 * e1 + e1 * e2 + e2 * e0
+                else:
+                    right_area[b] = 0.0
+
+            l0 = INF; l1 = INF; l2 = INF
+            L0 = -INF; L1 = -INF; L2 = -INF
+            lc = 0
+            for b in range(n_bins - 1):
+                if bin_count[b] > 0:
+                    lc += bin_count[b]
+                    l0 = min(l0, bin_min[b, 0]); l1 = min(l1, bin_min[b, 1]); l2 = min(l2, bin_min[b, 2])
+                    L0 = max(L0, bin_max[b, 0]); L1 = max(L1, bin_max[b, 1]); L2 = max(L2, bin_max[b, 2])
+                if lc == 0 or right_count[b + 1] == 0:
+                    continue
+                e0 = L0 - l0; e1 = L1 - l1; e2 = L2 - l2
+                cost = lc * (e0 * e1 + e1 * e2 + e2 * e0) + right_count[b + 1] * right_area[b + 1]
+                if cost < best_cost:
+                    best_cost = cost
+                    best_axis = axis
+                    best_split = b + 1
+
+        mid = start + cnt // 2
+        if best_axis != -1:
+            if best_axis == 0:
+                lo = cmin0; ext = cmax0 - cmin0
+            elif best_axis == 1:
+                lo = cmin1; ext = cmax1 - cmin1
+            else:
+                lo = cmin2; ext = cmax2 - cmin2
+            scale = n_bins / ext
+            i = start
+            j = end - 1
+            while i <= j:
+                b = int((centroids[leaf_prim_indices[i], best_axis] - lo) * scale)
+                if b >= n_bins:
+                    b = n_bins - 1
+                if b < best_split:
+                    i += 1
+                else:
+                    tmp = leaf_prim_indices[i]
+                    leaf_prim_indices[i] = leaf_prim_indices[j]
+                    leaf_prim_indices[j] = tmp
+                    j -= 1
+            if i > start and i < end:
+                mid = i
+
+        left = n_nodes
+        right = n_nodes + 1
+        n_nodes += 2
+        node_left[node] = left
+        node_right[node] = right
+
+        stack_node[sp] = right; stack_start[sp] = mid; stack_end[sp] = end
+        sp += 1
+        stack_node[sp] = left; stack_start[sp] = start; stack_end[sp] = mid
+        sp += 1
+
+    # children are always allocated after their parent, so reverse creation
+    # order is a valid bottom-up order for bvh_refit_numba
+    postorder = np.arange(n_nodes - 1, -1, -1).astype(np.int32)
+
+    return (node_min[:n_nodes].copy(), node_max[:n_nodes].copy(),
+            node_left[:n_nodes].copy(), node_right[:n_nodes].copy(),
+            node_first[:n_nodes].copy(), node_count[:n_nodes].copy(),
+            leaf_prim_indices, postorder)
+
 @nb.njit(cache=True, fastmath=True)
 def bvh_refit_numba(node_min, node_max,
                     node_left, node_right,
@@ -200,7 +392,28 @@ def bvh_refit_numba(node_min, node_max,
                 if node_max[r, 2] > node_max[node, 2]:
                     node_max[node, 2] = node_max[r, 2]
 
-@nb.njit(cache=True, parallel=True, fastmath=True)
+@nb.njit(cache=True, inline='always')
+def _bvh_leaf_hit_nb(position, dir_vec, first, cnt, leaf_prim_indices, prim_min, prim_max, prim_id,
+                     best_t, best_oid, max_depth):
+    for p_i in range(first, first + cnt):
+        prim_idx = leaf_prim_indices[p_i]
+        tmin_p, tmax_p = _ray_aabb_intersect_single(position, dir_vec,
+                                    prim_min[prim_idx, 0], prim_max[prim_idx, 0],
+                                    prim_min[prim_idx, 1], prim_max[prim_idx, 1],
+                                    prim_min[prim_idx, 2], prim_max[prim_idx, 2])
+        if math.isnan(tmin_p):
+            continue
+        tt = tmin_p if tmin_p >= 0.0 else tmax_p
+        if math.isnan(tt) or tt < 0.0:
+            continue
+        if tt > max_depth:
+            continue
+        if tt < best_t:
+            best_t = tt
+            best_oid = prim_id[prim_idx]
+    return best_t, best_oid
+
+@nb.njit(cache=True, parallel=True)
 def rasterize_with_bvh_nb(
     position: np.ndarray,
     directions: np.ndarray,
@@ -212,6 +425,7 @@ def rasterize_with_bvh_nb(
     depth: np.ndarray, top_idx: np.ndarray,
     max_depth: float
 ):
+    # no fastmath: it assumes no NaN and folds away the isnan() miss tests, so every node would be entered
     nrays = directions.shape[0]
     n_nodes = node_min.shape[0]
     STACK_SIZE = 128
@@ -249,24 +463,9 @@ def rasterize_with_bvh_nb(
             left = node_left[node_idx]
             right = node_right[node_idx]
             if left == -1 and right == -1:
-                first = node_first[node_idx]
-                cnt = node_count[node_idx]
-                for p_i in range(first, first + cnt):
-                    prim_idx = leaf_prim_indices[p_i]
-                    tmin_p, tmax_p = _ray_aabb_intersect_single(position, dir_vec,
-                                                prim_min[prim_idx, 0], prim_max[prim_idx, 0],
-                                                prim_min[prim_idx, 1], prim_max[prim_idx, 1],
-                                                prim_min[prim_idx, 2], prim_max[prim_idx, 2])
-                    if math.isnan(tmin_p):
-                        continue
-                    tt = tmin_p if tmin_p >= 0.0 else tmax_p
-                    if math.isnan(tt) or tt < 0.0:
-                        continue
-                    if tt > max_depth:
-                        continue
-                    if tt < best_t:
-                        best_t = tt
-                        best_oid = prim_id[prim_idx]
+                best_t, best_oid = _bvh_leaf_hit_nb(position, dir_vec, node_first[node_idx], node_count[node_idx],
+                                                    leaf_prim_indices, prim_min, prim_max, prim_id,
+                                                    best_t, best_oid, max_depth)
                 continue
 
             if right != -1:
@@ -277,6 +476,136 @@ def rasterize_with_bvh_nb(
         depth[i] = best_t
         top_idx[i] = best_oid
 
+@nb.njit(cache=True)
+def _packet_order_nb(pixels, yaw_bins, tile, order, packet_start):
+    """Counting sort of the rays (pixel indices `pixels`) by tile x tile pixel tile: order[packet_start[p]:
+    packet_start[p + 1]] are the rays of packet p, in pixel order. Returns the number of packets."""
+    tiles_y = (yaw_bins + tile - 1) // tile
+    n_tiles = packet_start.shape[0] - 1
+    for t in range(n_tiles + 1):
+        packet_start[t] = 0
+    n = pixels.shape[0]
+    for k in range(n):
+        px = pixels[k]
+        packet_start[(px // yaw_bins) // tile * tiles_y + (px % yaw_bins) // tile + 1] += 1
+    for t in range(n_tiles):
+        packet_start[t + 1] += packet_start[t]
+    for k in range(n):
+        px = pixels[k]
+        t = (px // yaw_bins) // tile * tiles_y + (px % yaw_bins) // tile
+        order[packet_start[t]] = k
+        packet_start[t] += 1
+    # packet_start[t] is now the end of tile t; keep the boundaries of the non-empty tiles
+    m = 0
+    prev = 0
+    for t in range(n_tiles):
+        end = packet_start[t]
+        if end > prev:
+            packet_start[m] = prev
+            m += 1
+            prev = end
+    packet_start[m] = n
+    return m
+
+@nb.njit(cache=True, inline='always')
+def _packet_slab_nb(o, lo, hi, dmin, dmax):
+    """Bounds (lowest entry, highest exit) of the slab [lo, hi] over every direction component in [dmin, dmax]
+    from origin o; unbounded when the packet straddles the axis."""
+    if dmin > EPS:
+        a = lo - o
+        b = hi - o
+    elif dmax < -EPS:
+        a = hi - o
+        b = lo - o
+    else:
+        return -INF, INF
+    i0 = 1.0 / dmax
+    i1 = 1.0 / dmin
+    return min(a * i0, a * i1), max(b * i0, b * i1)
+
+@nb.njit(cache=True, parallel=True)
+def rasterize_with_bvh_packets_nb(
+    position: np.ndarray,
+    directions: np.ndarray,
+    order: np.ndarray, packet_start: np.ndarray, n_packets: int,
+    node_min: np.ndarray, node_max: np.ndarray,
+    node_left: np.ndarray, node_right: np.ndarray,
+    node_first: np.ndarray, node_count: np.ndarray,
+    leaf_prim_indices: np.ndarray,
+    prim_min: np.ndarray, prim_max: np.ndarray, prim_id: np.ndarray,
+    depth: np.ndarray, top_idx: np.ndarray,
+    max_depth: float
+):
+    """rasterize_with_bvh_nb over packets of coherent rays (see _packet_order_nb), one shared stack each.
+
+    Inner nodes are culled for the whole packet with the interval of its directions (every ray starts at
+    `position`); leaves run the per-ray node and primitive tests, so depth and ids match the per-ray kernel.
+    """
+    # no fastmath, as in rasterize_with_bvh_nb
+    n_nodes = node_min.shape[0]
+    if n_nodes == 0:
+        return
+    STACK_SIZE = 128
+    SLACK = 1e-6
+    for p in nb.prange(n_packets):
+        s = packet_start[p]
+        e = packet_start[p + 1]
+        dmin0 = dmin1 = dmin2 = INF
+        dmax0 = dmax1 = dmax2 = -INF
+        far = -INF
+        for k in range(s, e):
+            i = order[k]
+            dmin0 = min(dmin0, directions[i, 0]); dmax0 = max(dmax0, directions[i, 0])
+            dmin1 = min(dmin1, directions[i, 1]); dmax1 = max(dmax1, directions[i, 1])
+            dmin2 = min(dmin2, directions[i, 2]); dmax2 = max(dmax2, directions[i, 2])
+            far = max(far, depth[i])
+
+        stack = np.empty(STACK_SIZE, dtype=np.int32)
+        sp = 0
+        stack[sp] = 0
+        sp += 1
+        while sp > 0:
+            sp -= 1
+            node_idx = stack[sp]
+            n0, f0 = _packet_slab_nb(position[0], node_min[node_idx, 0], node_max[node_idx, 0], dmin0, dmax0)
+            n1, f1 = _packet_slab_nb(position[1], node_min[node_idx, 1], node_max[node_idx, 1], dmin1, dmax1)
+            n2, f2 = _packet_slab_nb(position[2], node_min[node_idx, 2], node_max[node_idx, 2], dmin2, dmax2)
+            t_entry = max(max(n0, n1), max(n2, 0.0))
+            t_exit = min(min(f0, f1), f2)
+            # slack keeps the interval test conservative against the per-ray divisions
+            if t_entry > t_exit + SLACK or t_entry > max_depth + SLACK or t_entry > far + SLACK:
+                continue
+
+            left = node_left[node_idx]
+            right = node_right[node_idx]
+            if left == -1 and right == -1:
+                far = -INF
+                for k in range(s, e):
+                    i = order[k]
+                    dir_vec = directions[i]
+                    best_t = depth[i]
+                    tmin, tmax = _ray_aabb_intersect_single(
+                        position, dir_vec,
+                        node_min[node_idx, 0], node_max[node_idx, 0],
+                        node_min[node_idx, 1], node_max[node_idx, 1],
+                        node_min[node_idx, 2], node_max[node_idx, 2],
+                    )
+                    if not math.isnan(tmin):
+                        t_ray = tmin if tmin >= 0.0 else 0.0
+                        if t_ray <= max_depth and t_ray < best_t:
+                            best_t, top_idx[i] = _bvh_leaf_hit_nb(position, dir_vec, node_first[node_idx],
+                                                                  node_count[node_idx], leaf_prim_indices,
+                                                                  prim_min, prim_max, prim_id,
+                                                                  best_t, top_idx[i], max_depth)
+                            depth[i] = best_t
+                    far = max(far, best_t)
+                continue
+
+            if right != -1:
+                stack[sp] = right; sp += 1
+            if left != -1:
+                stack[sp] = left; sp += 1
+
 
 # ------------------------------
 # angle and direction helpers
@@ -417,6 +746,15 @@ def yaw_intervals_overlap(a0: float, a1: float, b0: float, b1: float) -> bool:
     return d <= 0.5 * (s1 + s2) + 1e-12
 
 
+def _normalize_angle_arr(a: np.ndarray) -> np.ndarray:
+    return (a + math.pi) % (2.0 * math.pi) - math.pi
+
+def _interval_center_span_arr(a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    span = b - a
+    center = _normalize_angle_arr(_normalize_angle_arr(a) + 0.5 * span)
+    return center, span
+
+
 # ------------------------------
 # aabb and uv helpers
 # ------------------------------
@@ -447,13 +785,27 @@ def aabb_corners_nb(aabb):
     corners[7] = (xmax, ymax, zmax)
     return corners
 
+@nb.njit(cache=True, fastmath=True)
+def _aabb_yaw_interval_nb(aabb, position):
+    # wrap-aware: yaw_lo is normalized, yaw_hi = yaw_lo + span may pass pi;
+    # an eye above/below the box sees it at every yaw
+    px, py, pz = position
+    xmin, xmax, zmin, zmax = aabb[0], aabb[1], aabb[4], aabb[5]
+    if xmin <= px <= xmax and zmin <= pz <= zmax:
+        return -math.pi, math.pi
+
+    yaws = np.empty(4, dtype=np.float64)
+    yaws[0] = math.atan2(zmin - pz, xmin - px)
+    yaws[1] = math.atan2(zmin - pz, xmax - px)
+    yaws[2] = math.atan2(zmax - pz, xmin - px)
+    yaws[3] = math.atan2(zmax - pz, xmax - px)
+    return wrapped_interval_from_angles(yaws)
+
 @nb.njit(cache=True, fastmath=True)
 def angular_bounds_for_aabb_nb(aabb, position):
     px, py, pz = position
     corners = aabb_corners_nb(aabb)
     
-    yaw_min = INF
-    yaw_max = -INF
     pitch_min = INF
     pitch_max = -INF
     
@@ -462,17 +814,37 @@ def angular_bounds_for_aabb_nb(aabb, position):
         vx = cx - px
         vy = cy - py
         vz = cz - pz
-        yaw = np.arctan2(vz, vx)
         hyp = np.hypot(vx, vz)
         pitch = -np.arctan2(vy, hyp)
         
-        yaw_min = min(yaw_min, yaw)
-        yaw_max = max(yaw_max, yaw)
         pitch_min = min(pitch_min, pitch)
         pitch_max = max(pitch_max, pitch)
-        
+
+    yaw_min, yaw_max = _aabb_yaw_interval_nb(aabb, position)
     return yaw_min, yaw_max, pitch_min, pitch_max
 
+@nb.njit(cache=True, fastmath=True)
+def covering_angular_bounds_nb(aabb, position):
+    # unlike angular_bounds_for_aabb_nb the pitch range also covers extremes
+    # reached on the edges of the box, which matters for boxes next to the eye
+    px, py, pz = position
+    xmin, xmax, ymin, ymax, zmin, zmax = aabb[0], aabb[1], aabb[2], aabb[3], aabb[4], aabb[5]
+
+    yaw_lo, yaw_hi = _aabb_yaw_interval_nb(aabb, position)
+
+    hx = max(xmin - px, 0.0, px - xmax)
+    hz = max(zmin - pz, 0.0, pz - zmax)
+    h_min = math.sqrt(hx * hx + hz * hz)
+    hx = max(abs(xmin - px), abs(xmax - px))
+    hz = max(abs(zmin - pz), abs(zmax - pz))
+    h_max = math.sqrt(hx * hx + hz * hz)
+
+    vy_lo = ymin - py
+    vy_hi = ymax - py
+    f_hi = math.atan2(vy_hi, h_min if vy_hi > 0.0 else h_max)
+    f_lo = math.atan2(vy_lo, h_min if vy_lo < 0.0 else h_max)
+    return yaw_lo, yaw_hi, -f_hi, -f_lo
+
 @nb.njit(cache=True, fastmath=True)
 def face_and_uv_for_hitpoint_nb(aabb, hx, hy, hz):
     xmin, xmax, ymin, ymax, zmin, zmax = aabb
@@ -1271,9 +1643,367 @@ def face_axis_sphere_bounds_nb(axis_id: int, k: float,
     yaw_max = normalize_angle_rad_nb(yaw_max_rel + center)
     return yaw_min, yaw_max, pitch_min, pitch_max, dmin
 
+@nb.njit(cache=True)
+def _face_bins_nb(yaw_min, yaw_max, pitch_min, pitch_max,
+                  adb_yaw_min, yaw_span, yaw_bins, adb_pitch_min, pitch_span, pitch_bins, out):
+    # out = (iy0, iy1, iy0b, iy1b, ip0, ip1); iy0b = -1 unless the yaw range wraps
+    fy_a = (normalize_angle_rad(yaw_min) - adb_yaw_min) / yaw_span * yaw_bins
+    fy_b = (normalize_angle_rad(yaw_max) - adb_yaw_min) / yaw_span * yaw_bins
+    if fy_b >= fy_a:
+        out[0] = min(max(int(math.floor(fy_a)), 0), yaw_bins - 1)
+        out[1] = min(max(int(math.ceil(fy_b)), 0), yaw_bins - 1)
+        out[2] = -1
+        out[3] = -1
+    else:
+        out[0] = 0
+        out[1] = min(max(int(math.ceil(fy_b)), 0), yaw_bins - 1)
+        out[2] = min(max(int(math.floor(fy_a)), 0), yaw_bins - 1)
+        out[3] = yaw_bins - 1
+    fp_min_f = (pitch_min - adb_pitch_min) / pitch_span * pitch_bins
+    fp_max_f = (pitch_max - adb_pitch_min) / pitch_span * pitch_bins
+    out[4] = min(max(int(math.floor(fp_min_f)), 0), pitch_bins - 1)
+    out[5] = min(max(int(math.ceil(fp_max_f)), 0), pitch_bins - 1)
+
+@nb.njit(cache=True)
+def _mask_intervals_nb(mask):
+    n = mask.shape[0]
+    out = np.empty((n, 2), dtype=np.int64)
+    m = 0
+    i = 0
+    while i < n:
+        while i < n and not mask[i]:
+            i += 1
+        if i >= n:
+            break
+        j = i
+        while j + 1 < n and mask[j + 1]:
+            j += 1
+        out[m, 0] = i
+        out[m, 1] = j
+        m += 1
+        i = j + 1
+    return out[:m]
+
+@nb.njit(cache=True)
+def _flatnonzero_into_nb(mask, out):
+    # np.flatnonzero into a preallocated buffer; returns the count
+    n = 0
+    for i in range(mask.shape[0]):
+        if mask[i]:
+            out[n] = i
+            n += 1
+    return n
+
+@nb.njit(cache=True, fastmath=True)
+def _unit_block_hit_t_nb(bx, by, bz, px, py, pz, dxi, dyi, dzi):
+    # per-ray body of ray_aabb_intersection_vec on a unit block, plus the entry/exit pick
+    tmin_i = -INF
+    tmax_i = INF
+    miss = False
+    for ax in range(3):
+        if ax == 0:
+            di = dxi; p = px; lo = bx
+        elif ax == 1:
+            di = dyi; p = py; lo = by
+        else:
+            di = dzi; p = pz; lo = bz
+        hi = lo + 1.0
+        if di > EPS or di < -EPS:
+            inv = 1.0 / di
+            t1 = (lo - p) * inv
+            t2 = (hi - p) * inv
+            if t1 < t2:
+                a_min = t1; a_max = t2
+            else:
+                a_min = t2; a_max = t1
+        else:
+            a_min = -INF; a_max = INF
+            if (p < lo) or (p > hi):
+                miss = True
+        if a_min > tmin_i:
+            tmin_i = a_min
+        if a_max < tmax_i:
+            tmax_i = a_max
+    if miss or (tmin_i > tmax_i) or (tmax_i < 0.0):
+        return False, 0.0
+    return True, (tmin_i if tmin_i >= 0.0 else tmax_i)
+
+@nb.njit(cache=True, fastmath=True)
+def _face_hit_t_nb(axis_id, k, umin, umax, vmin, vmax, px, py, pz, dxi, dyi, dzi):
+    # per-ray body of ray_axis_aligned_rect_min_t_into / update_depth_with_face_masked
+    if axis_id == 0:
+        di = dxi
+        if not (di > EPS or di < -EPS):
+            return False, 0.0
+        t = (k - px) / di
+        if t < 0.0:
+            return False, 0.0
+        uu = py + dyi * t
+        vv = pz + dzi * t
+    elif axis_id == 1:
+        di = dyi
+        if not (di > EPS or di < -EPS):
+            return False, 0.0
+        t = (k - py) / di
+        if t < 0.0:
+            return False, 0.0
+        uu = px + dxi * t
+        vv = pz + dzi * t
+    else:
+        di = dzi
+        if not (di > EPS or di < -EPS):
+            return False, 0.0
+        t = (k - pz) / di
+        if t < 0.0:
+            return False, 0.0
+        uu = px + dxi * t
+        vv = py + dyi * t
+    if (uu < umin - EPS) or (uu > umax + EPS) or (vv < vmin - EPS) or (vv > vmax + EPS):
+        return False, 0.0
+    return True, t
+
+@nb.njit(cache=True, parallel=True)
+def refine_depth_in_cones_nb(position,
+                             dx, dy, dz, depth, top_idx,
+                             adb_yaw_min, yaw_span, yaw_bins,
+                             adb_pitch_min, pitch_span, pitch_bins,
+                             cone_bounds, cone_mask, min_cone_bins,
+                             block_pos, face_start, face_axis, face_rect, face_oid,
+                             max_depth, slice_threshold, sel_idx, sel_depth):
+    """
+    Compiled BlockGeometryCache._refine_depth_in_cones_py over a flat face table.
+
+    block_pos (B, 3) int, faces of block b are face_start[b]:face_start[b + 1] of
+    face_axis (F,), face_rect (F, 5) = (k, umin, umax, vmin, vmax) and face_oid (F,)
+    (-1 = do not write top_idx). cone_bounds (C, 4) holds the margin-padded
+    (yaw_lo, yaw_hi, pitch_lo, pitch_hi) of every cone, cone_mask (C-contiguous) their pixel union.
+    sel_idx (int64) and sel_depth (float64) are N-sized scratch for the selected pixels.
+    """
+    _refine_depth_in_cones_body(position, dx, dy, dz, depth, top_idx,
+                                adb_yaw_min, yaw_span, yaw_bins,
+                                adb_pitch_min, pitch_span, pitch_bins,
+                                cone_bounds, cone_mask, min_cone_bins,
+                                block_pos, face_start, face_axis, face_rect, face_oid,
+                                max_depth, slice_threshold, sel_idx, sel_depth)
+
+# inlined so its pranges run in parallel in refine_depth_in_cones_nb and serially inside the per-target
+# prange of _scan_targets_parallel_nb
+@nb.njit(cache=True, inline='always')
+def _refine_depth_in_cones_body(position,
+                                dx, dy, dz, depth, top_idx,
+                                adb_yaw_min, yaw_span, yaw_bins,
+                                adb_pitch_min, pitch_span, pitch_bins,
+                                cone_bounds, cone_mask, min_cone_bins,
+                                block_pos, face_start, face_axis, face_rect, face_oid,
+                                max_depth, slice_threshold, sel_idx, sel_depth):
+    # no fastmath: depth holds inf for rays that escape and the bin edges must match the reference
+    px = position[0]; py = position[1]; pz = position[2]
+    n_cones = cone_bounds.shape[0]
+    n_blocks = block_pos.shape[0]
+    two_pi = 2.0 * math.pi
+
+    cone_yc = np.empty(n_cones, dtype=np.float64)
+    cone_ys = np.empty(n_cones, dtype=np.float64)
+    for c in range(n_cones):
+        span = cone_bounds[c, 1] - cone_bounds[c, 0]
+        a_n = (cone_bounds[c, 0] + math.pi) % two_pi - math.pi
+        cone_yc[c] = (a_n + 0.5 * span + math.pi) % two_pi - math.pi
+        cone_ys[c] = span
+
+    # blocks whose angular bounds meet any cone
+    aabb = np.empty(6, dtype=np.float64)
+    filtered = np.empty(n_blocks, dtype=np.int64)
+    n_filtered = 0
+    for b in range(n_blocks):
+        aabb[0] = block_pos[b, 0]; aabb[1] = block_pos[b, 0] + 1.0
+        aabb[2] = block_pos[b, 1]; aabb[3] = block_pos[b, 1] + 1.0
+        aabb[4] = block_pos[b, 2]; aabb[5] = block_pos[b, 2] + 1.0
+        bymin, bymax, bpmin, bpmax = angular_bounds_for_aabb_nb(aabb, position)
+        bspan = bymax - bymin
+        b_n = (bymin + math.pi) % two_pi - math.pi
+        byc = (b_n + 0.5 * bspan + math.pi) % two_pi - math.pi
+        for c in range(n_cones):
+            if (bpmax < cone_bounds[c, 2]) or (bpmin > cone_bounds[c, 3]):
+                continue
+            yaw_d = abs((byc - cone_yc[c] + math.pi) % two_pi - math.pi)
+            if yaw_d <= 0.5 * (bspan + cone_ys[c]) + 1e-12:
+                filtered[n_filtered] = b
+                n_filtered += 1
+                break
+
+    # face bounds, and the rows/columns where some face rectangle meets a cone
+    n_faces = face_axis.shape[0]
+    face_b = np.empty((n_faces, 5), dtype=np.float64)
+    face_bins = np.empty((n_faces, 6), dtype=np.int64)
+    y_mask = np.zeros(yaw_bins, dtype=np.bool_)
+    p_mask = np.zeros(pitch_bins, dtype=np.bool_)
+    any_candidates = False
+    for fi in range(n_filtered):
+        b = filtered[fi]
+        for f in range(face_start[b], face_start[b + 1]):
+            ymn, ymx, pmn, pmx, dmin = face_axis_sphere_bounds_nb(
+                face_axis[f], face_rect[f, 0], face_rect[f, 1], face_rect[f, 2], face_rect[f, 3], face_rect[f, 4],
+                px, py, pz)
+            face_b[f, 0] = ymn; face_b[f, 1] = ymx
+            face_b[f, 2] = pmn; face_b[f, 3] = pmx
+            face_b[f, 4] = dmin
+            if dmin > max_depth:
+                continue
+            _face_bins_nb(ymn, ymx, pmn, pmx, adb_yaw_min, yaw_span, yaw_bins,
+                          adb_pitch_min, pitch_span, pitch_bins, face_bins[f])
+            fp0 = face_bins[f, 4]; fp1 = face_bins[f, 5]
+            for r in range(2):
+                fy0 = face_bins[f, 2 * r]; fy1 = face_bins[f, 2 * r + 1]
+                if fy0 < 0:
+                    continue
+                for iy in range(fy0, fy1 + 1):
+                    for ip in range(fp0, fp1 + 1):
+                        if cone_mask[ip, iy]:
+                            y_mask[iy] = True
+                            p_mask[ip] = True
+                            any_candidates = True
+
+    if not any_candidates:
+        return
+
+    iy_int = _mask_intervals_nb(y_mask)
+    ip_int = _mask_intervals_nb(p_mask)
+    if iy_int.shape[0] == 0 or ip_int.shape[0] == 0:
+        return
+
+    n_sel = 0
+    for a in range(iy_int.shape[0]):
+        for r in range(ip_int.shape[0]):
+            n_sel += (iy_int[a, 1] - iy_int[a, 0] + 1) * (ip_int[r, 1] - ip_int[r, 0] + 1)
+    idxs = sel_idx[:n_sel]
+    j = 0
+    for a in range(iy_int.shape[0]):
+        for r in range(ip_int.shape[0]):
+            for ip in range(ip_int[r, 0], ip_int[r, 1] + 1):
+                for iy in range(iy_int[a, 0], iy_int[a, 1] + 1):
+                    idxs[j] = ip * yaw_bins + iy
+                    j += 1
+
+    cur_depth_sel = sel_depth[:n_sel]
+    cone_flat = cone_mask.reshape(cone_mask.size)
+    has_dx_pos = False; has_dx_neg = False
+    has_dy_pos = False; has_dy_neg = False
+    has_dz_pos = False; has_dz_neg = False
+    for j in range(n_sel):
+        idx = idxs[j]
+        cur_depth_sel[j] = depth[idx]
+        has_dx_pos |= dx[idx] > 0.0; has_dx_neg |= dx[idx] < 0.0
+        has_dy_pos |= dy[idx] > 0.0; has_dy_neg |= dy[idx] < 0.0
+        has_dz_pos |= dz[idx] > 0.0; has_dz_neg |= dz[idx] < 0.0
+
+    total_bins_sel = min(n_sel, min_cone_bins)
+    min_hits_required = max(1, int(math.ceil(0.03 * total_bins_sel)))
+    use_slice = n_sel <= slice_threshold
+
+    # candidates: blocks that could win at least min_hits_required cone pixels
+    hits = np.zeros(n_filtered, dtype=np.int64)
+    for fi in nb.prange(n_filtered):
+        b = filtered[fi]
+        bx = block_pos[b, 0] * 1.0
+        by = block_pos[b, 1] * 1.0
+        bz = block_pos[b, 2] * 1.0
+        cnt = 0
+        for j in range(n_sel):
+            idx = idxs[j]
+            # cone pixels the coarse pass saw escape max_depth have nothing to hit
+            if not cone_flat[idx] or cur_depth_sel[j] > max_depth:
+                continue
+            hit, tblock = _unit_block_hit_t_nb(bx, by, bz, px, py, pz, dx[idx], dy[idx], dz[idx])
+            if hit and tblock <= cur_depth_sel[j] + EPS:
+                cnt += 1
+        hits[fi] = cnt
+
+    candidates = np.empty(n_filtered, dtype=np.int64)
+    cand_d2 = np.empty(n_filtered, dtype=np.float64)
+    n_cand = 0
+    for fi in range(n_filtered):
+        if hits[fi] >= min_hits_required:
+            b = filtered[fi]
+            candidates[n_cand] = b
+            cx = block_pos[b, 0] + 0.5 - px
+            cy = block_pos[b, 1] + 0.5 - py
+            cz = block_pos[b, 2] + 0.5 - pz
+            cand_d2[n_cand] = cx * cx + cy * cy + cz * cz
+            n_cand += 1
+
+    order = np.argsort(cand_d2[:n_cand], kind='mergesort')
+
+    for oi in range(n_cand):
+        b = candidates[order[oi]]
+        for f in range(face_start[b], face_start[b + 1]):
+            axis_id = face_axis[f]
+            k = face_rect[f, 0]
+            umin = face_rect[f, 1]; umax = face_rect[f, 2]
+            vmin = face_rect[f, 3]; vmax = face_rect[f, 4]
+            if axis_id == 0:
+                dk = k - px
+                if (dk > 0.0 and not has_dx_pos) or (dk < 0.0 and not has_dx_neg):
+                    continue
+            elif axis_id == 1:
+                dk = k - py
+                if (dk > 0.0 and not has_dy_pos) or (dk < 0.0 and not has_dy_neg):
+                    continue
+            else:
+                dk = k - pz
+                if (dk > 0.0 and not has_dz_pos) or (dk < 0.0 and not has_dz_neg):
+                    continue
+            if face_b[f, 4] > max_depth:
+                continue
+            pitch_overlap = False
+            for c in range(n_cones):
+                if face_b[f, 3] >= cone_bounds[c, 2] and face_b[f, 2] <= cone_bounds[c, 3]:
+                    pitch_overlap = True
+                    break
+            if not pitch_overlap:
+                continue
+            yaw_overlap = False
+            for r in range(2):
+                fy0 = face_bins[f, 2 * r]; fy1 = face_bins[f, 2 * r + 1]
+                if fy0 < 0:
+                    continue
+                for a in range(iy_int.shape[0]):
+                    if min(fy1, iy_int[a, 1]) >= max(fy0, iy_int[a, 0]):
+                        yaw_overlap = True
+                        break
+                if yaw_overlap:
+                    break
+            if not yaw_overlap:
+                continue
+
+            oid = face_oid[f]
+            for j in nb.prange(n_sel):
+                idx = idxs[j]
+                if cone_flat[idx] and cur_depth_sel[j] > max_depth:
+                    continue
+                hit, t = _face_hit_t_nb(axis_id, k, umin, umax, vmin, vmax, px, py, pz, dx[idx], dy[idx], dz[idx])
+                if not hit:
+                    continue
+                if t > max_depth:
+                    continue
+                # the sliced reference compares against the depth from before the refine,
+                # the full-buffer one against the running depth
+                if use_slice:
+                    if not (t < cur_depth_sel[j]):
+                        continue
+                elif t >= depth[idx]:
+                    continue
+                depth[idx] = t
+                if oid >= 0:
+                    top_idx[idx] = oid
+
 class BlockGeometryCache:
+    # which block coordinate offsets (k, u, v) of a face, per face axis
+    _FACE_OFFSET_AXES = np.array([[0, 1, 2], [1, 0, 2], [2, 0, 1]], dtype=np.int64)
+
     def __init__(self):
         self._cache: Dict[Tuple[str, FrozenSet[Tuple[str, Any]]], List[Dict[str, Any]]] = {}
+        self._face_cache: Dict[Tuple[Any, ...], np.ndarray] = {}
+        self._kind_cache: Dict[str, str] = {}
 
     def _serialize_meta_val(self, v: Any):
         if isinstance(v, (list, tuple)):
@@ -1328,27 +2058,48 @@ class BlockGeometryCache:
             },
         ]
 
+    def _shape_kind(self, block_id: str) -> str:
+        kind = self._kind_cache.get(block_id)
+        if kind is None:
+            base_low = block_id.lower().strip()
+            if base_low in ("minecraft:air", "minecraft:water"):
+                kind = "empty"
+            elif base_low.endswith("_slab") or ":slab" in base_low:
+                kind = "slab"
+            elif base_low.endswith("_stairs") or "stairs" in base_low or ":stair" in base_low:
+                kind = "stair"
+            elif base_low.endswith("_pane") or "pane" in base_low:
+                kind = "pane"
+            else:
+                kind = "full_block"
+            self._kind_cache[block_id] = kind
+        return kind
+
+    def _shape_key(self, block_id: str, meta: Optional[Mapping[str, Any]]) -> Tuple[Any, ...]:
+        # only the properties the _build_* methods read; every full block shares one shape
+        kind = self._shape_kind(block_id)
+        if kind in ("empty", "full_block"):
+            return (kind,)
+        meta = meta or {}
+        if kind == "slab":
+            return (kind, str(meta.get("half", "bottom")).lower() == "top")
+        if kind == "stair":
+            return (kind, str(meta.get('facing', 'north')).lower(), str(meta.get('half', 'bottom')).lower(),
+                    str(meta.get('shape', 'straight')).lower())
+        return (kind, frozenset(meta.get("connections", ())), float(meta.get("thickness", 1.0 / 16.0)))
+
     def get_polygons_for_block(self, block_id: str, meta: Optional[Mapping[str, Any]] = None) -> List[Dict[str, Any]]:
         key = self._meta_key(block_id, meta)
         if key in self._cache:
             return self._cache[key]
 
-        base_low = block_id.lower().strip()
+        short_type = self._shape_kind(block_id)
 
-        if base_low in ("minecraft:air", "minecraft:water"):
+        if short_type == "empty":
             polys: List[Dict[str, Any]] = []
             self._cache[key] = polys
             return polys
 
-        if base_low.endswith("_slab") or ":slab" in base_low:
-            short_type = "slab"
-        elif base_low.endswith("_stairs") or "stairs" in base_low or ":stair" in base_low:
-            short_type = "stair"
-        elif base_low.endswith("_pane") or "pane" in base_low:
-            short_type = "pane"
-        else:
-            short_type = "full_block"
-
         if short_type == "pane":
             polys = self._build_pane(meta or {})
         elif short_type == "slab":
@@ -1511,21 +2262,26 @@ class BlockGeometryCache:
                         'block': (block_pos, block_type, meta)})
         return out
 
+    def shape_faces(self, block_type: str, meta: Optional[Mapping[str, Any]] = None) -> np.ndarray:
+        """Read-only (F, 6) array of block-local faces (axis, k, umin, umax, vmin, vmax), built once per shape."""
+        key = self._shape_key(block_type, meta)
+        faces = self._face_cache.get(key)
+        if faces is None:
+            descs = [p['axis_desc'] for p in self.get_polygons_for_block(block_type, meta)
+                     if p.get('axis_desc', None) is not None]
+            faces = np.array(descs, dtype=np.float64).reshape((-1, 6))
+            faces.setflags(write=False)
+            self._face_cache[key] = faces
+        return faces
+
     def world_faces(self, block_pos: BlockPos, block_type: str, meta: Optional[Mapping[str, Any]] = None) -> List[Tuple[int, float, float, float, float, float]]:
-        bx, by, bz = block_pos
-        base = self.get_polygons_for_block(block_type, meta)
+        faces = self.shape_faces(block_type, meta)
+        if faces.shape[0] == 0:
+            return []
+        off = np.asarray(block_pos, dtype=np.float64)[self._FACE_OFFSET_AXES[faces[:, 0].astype(np.int64)]]
         out: List[Tuple[int, float, float, float, float, float]] = []
-        for p in base:
-            ad = p.get('axis_desc', None)
-            if ad is None:
-                continue
-            axis_id, k, umin, umax, vmin, vmax = ad
-            if axis_id == 0:
-                out.append((0, float(k + bx), float(umin + by), float(umax + by), float(vmin + bz), float(vmax + bz)))
-            elif axis_id == 1:
-                out.append((1, float(k + by), float(umin + bx), float(umax + bx), float(vmin + bz), float(vmax + bz)))
-            else:
-                out.append((2, float(k + bz), float(umin + bx), float(umax + bx), float(vmin + by), float(vmax + by)))
+        for f, o in zip(faces.tolist(), off.tolist()):
+            out.append((int(f[0]), f[1] + o[0], f[2] + o[1], f[3] + o[1], f[4] + o[2], f[5] + o[2]))
         return out
 
     def polygon_sphere_bounds(self, verts_world, position):
@@ -1539,54 +2295,189 @@ class BlockGeometryCache:
         ip = np.arange(ip0, ip1 + 1, dtype=np.int32)
         return (ip[:, None] * yaw_bins + iy[None, :]).ravel()
 
+    def _target_cone(self, adb: HighResADB, position: Vec3, target_aabb: AABB,
+                     yaw_margin_deg: float, pitch_margin_deg: float):
+        tymin, tymax, tpmin, tpmax = angular_bounds_for_aabb_nb(target_aabb, position)
+        yaw_margin = math.radians(yaw_margin_deg)
+        pitch_margin = math.radians(pitch_margin_deg)
+        tymin_m = tymin - yaw_margin
+        tymax_m = tymax + yaw_margin
+        tpmin_m = tpmin - pitch_margin
+        tpmax_m = tpmax + pitch_margin
+
+        targ_iy_ranges, targ_ip_min, targ_ip_max = adb.bins_for_angles(tymin_m, tymax_m, tpmin_m, tpmax_m)
+
+        return (tymin_m, tymax_m, tpmin_m, tpmax_m, targ_iy_ranges, targ_ip_min, targ_ip_max)
+
+    @instrumentation.timed("refine")
     def analytic_refine_depth_in_target_cone(self,
         adb: HighResADB,
         position: Vec3,
         target_aabb: AABB,
-        blocks: List[Tuple[BlockPos, str, str, Optional[Dict[str, Any]]]],
+        blocks: Union[BlockSnapshot, List[Tuple[BlockPos, str, str, Optional[Dict[str, Any]]]]],
         max_depth: float = 200.0,
         yaw_margin_deg: float = 0.4,
         pitch_margin_deg: float = 0.4,
         pos_to_occluder_id: Optional[Dict[BlockPos, int]] = None,
+        use_numba: bool = True,
     ):
-        tymin, tymax, tpmin, tpmax = angular_bounds_for_aabb_nb(target_aabb, position)
-        yaw_margin = math.radians(yaw_margin_deg)
-        pitch_margin = math.radians(pitch_margin_deg)
-        tymin_m = normalize_angle_rad(tymin - yaw_margin)
-        tymax_m = tymax + yaw_margin
-        tpmin_m = tpmin - pitch_margin
-        tpmax_m = tpmax + pitch_margin
+        cone = self._target_cone(adb, position, target_aabb, yaw_margin_deg, pitch_margin_deg)
+        refine = self._refine_depth_in_cones if use_numba else self._refine_depth_in_cones_py
+        refine(adb, position, [cone], blocks, max_depth, pos_to_occluder_id)
 
+    @instrumentation.timed("refine")
+    def analytic_refine_depth_in_targets_cone(self,
+        adb: HighResADB,
+        position: Vec3,
+        target_aabbs: Sequence[AABB],
+        blocks: Union[BlockSnapshot, List[Tuple[BlockPos, str, str, Optional[Dict[str, Any]]]]],
+        max_depth: float = 200.0,
+        yaw_margin_deg: float = 0.4,
+        pitch_margin_deg: float = 0.4,
+        pos_to_occluder_id: Optional[Dict[BlockPos, int]] = None,
+        use_numba: bool = True,
+    ):
+        """Refine the ADB once over the union of all target cones so every target can be read from one buffer."""
+        cones = [self._target_cone(adb, position, aabb, yaw_margin_deg, pitch_margin_deg)
+                 for aabb in target_aabbs]
+        if not cones:
+            return
+        refine = self._refine_depth_in_cones if use_numba else self._refine_depth_in_cones_py
+        refine(adb, position, cones, blocks, max_depth, pos_to_occluder_id)
+
+    def _cone_mask(self, adb: HighResADB, cones: List[Tuple[Any, ...]]) -> np.ndarray:
+        # union of the target cones in pixel space, in the ADB's arena
+        cone_mask = adb._cone_mask
+        cone_mask.fill(False)
+        for (_, _, _, _, targ_iy_ranges, targ_ip_min, targ_ip_max) in cones:
+            for (ty0, ty1) in targ_iy_ranges:
+                cone_mask[targ_ip_min:targ_ip_max+1, ty0:ty1+1] = True
+        return cone_mask
+
+    def face_table(self, blocks: Union[BlockSnapshot, List[Tuple[BlockPos, str, str, Optional[Dict[str, Any]]]]],
+                   pos_to_occluder_id: Optional[Dict[BlockPos, int]] = None):
+        """Flat (block_pos, face_start, face_axis, face_rect, face_oid) arrays of every block with faces."""
+        n = len(blocks)
+        shape_of_key: Dict[Tuple[Any, ...], int] = {}
+        shapes: List[np.ndarray] = []
+
+        def shape_id(base, meta):
+            key = self._shape_key(base, meta)
+            sid = shape_of_key.get(key)
+            if sid is None:
+                sid = len(shapes)
+                shape_of_key[key] = sid
+                shapes.append(self.shape_faces(base, meta))
+            return sid
+
+        block_oid = np.full(n, -1, dtype=np.int32)
+        if isinstance(blocks, BlockSnapshot):
+            # one shape lookup per palette entry instead of per block
+            state_sid = np.zeros(len(blocks.palette), dtype=np.int64)
+            for s in np.unique(blocks.states).tolist():
+                base, _, meta = blocks.palette[s]
+                state_sid[s] = shape_id(base, meta)
+            shape_ids = state_sid[blocks.states]
+            block_pos = blocks.positions.astype(np.int64)
+            if pos_to_occluder_id is not None:
+                for i, (x, y, z) in enumerate(blocks.positions.tolist()):
+                    block_oid[i] = pos_to_occluder_id.get((x, y, z), -1)
+        else:
+            shape_ids = np.empty(n, dtype=np.int64)
+            block_pos = np.empty((n, 3), dtype=np.int64)
+            for i, (pos, base, short_type, meta) in enumerate(blocks):
+                shape_ids[i] = shape_id(base, meta)
+                block_pos[i] = pos
+                if pos_to_occluder_id is not None:
+                    block_oid[i] = pos_to_occluder_id.get(tuple(pos), -1)
+
+        shape_counts = np.array([f.shape[0] for f in shapes], dtype=np.int64)
+        shape_start = np.concatenate(([0], np.cumsum(shape_counts)[:-1])).astype(np.int64)
+        all_faces = np.concatenate(shapes, axis=0) if shapes else np.empty((0, 6), dtype=np.float64)
+
+        keep = shape_counts[shape_ids] > 0
+        shape_ids = shape_ids[keep]
+        block_pos = block_pos[keep]
+        block_oid = block_oid[keep]
+        counts = shape_counts[shape_ids]
+        face_start = np.zeros(counts.shape[0] + 1, dtype=np.int64)
+        np.cumsum(counts, out=face_start[1:])
+
+        # one gather of the shape faces and one broadcast add of the block offsets
+        face_block = np.repeat(np.arange(counts.shape[0]), counts)
+        rows = shape_start[shape_ids][face_block] + (np.arange(face_start[-1]) - face_start[face_block])
+        local = all_faces[rows]
+        face_axis = local[:, 0].astype(np.int64)
+        off = np.take_along_axis(block_pos[face_block].astype(np.float64), self._FACE_OFFSET_AXES[face_axis], axis=1)
+        face_rect = local[:, 1:] + off[:, [0, 1, 1, 2, 2]]
+        return block_pos, face_start, face_axis, face_rect, block_oid[face_block]
+
+    def _refine_depth_in_cones(self,
+        adb: HighResADB,
+        position: Vec3,
+        cones: List[Tuple[Any, ...]],
+        blocks: Union[BlockSnapshot, List[Tuple[BlockPos, str, str, Optional[Dict[str, Any]]]]],
+        max_depth: float,
+        pos_to_occluder_id: Optional[Dict[BlockPos, int]],
+    ):
+        block_pos, face_start, face_axis, face_rect, face_oid = self.face_table(blocks, pos_to_occluder_id)
+        if face_axis.shape[0] == 0:
+            return
+
+        cone_bounds = np.array([c[:4] for c in cones], dtype=np.float64)
+        min_cone_bins = adb.N
+        if len(cones) > 1:
+            # the hit threshold is relative to a single target cone, not the union
+            for (_, _, _, _, targ_iy_ranges, targ_ip_min, targ_ip_max) in cones:
+                cone_bins = sum(i1 - i0 + 1 for (i0, i1) in targ_iy_ranges) * (targ_ip_max - targ_ip_min + 1)
+                min_cone_bins = min(min_cone_bins, cone_bins)
+
+        cone_mask = self._cone_mask(adb, cones)
+        if instrumentation.is_enabled():
+            instrumentation.note(occluders=len(blocks), faces=face_axis.shape[0], rays=np.count_nonzero(cone_mask))
+
+        refine_depth_in_cones_nb(
+            np.ascontiguousarray(np.asarray(position, dtype=np.float64)),
+            adb.dx, adb.dy, adb.dz, adb.depth, adb.top_occluder_idx,
+            float(adb.yaw_min), float(adb.yaw_max - adb.yaw_min), int(adb.yaw_bins),
+            float(adb.pitch_min), float(adb.pitch_max - adb.pitch_min), int(adb.pitch_bins),
+            cone_bounds, cone_mask, int(min_cone_bins),
+            block_pos, face_start, face_axis, face_rect, face_oid,
+            float(max_depth), int(max(1024, adb.N // 8)),
+            adb._scratch_idx, adb._scratch_w,
+        )
+
+    def _refine_depth_in_cones_py(self,
+        adb: HighResADB,
+        position: Vec3,
+        cones: List[Tuple[Any, ...]],
+        blocks: List[Tuple[BlockPos, str, str, Optional[Dict[str, Any]]]],
+        max_depth: float,
+        pos_to_occluder_id: Optional[Dict[BlockPos, int]],
+    ):
         px, py, pz = map(float, position)
         yaw_span = (adb.yaw_max - adb.yaw_min)
         pitch_span = (adb.pitch_max - adb.pitch_min)
 
-        ty_a = (normalize_angle_rad(tymin_m) - adb.yaw_min) / yaw_span * adb.yaw_bins
-        ty_b = (normalize_angle_rad(tymax_m) - adb.yaw_min) / yaw_span * adb.yaw_bins
-        if (tymax_m - tymin_m) > math.pi * 1.5:
-            targ_iy_ranges = [(0, adb.yaw_bins - 1)]
-        else:
-            if ty_b >= ty_a:
-                targ_iy_ranges = [to_bins(ty_a, ty_b, adb.yaw_bins)]
-            else:
-                i0a, i1a = to_bins(0, ty_b, adb.yaw_bins)
-                i0b, i1b = to_bins(ty_a, adb.yaw_bins - 1, adb.yaw_bins)
-                targ_iy_ranges = [(i0a, i1a), (i0b, i1b)]
-
-        ip_min_f = (tpmin_m - adb.pitch_min) / pitch_span * adb.pitch_bins
-        ip_max_f = (tpmax_m - adb.pitch_min) / pitch_span * adb.pitch_bins
-        targ_ip_min = clamp(int(math.floor(ip_min_f)), 0, adb.pitch_bins - 1)
-        targ_ip_max = clamp(int(math.ceil (ip_max_f)), 0, adb.pitch_bins - 1)
-
-        filtered_blocks: List[Tuple[BlockPos, str, str, Optional[Dict[str, Any]]]] = []
-        for (pos, base, short_type, meta) in blocks:
-            block_aabb = make_aabb_from_block(pos)
-            bymin, bymax, bpmin, bpmax = angular_bounds_for_aabb_nb(block_aabb, position)
-            if (bpmax < tpmin_m) or (bpmin > tpmax_m):
-                continue
-            if not yaw_intervals_overlap(bymin, bymax, tymin_m, tymax_m):
-                continue
-            filtered_blocks.append((pos, base, short_type, meta))
+        cone_bounds = np.array([c[:4] for c in cones], dtype=np.float64)
+        cone_yc, cone_ys = _interval_center_span_arr(cone_bounds[:, 0], cone_bounds[:, 1])
+
+        # a face only marks the rows and columns where its rectangle meets at least one cone
+        cone_mask = self._cone_mask(adb, cones)
+
+        block_bounds = np.empty((len(blocks), 4), dtype=np.float64)
+        for i, (pos, base, short_type, meta) in enumerate(blocks):
+            block_bounds[i] = angular_bounds_for_aabb_nb(make_aabb_from_block(pos), position)
+        block_yc, block_ys = _interval_center_span_arr(block_bounds[:, 0], block_bounds[:, 1])
+        pitch_ok = ~((block_bounds[:, 3, None] < cone_bounds[None, :, 2]) |
+                     (block_bounds[:, 2, None] > cone_bounds[None, :, 3]))
+        yaw_d = np.abs(_normalize_angle_arr(block_yc[:, None] - cone_yc[None, :]))
+        yaw_ok = yaw_d <= 0.5 * (block_ys[:, None] + cone_ys[None, :]) + 1e-12
+        in_any_cone = np.any(pitch_ok & yaw_ok, axis=1)
+
+        filtered_blocks: List[Tuple[BlockPos, str, str, Optional[Dict[str, Any]]]] = [
+            entry for entry, keep in zip(blocks, in_any_cone) if keep
+        ]
 
         y_mask = np.zeros(adb.yaw_bins, dtype=np.bool_)
         p_mask = np.zeros(adb.pitch_bins, dtype=np.bool_)
@@ -1617,22 +2508,14 @@ class BlockGeometryCache:
                 fp0 = clamp(int(math.floor(fp_min_f)), 0, adb.pitch_bins - 1)
                 fp1 = clamp(int(math.ceil (fp_max_f)), 0, adb.pitch_bins - 1)
 
-                ip0 = max(fp0, targ_ip_min)
-                ip1 = min(fp1, targ_ip_max)
-                if ip1 < ip0:
-                    continue
-                yaw_overlap = False
-                for (ty0, ty1) in targ_iy_ranges:
-                    for (fy0, fy1) in face_iy_ranges:
-                        iy0 = max(ty0, fy0)
-                        iy1 = min(ty1, fy1)
-                        if iy1 >= iy0:
-                            y_mask[iy0:iy1+1] = True
-                            yaw_overlap = True
-                if not yaw_overlap:
-                    continue
-                p_mask[ip0:ip1+1] = True
-                any_candidates = True
+                for (fy0, fy1) in face_iy_ranges:
+                    sub = cone_mask[fp0:fp1+1, fy0:fy1+1]
+                    cols = sub.any(axis=0)
+                    if not cols.any():
+                        continue
+                    y_mask[fy0:fy1+1] |= cols
+                    p_mask[fp0:fp1+1] |= sub.any(axis=1)
+                    any_candidates = True
 
         if not any_candidates:
             return
@@ -1675,6 +2558,11 @@ class BlockGeometryCache:
         dz_sel = adb.dz[idxs]
         cur_depth_sel = adb.depth[idxs]
         total_bins_sel = int(cur_depth_sel.shape[0])
+        if len(cones) > 1:
+            # the hit threshold is relative to a single target cone, not the union
+            for (_, _, _, _, targ_iy_ranges, targ_ip_min, targ_ip_max) in cones:
+                cone_bins = sum(i1 - i0 + 1 for (i0, i1) in targ_iy_ranges) * (targ_ip_max - targ_ip_min + 1)
+                total_bins_sel = min(total_bins_sel, cone_bins)
         min_hit_fraction = 0.03
         min_hits_required = max(1, int(math.ceil(min_hit_fraction * total_bins_sel)))
 
@@ -1683,12 +2571,18 @@ class BlockGeometryCache:
         if use_slice:
             tbuf_sel = adb._scratch_t[:idxs.shape[0]]
 
+        # only count hits inside the cones; outside them the coarse pass may not have run (roi)
+        in_cone_sel = cone_mask.ravel()[idxs]
+        # cone pixels the coarse pass saw escape max_depth are left alone
+        escaped_sel = in_cone_sel & (cur_depth_sel > max_depth)
+        top_sel = adb.top_occluder_idx[idxs]
+
         candidate_blocks: List[Tuple[BlockPos, str, str, Optional[Dict[str, Any]]]] = []
         for (pos, base, short_type, meta) in filtered_blocks:
             xmin, xmax, ymin, ymax, zmin, zmax = (float(v) for v in make_aabb_from_block(pos))
             tmin_b, tmax_b = ray_aabb_intersection_vec(px, py, pz, dx_sel, dy_sel, dz_sel, xmin, xmax, ymin, ymax, zmin, zmax)
             tblock = np.where(~np.isnan(tmin_b), np.where(tmin_b >= 0.0, tmin_b, tmax_b), np.nan)
-            mask_possible = (~np.isnan(tblock)) & (tblock <= cur_depth_sel + EPS)
+            mask_possible = in_cone_sel & ~escaped_sel & (~np.isnan(tblock)) & (tblock <= cur_depth_sel + EPS)
             if int(np.count_nonzero(mask_possible)) >= min_hits_required:
                 candidate_blocks.append((pos, base, short_type, meta))
 
@@ -1729,7 +2623,7 @@ class BlockGeometryCache:
                 )
                 if dmin > max_depth:
                     continue
-                if (pitch_max < tpmin_m) or (pitch_min > tpmax_m):
+                if not np.any((pitch_max >= cone_bounds[:, 2]) & (pitch_min <= cone_bounds[:, 3])):
                     continue
                 fy_a = (normalize_angle_rad(yaw_min) - adb.yaw_min) / yaw_span * adb.yaw_bins
                 fy_b = (normalize_angle_rad(yaw_max) - adb.yaw_min) / yaw_span * adb.yaw_bins
@@ -1759,7 +2653,7 @@ class BlockGeometryCache:
                     mask_hit = (tbuf_sel < np.inf) & (tbuf_sel >= 0.0) & (tbuf_sel <= max_depth)
                     if not np.any(mask_hit):
                         continue
-                    better = mask_hit & (tbuf_sel < cur_depth_sel)
+                    better = mask_hit & ~escaped_sel & (tbuf_sel < cur_depth_sel)
                     if not np.any(better):
                         continue
                     adb.depth[idxs[better]] = tbuf_sel[better]
@@ -1784,6 +2678,10 @@ class BlockGeometryCache:
                         int(oid), write_top, float(max_depth)
                     )
 
+        if not use_slice and escaped_sel.any():
+            adb.depth[idxs[escaped_sel]] = cur_depth_sel[escaped_sel]
+            adb.top_occluder_idx[idxs[escaped_sel]] = top_sel[escaped_sel]
+
 
 # ------------------------------
 # raster grid (ADB)
@@ -1832,6 +2730,141 @@ def _rasterize_occluders_nb(
         depth[i] = best_t
         top_idx[i] = best_oid
 
+@nb.njit(cache=True, parallel=True)
+def _rasterize_occupancy_dda_nb(
+    position: np.ndarray,
+    directions: np.ndarray,
+    occ: np.ndarray,
+    origin: np.ndarray,
+    cell_ids: np.ndarray,
+    depth: np.ndarray,
+    top_idx: np.ndarray,
+    max_depth: float
+) -> None:
+    # occ[x, y, z] holds 1 + index into cell_ids for solid cells and 0 for empty ones;
+    # cell (x, y, z) spans [origin + (x, y, z), origin + (x, y, z) + 1).
+    # no fastmath: depth starts at inf and max_depth is usually inf
+    nrays = directions.shape[0]
+    nx, ny, nz = occ.shape
+    px = position[0]; py = position[1]; pz = position[2]
+    ox = origin[0]; oy = origin[1]; oz = origin[2]
+    gxmin = ox * 1.0; gxmax = (ox + nx) * 1.0
+    gymin = oy * 1.0; gymax = (oy + ny) * 1.0
+    gzmin = oz * 1.0; gzmax = (oz + nz) * 1.0
+    eye_x = int(math.floor(px)) - ox
+    eye_y = int(math.floor(py)) - oy
+    eye_z = int(math.floor(pz)) - oz
+
+    for i in nb.prange(nrays):
+        dir_vec = directions[i]
+        best_t = depth[i]
+        best_oid = top_idx[i]
+
+        t0, t1 = _ray_aabb_intersect_single(position, dir_vec,
+                                            gxmin, gxmax, gymin, gymax, gzmin, gzmax)
+        if math.isnan(t0) or t1 < 0.0:
+            continue
+        t_enter = t0 if t0 > 0.0 else 0.0
+        if t_enter > max_depth or t_enter >= best_t:
+            continue
+
+        dx = dir_vec[0]; dy = dir_vec[1]; dz = dir_vec[2]
+        x = int(math.floor(px + dx * t_enter)) - ox
+        y = int(math.floor(py + dy * t_enter)) - oy
+        z = int(math.floor(pz + dz * t_enter)) - oz
+        x = min(max(x, 0), nx - 1)
+        y = min(max(y, 0), ny - 1)
+        z = min(max(z, 0), nz - 1)
+
+        # same stepping as _dda_ray_voxels; boundaries are measured from the eye so
+        # they stay exact when the march starts on the grid boundary
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        step_z = 1 if dz > 0 else -1
+
+        if abs(dx) > EPS:
+            tdelta_x = abs(1.0 / dx)
+            tmax_x = ((ox + x + 1.0) - px) / dx if dx > 0 else ((ox + x) * 1.0 - px) / dx
+        else:
+            tdelta_x = INF
+            tmax_x = INF
+        if abs(dy) > EPS:
+            tdelta_y = abs(1.0 / dy)
+            tmax_y = ((oy + y + 1.0) - py) / dy if dy > 0 else ((oy + y) * 1.0 - py) / dy
+        else:
+            tdelta_y = INF
+            tmax_y = INF
+        if abs(dz) > EPS:
+            tdelta_z = abs(1.0 / dz)
+            tmax_z = ((oz + z + 1.0) - pz) / dz if dz > 0 else ((oz + z) * 1.0 - pz) / dz
+        else:
+            tdelta_z = INF
+            tmax_z = INF
+
+        while True:
+            if t_enter > max_depth or t_enter >= best_t:
+                break
+
+            slot = occ[x, y, z]
+            if slot != 0:
+                if x == eye_x and y == eye_y and z == eye_z:
+                    # eye inside the block: its exit distance, as the brute-force path does
+                    t = min(tmax_x, min(tmax_y, tmax_z))
+                else:
+                    t = t_enter
+                if t <= max_depth and t < best_t:
+                    best_t = t
+                    best_oid = cell_ids[slot - 1]
+                break
+
+            if (tmax_x <= tmax_y) and (tmax_x <= tmax_z):
+                x += step_x
+                t_enter = tmax_x
+                tmax_x += tdelta_x
+                if x < 0 or x >= nx:
+                    break
+            elif (tmax_y <= tmax_x) and (tmax_y <= tmax_z):
+                y += step_y
+                t_enter = tmax_y
+                tmax_y += tdelta_y
+                if y < 0 or y >= ny:
+                    break
+            else:
+                z += step_z
+                t_enter = tmax_z
+                tmax_z += tdelta_z
+                if z < 0 or z >= nz:
+                    break
+
+        depth[i] = best_t
+        top_idx[i] = best_oid
+
+def _build_occupancy_grid(aabbs: np.ndarray, occluder_ids: np.ndarray):
+    """Pack the unit block AABBs into a dense grid; returns (occ, origin, cell_ids, rest_mask) or None if it would be too large."""
+    lo = aabbs[:, 0::2]
+    hi = aabbs[:, 1::2]
+    cell = np.floor(lo)
+    unit = np.all((lo == cell) & (hi - lo == 1.0), axis=1)
+    if not unit.any():
+        return None
+
+    cells = cell[unit].astype(np.int64)
+    origin = cells.min(axis=0)
+    shape = cells.max(axis=0) - origin + 1
+    if int(np.prod(shape)) > GRID_MAX_CELLS:
+        return None
+
+    local = cells - origin
+    lin = (local[:, 0] * shape[1] + local[:, 1]) * shape[2] + local[:, 2]
+    # first occluder wins on duplicate cells, like the strict '<' of the other paths
+    lin, first = np.unique(lin, return_index=True)
+    occ = np.zeros(int(np.prod(shape)), dtype=np.int32)
+    occ[lin] = first.astype(np.int32) + 1
+    occ = occ.reshape((int(shape[0]), int(shape[1]), int(shape[2])))
+
+    cell_ids = np.ascontiguousarray(occluder_ids[unit], dtype=np.int32)
+    return occ, np.ascontiguousarray(origin, dtype=np.int64), cell_ids, ~unit
+
 @nb.njit(cache=True, fastmath=True)
 def _find_nearest_visible_pixel_nb(yaw_arr: np.ndarray,
                                    pitch_arr: np.ndarray,
@@ -1958,12 +2991,72 @@ class HighResADB:
             int(self.yaw_bins), 
             int(self.pitch_bins))
 
+        # scan arena: every scan reuses these, so the steady state allocates nothing proportional to N
+        self.directions = np.ascontiguousarray(
+            np.stack((self.dx.astype(np.float64), self.dy.astype(np.float64), self.dz.astype(np.float64)), axis=1),
+            dtype=np.float64
+        )
+        self.depth_baseline = np.empty(self.N, dtype=np.float64)
+        self.idx_baseline = np.empty(self.N, dtype=np.int32)
+        self._roi_mask = np.zeros((self.pitch_bins, self.yaw_bins), dtype=np.bool_)
+        self._roi_idx = np.empty(self.N, dtype=np.int64)
+        self._ray_directions = np.empty((self.N, 3), dtype=np.float64)
+        self._ray_depth = np.empty(self.N, dtype=np.float64)
+        self._ray_top_idx = np.empty(self.N, dtype=np.int32)
+        self._cone_mask = np.zeros((self.pitch_bins, self.yaw_bins), dtype=np.bool_)
         self._scratch_t = np.empty(self.N, dtype=np.float64)
+        # selection scratch of the refine kernel, then the visible samples of the aim
+        self._scratch_idx = np.empty(self.N, dtype=np.int64)
+        self._scratch_w = np.empty(self.N, dtype=np.float64)
+        self._scratch_f32 = np.empty((4, self.N), dtype=np.float32)
+        self._target_scratch: Optional[Tuple[np.ndarray, ...]] = None
+        self._all_idx = np.arange(self.N, dtype=np.int64)
+        # ray order and packet boundaries of the packet raster method
+        self._packet_order = np.empty(self.N, dtype=np.int64)
+        self._packet_start = np.empty(-(-pitch_bins // PACKET_TILE) * -(-yaw_bins // PACKET_TILE) + 1, dtype=np.int64)
 
     def reset_depth(self) -> None:
         self.depth.fill(np.inf)
         self.top_occluder_idx.fill(-1)
 
+    @instrumentation.timed("rasterize_coarse")
+    def rasterize_coarse(self, coarse_aabbs: np.ndarray, coarse_ids: np.ndarray, position: Vec3,
+                         method: str = "auto", roi: Optional[np.ndarray] = None,
+                         max_depth: float = float('inf')) -> None:
+        """reset_depth() and rasterize_occluders() of unit-block occluders over roi, up to max_depth."""
+        coarse_aabbs = np.asarray(coarse_aabbs, dtype=np.float64).reshape((-1, 6))
+        coarse_ids = np.asarray(coarse_ids, dtype=np.int32)
+        if max_depth < INF:
+            # occluders wholly beyond max_depth cannot be hit; keep them out of the BVH / grid build
+            near = _aabb_dist2(coarse_aabbs[:, 0::2], coarse_aabbs[:, 1::2], position) <= max_depth * max_depth
+            coarse_aabbs, coarse_ids = coarse_aabbs[near], coarse_ids[near]
+
+        self.reset_depth()
+        self.rasterize_occluders(coarse_aabbs, position, occluder_ids=coarse_ids, max_depth=max_depth,
+                                 method=method, roi=roi)
+
+    def save_baseline(self) -> None:
+        """Keep the coarse depth / top id buffers in depth_baseline / idx_baseline for restore_baseline()."""
+        self.depth_baseline[:] = self.depth
+        self.idx_baseline[:] = self.top_occluder_idx
+
+    def restore_baseline(self) -> None:
+        self.depth[:] = self.depth_baseline
+        self.top_occluder_idx[:] = self.idx_baseline
+
+    def target_scratch(self, n_workers: int) -> Tuple[np.ndarray, ...]:
+        """Per-worker depth, top id, cone mask and sample buffers of the parallel scan mode, kept between scans."""
+        if self._target_scratch is None or self._target_scratch[0].shape[0] < n_workers:
+            self._target_scratch = (
+                np.empty((n_workers, self.N), dtype=np.float64),
+                np.empty((n_workers, self.N), dtype=np.int32),
+                np.zeros((n_workers, self.pitch_bins, self.yaw_bins), dtype=np.bool_),
+                np.empty((n_workers, self.N), dtype=np.int64),
+                np.empty((n_workers, self.N), dtype=np.float64),
+                np.empty((n_workers, 2, self.N), dtype=np.float32),
+            )
+        return self._target_scratch
+
     def idx_from_iy_ip(self, iy: int, ip: int) -> int:
         return ip * self.yaw_bins + iy
 
@@ -1982,24 +3075,93 @@ class HighResADB:
         pitch = (pitch_idx + 0.5) / self.pitch_bins * math.pi - 0.5 * math.pi
         return yaw, pitch
 
+    def bins_for_angles(self, yaw_lo: float, yaw_hi: float, pitch_lo: float, pitch_hi: float):
+        """Yaw bin ranges (one, or two when wrapping past +-pi) and the pitch bin range covering an angular box."""
+        yaw_span = (self.yaw_max - self.yaw_min)
+        pitch_span = (self.pitch_max - self.pitch_min)
+
+        ty_a = (normalize_angle_rad(yaw_lo) - self.yaw_min) / yaw_span * self.yaw_bins
+        ty_b = (normalize_angle_rad(yaw_hi) - self.yaw_min) / yaw_span * self.yaw_bins
+        if (yaw_hi - yaw_lo) > math.pi * 1.5:
+            iy_ranges = [(0, self.yaw_bins - 1)]
+        else:
+            if ty_b >= ty_a:
+                iy_ranges = [to_bins(ty_a, ty_b, self.yaw_bins)]
+            else:
+                i0a, i1a = to_bins(0, ty_b, self.yaw_bins)
+                i0b, i1b = to_bins(ty_a, self.yaw_bins - 1, self.yaw_bins)
+                iy_ranges = [(i0a, i1a), (i0b, i1b)]
+
+        ip_min_f = (pitch_lo - self.pitch_min) / pitch_span * self.pitch_bins
+        ip_max_f = (pitch_hi - self.pitch_min) / pitch_span * self.pitch_bins
+        ip_min = clamp(int(math.floor(ip_min_f)), 0, self.pitch_bins - 1)
+        ip_max = clamp(int(math.ceil (ip_max_f)), 0, self.pitch_bins - 1)
+        return iy_ranges, ip_min, ip_max
+
+    def roi_indices(self, target_aabbs: Sequence[AABB], position: Vec3,
+                    margin_deg: float = 1.0, tile: int = 8) -> np.ndarray:
+        """Sorted pixel indices of the tile-aligned rectangles covering the angular bounds of target_aabbs.
+
+        The result is a view into the ADB's arena, valid until the next call.
+        """
+        mask = self._roi_mask
+        mask.fill(False)
+        margin = math.radians(margin_deg)
+        for aabb in target_aabbs:
+            tymin, tymax, tpmin, tpmax = covering_angular_bounds_nb(np.asarray(aabb, dtype=np.float64), position)
+            iy_ranges, ip0, ip1 = self.bins_for_angles(tymin - margin, tymax + margin,
+                                                       tpmin - margin, tpmax + margin)
+            ip0 = (ip0 // tile) * tile
+            ip1 = min((ip1 // tile + 1) * tile, self.pitch_bins)
+            for (iy0, iy1) in iy_ranges:
+                iy0 = (iy0 // tile) * tile
+                iy1 = min((iy1 // tile + 1) * tile, self.yaw_bins)
+                mask[ip0:ip1, iy0:iy1] = True
+        n = _flatnonzero_into_nb(mask.ravel(), self._roi_idx)
+        return self._roi_idx[:n]
+
+    def _ray_buffers(self, roi: Optional[np.ndarray]):
+        if roi is None:
+            return self.directions, self.depth, self.top_occluder_idx
+        # gathered into the arena; mode="clip" because take() buffers `out` under the default "raise"
+        n = roi.shape[0]
+        return (np.take(self.directions, roi, axis=0, out=self._ray_directions[:n], mode="clip"),
+                np.take(self.depth, roi, out=self._ray_depth[:n], mode="clip"),
+                np.take(self.top_occluder_idx, roi, out=self._ray_top_idx[:n], mode="clip"))
+
+    def _store_ray_buffers(self, roi: Optional[np.ndarray], depth_arr: np.ndarray, top_idx_arr: np.ndarray) -> None:
+        if roi is not None:
+            self.depth[roi] = depth_arr
+            self.top_occluder_idx[roi] = top_idx_arr
+
+    @instrumentation.timed("rasterize")
     def rasterize_occluders(self, occluder_aabbs: List[AABB], position: Vec3,
                             occluder_ids: Optional[List[int]] = None,
-                            max_depth: float = 200.0) -> None:
+                            max_depth: float = 200.0,
+                            method: str = "auto",
+                            roi: Optional[np.ndarray] = None) -> None:
+        """
+        method: "brute", "bvh", "grid" (occupancy-grid DDA over unit block AABBs), "packet" (the bvh traversed by
+        PACKET_TILE^2 pixel tiles of rays) or "auto" (grid, else brute below BVH_THRESHOLD, else packet).
+        roi: pixel indices (see roi_indices) to trace; pixels outside it are left untouched.
+        """
+        if method not in RASTER_METHODS:
+            raise ValueError(f"method must be one of {RASTER_METHODS}, got {method!r}")
 
         Na = len(occluder_aabbs)
+        instrumentation.note(occluders=Na, rays=self.N if roi is None else roi.size)
         if Na == 0:
             return
 
-        if len(occluder_aabbs) < BVH_THRESHOLD:
-            aabbs_arr = np.empty((Na, 6), dtype=np.float64)
-            for i, aabb in enumerate(occluder_aabbs):
-                xmin, xmax, ymin, ymax, zmin, zmax = (float(v) for v in aabb)
-                aabbs_arr[i, 0] = xmin
-                aabbs_arr[i, 1] = xmax
-                aabbs_arr[i, 2] = ymin
-                aabbs_arr[i, 3] = ymax
-                aabbs_arr[i, 4] = zmin
-                aabbs_arr[i, 5] = zmax
+        # the grid needs no BVH build, so it is the fastest path for the unit-block coarse pass and its repairs;
+        # it falls back to brute / packet when no AABB is a unit block or the grid would be too large
+        if method in ("auto", "grid") and self._rasterize_occupancy_grid(occluder_aabbs, position, occluder_ids, max_depth, roi):
+            return
+        if method in ("auto", "grid"):
+            method = "brute" if Na < BVH_THRESHOLD else "packet"
+
+        if method == "brute":
+            aabbs_arr = np.ascontiguousarray(np.asarray(occluder_aabbs, dtype=np.float64).reshape((Na, 6)))
 
             if occluder_ids is None:
                 oc_ids = np.full((Na,), -1, dtype=np.int32)
@@ -2008,31 +3170,20 @@ class HighResADB:
                     raise ValueError("occluder_ids must be same length as occluder_aabbs")
                 oc_ids = np.array(occluder_ids, dtype=np.int32)
 
-            depth_arr = np.ascontiguousarray(self.depth, dtype=np.float64)
-            top_idx_arr = np.ascontiguousarray(self.top_occluder_idx, dtype=np.int32)
-            directions = np.ascontiguousarray(
-                np.stack((self.dx.astype(np.float64), self.dy.astype(np.float64), self.dz.astype(np.float64)), axis=1),
-                dtype=np.float64
-            )
+            directions, depth_arr, top_idx_arr = self._ray_buffers(roi)
 
             _rasterize_occluders_nb(position, directions, aabbs_arr, oc_ids, depth_arr, top_idx_arr, float(max_depth))
 
-            self.depth = depth_arr
-            self.top_occluder_idx = top_idx_arr
+            self._store_ray_buffers(roi, depth_arr, top_idx_arr)
         
         else:
-            prim_min = np.empty((Na, 3), dtype=np.float64)
-            prim_max = np.empty((Na, 3), dtype=np.float64)
-            prim_id = np.empty((Na,), dtype=np.int32)
-            for i, aabb in enumerate(occluder_aabbs):
-                xmin, xmax, ymin, ymax, zmin, zmax = (float(v) for v in aabb)
-                prim_min[i, 0] = xmin
-                prim_min[i, 1] = ymin
-                prim_min[i, 2] = zmin
-                prim_max[i, 0] = xmax
-                prim_max[i, 1] = ymax
-                prim_max[i, 2] = zmax
-                prim_id[i] = -1 if occluder_ids is None else int(occluder_ids[i])
+            aabbs_arr = np.asarray(occluder_aabbs, dtype=np.float64).reshape((Na, 6))
+            prim_min = np.ascontiguousarray(aabbs_arr[:, 0::2])
+            prim_max = np.ascontiguousarray(aabbs_arr[:, 1::2])
+            if occluder_ids is None:
+                prim_id = np.full((Na,), -1, dtype=np.int32)
+            else:
+                prim_id = np.asarray(occluder_ids, dtype=np.int32).reshape(Na)
 
             rebuild = True
             if hasattr(self, "_bvh_prim_count") and self._bvh_prim_count == Na:
@@ -2052,7 +3203,7 @@ class HighResADB:
 
             if rebuild:
                 (node_min, node_max, node_left, node_right,
-                node_first, node_count, leaf_prim_indices, postorder) = build_bvh(prim_min, prim_max, prim_id, max_leaf_size=4)
+                node_first, node_count, leaf_prim_indices, postorder) = build_bvh_sah_nb(prim_min, prim_max, 4, 12)
 
                 self.bvh_node_min = node_min
                 self.bvh_node_max = node_max
@@ -2067,25 +3218,61 @@ class HighResADB:
             self._bvh_prim_min = prim_min.copy()
             self._bvh_prim_max = prim_max.copy()
 
-            depth_arr = np.ascontiguousarray(self.depth, dtype=np.float64)
-            top_idx_arr = np.ascontiguousarray(self.top_occluder_idx, dtype=np.int32)
-            directions = np.ascontiguousarray(
-                np.stack((self.dx.astype(np.float64), self.dy.astype(np.float64), self.dz.astype(np.float64)), axis=1),
-                dtype=np.float64
-            )
+            directions, depth_arr, top_idx_arr = self._ray_buffers(roi)
+
+            if method == "packet":
+                n_packets = _packet_order_nb(self._all_idx if roi is None else roi, self.yaw_bins, PACKET_TILE,
+                                             self._packet_order, self._packet_start)
+                rasterize_with_bvh_packets_nb(position,
+                                              directions,
+                                              self._packet_order, self._packet_start, n_packets,
+                                              self.bvh_node_min, self.bvh_node_max,
+                                              self.bvh_left, self.bvh_right,
+                                              self.bvh_first, self.bvh_count,
+                                              self.bvh_leaf_indices,
+                                              prim_min, prim_max, prim_id,
+                                              depth_arr, top_idx_arr,
+                                              float(max_depth))
+            else:
+                rasterize_with_bvh_nb(position,
+                                    directions,
+                                    self.bvh_node_min, self.bvh_node_max,
+                                    self.bvh_left, self.bvh_right,
+                                    self.bvh_first, self.bvh_count,
+                                    self.bvh_leaf_indices,
+                                    prim_min, prim_max, prim_id,
+                                    depth_arr, top_idx_arr,
+                                    float(max_depth))
+
+            self._store_ray_buffers(roi, depth_arr, top_idx_arr)
+
+    def _rasterize_occupancy_grid(self, occluder_aabbs: List[AABB], position: Vec3,
+                                  occluder_ids: Optional[List[int]], max_depth: float,
+                                  roi: Optional[np.ndarray] = None) -> bool:
+        Na = len(occluder_aabbs)
+        aabbs_arr = np.ascontiguousarray(np.asarray(occluder_aabbs, dtype=np.float64).reshape((Na, 6)))
+        if occluder_ids is None:
+            oc_ids = np.full((Na,), -1, dtype=np.int32)
+        else:
+            if len(occluder_ids) != Na:
+                raise ValueError("occluder_ids must be same length as occluder_aabbs")
+            oc_ids = np.asarray(occluder_ids, dtype=np.int32)
 
-            rasterize_with_bvh_nb(position,
-                                directions,
-                                self.bvh_node_min, self.bvh_node_max,
-                                self.bvh_left, self.bvh_right,
-                                self.bvh_first, self.bvh_count,
-                                self.bvh_leaf_indices,
-                                prim_min, prim_max, prim_id,
-                                depth_arr, top_idx_arr,
-                                float(max_depth))
+        grid = _build_occupancy_grid(aabbs_arr, oc_ids)
+        if grid is None:
+            return False
+        occ, origin, cell_ids, rest = grid
 
-            self.depth = depth_arr
-            self.top_occluder_idx = top_idx_arr
+        position = np.ascontiguousarray(np.asarray(position, dtype=np.float64))
+        directions, depth_arr, top_idx_arr = self._ray_buffers(roi)
+
+        _rasterize_occupancy_dda_nb(position, directions, occ, origin, cell_ids, depth_arr, top_idx_arr, float(max_depth))
+        if rest.any():
+            _rasterize_occluders_nb(position, directions, np.ascontiguousarray(aabbs_arr[rest]),
+                                    np.ascontiguousarray(oc_ids[rest]), depth_arr, top_idx_arr, float(max_depth))
+
+        self._store_ray_buffers(roi, depth_arr, top_idx_arr)
+        return True
 
     def visible_samples_for_aabb(self, target_aabb: AABB, position: Vec3) -> Dict[str, Any]:
         px, py, pz = map(float, position)
@@ -2311,6 +3498,344 @@ def compute_visible_face_centroid_aim_with_clustering(
     return best
 
 
+@nb.njit(cache=True)
+def _target_visibility_stats_nb(px, py, pz,
+                                dx, dy, dz,
+                                depth, top_idx, weights,
+                                slot_of_id, n_slots):
+    n = depth.shape[0]
+    n_ids = slot_of_id.shape[0]
+    count = np.zeros(n_slots, dtype=np.int64)
+    first_idx = np.full(n_slots, -1, dtype=np.int64)
+    wsum = np.zeros(n_slots, dtype=np.float64)
+    centroid = np.zeros((n_slots, 3), dtype=np.float64)
+    yaw_c = np.zeros(n_slots, dtype=np.float64)
+    yaw_s = np.zeros(n_slots, dtype=np.float64)
+    pitch_lo = np.full(n_slots, INF, dtype=np.float64)
+    pitch_hi = np.full(n_slots, -INF, dtype=np.float64)
+
+    for i in range(n):
+        oid = top_idx[i]
+        if oid < 0 or oid >= n_ids:
+            continue
+        s = slot_of_id[oid]
+        if s < 0:
+            continue
+        t = depth[i]
+        if not (t < INF):
+            continue
+        dxi = np.float64(dx[i]); dyi = np.float64(dy[i]); dzi = np.float64(dz[i])
+        w = weights[i]
+        if first_idx[s] < 0:
+            first_idx[s] = i
+        count[s] += 1
+        wsum[s] += w
+        centroid[s, 0] += (px + dxi * t) * w
+        centroid[s, 1] += (py + dyi * t) * w
+        centroid[s, 2] += (pz + dzi * t) * w
+        yaw = math.atan2(dzi, dxi)
+        yaw_c[s] += math.cos(yaw)
+        yaw_s[s] += math.sin(yaw)
+        pitch = -math.atan2(dyi, math.hypot(dxi, dzi))
+        if pitch < pitch_lo[s]:
+            pitch_lo[s] = pitch
+        if pitch > pitch_hi[s]:
+            pitch_hi[s] = pitch
+
+    center = np.empty(n_slots, dtype=np.float64)
+    rel_lo = np.full(n_slots, INF, dtype=np.float64)
+    rel_hi = np.full(n_slots, -INF, dtype=np.float64)
+    for s in range(n_slots):
+        center[s] = math.atan2(yaw_s[s], yaw_c[s])
+        if wsum[s] > 0.0:
+            centroid[s, 0] /= wsum[s]
+            centroid[s, 1] /= wsum[s]
+            centroid[s, 2] /= wsum[s]
+
+    for i in range(n):
+        oid = top_idx[i]
+        if oid < 0 or oid >= n_ids:
+            continue
+        s = slot_of_id[oid]
+        if s < 0 or not (depth[i] < INF):
+            continue
+        a = normalize_angle_rad_nb(math.atan2(np.float64(dz[i]), np.float64(dx[i])) - center[s])
+        if a < rel_lo[s]:
+            rel_lo[s] = a
+        if a > rel_hi[s]:
+            rel_hi[s] = a
+
+    yaw_lo = np.zeros(n_slots, dtype=np.float64)
+    yaw_hi = np.zeros(n_slots, dtype=np.float64)
+    for s in range(n_slots):
+        if count[s] > 0:
+            yaw_lo[s] = normalize_angle_rad_nb(center[s] + rel_lo[s])
+            yaw_hi[s] = yaw_lo[s] + (rel_hi[s] - rel_lo[s])
+
+    return count, first_idx, wsum, centroid, yaw_lo, yaw_hi, pitch_lo, pitch_hi
+
+@nb.njit(cache=True)
+def _pairwise_block_sum_nb(a, lo, hi):
+    # one leaf of numpy's pairwise summation (at most 128 values, eight accumulators)
+    n = hi - lo
+    if n < 8:
+        s = 0.0
+        for i in range(lo, hi):
+            s += a[i]
+        return s
+    r0 = a[lo]; r1 = a[lo + 1]; r2 = a[lo + 2]; r3 = a[lo + 3]
+    r4 = a[lo + 4]; r5 = a[lo + 5]; r6 = a[lo + 6]; r7 = a[lo + 7]
+    i = lo + 8
+    while i < hi - n % 8:
+        r0 += a[i]; r1 += a[i + 1]; r2 += a[i + 2]; r3 += a[i + 3]
+        r4 += a[i + 4]; r5 += a[i + 5]; r6 += a[i + 6]; r7 += a[i + 7]
+        i += 8
+    s = ((r0 + r1) + (r2 + r3)) + ((r4 + r5) + (r6 + r7))
+    while i < hi:
+        s += a[i]
+        i += 1
+    return s
+
+@nb.njit(cache=True)
+def _pairwise_sum_nb(a, lo, hi):
+    # np.sum's order, so the result matches it bit for bit: pairwise summation within buffers of 8192 values,
+    # buffers added in order. The halving runs on an explicit stack (recursive kernels crash when numba loads
+    # their callers back from the cache)
+    seg_lo = np.empty(32, dtype=np.int64)
+    seg_hi = np.empty(32, dtype=np.int64)
+    partial = np.empty(16, dtype=np.float64)
+    total = 0.0
+    for c0 in range(lo, hi, 8192):
+        seg_lo[0] = c0; seg_hi[0] = min(c0 + 8192, hi)
+        top = 1
+        n_partial = 0
+        while top > 0:
+            top -= 1
+            l = seg_lo[top]; h = seg_hi[top]
+            if h < 0:
+                # both halves are done
+                n_partial -= 1
+                partial[n_partial - 1] += partial[n_partial]
+            elif h - l <= 128:
+                partial[n_partial] = _pairwise_block_sum_nb(a, l, h)
+                n_partial += 1
+            else:
+                n2 = (h - l) // 2
+                n2 -= n2 % 8
+                seg_lo[top] = 0; seg_hi[top] = -1
+                seg_lo[top + 1] = l + n2; seg_hi[top + 1] = h
+                seg_lo[top + 2] = l; seg_hi[top + 2] = l + n2
+                top += 3
+        total = partial[0] if c0 == lo else total + partial[0]
+    return total
+
+@nb.njit(cache=True, inline='always')
+def _target_hits_nb(px, py, pz, dx, dy, dz, weights, top_idx, tid, tx, ty, tz, idx_buf, w_buf):
+    # visible samples of the unit block at (tx, ty, tz): pixels whose top occluder is tid and whose ray hits
+    # the block, in pixel order into idx_buf / w_buf; returns the count and the weighted sum of the hit points
+    n = top_idx.shape[0]
+    count = 0
+    cx = 0.0; cy = 0.0; cz = 0.0
+    for idx in range(n):
+        if top_idx[idx] != tid:
+            continue
+        dxi = dx[idx]; dyi = dy[idx]; dzi = dz[idx]
+        hit, t = _unit_block_hit_t_nb(tx, ty, tz, px, py, pz, dxi, dyi, dzi)
+        if not hit:
+            continue
+        w = weights[idx]
+        idx_buf[count] = idx
+        w_buf[count] = w
+        cx += (px + dxi * t) * w
+        cy += (py + dyi * t) * w
+        cz += (pz + dzi * t) * w
+        count += 1
+    return count, cx, cy, cz
+
+@nb.njit(cache=True, inline='always')
+def _target_aim_nb(px, py, pz, dx, dy, dz, weights, top_idx, top_base, tid, tx, ty, tz,
+                   yaw_bins, pitch_bins, idx_buf, w_buf, yaw_buf, pitch_buf):
+    # the aim block of the per_target loop in scan_targets on one refined buffer
+    count, cx, cy, cz = _target_hits_nb(px, py, pz, dx, dy, dz, weights, top_idx, tid, tx, ty, tz, idx_buf, w_buf)
+    if count == 0:
+        return 0, -1, 0.0, 0.0, 0.0, 0.0, 0.0
+    for i in range(count):
+        idx = idx_buf[i]
+        yaw_buf[i] = math.atan2(dz[idx], dx[idx])
+        pitch_buf[i] = -math.atan2(dy[idx], math.hypot(dx[idx], dz[idx]))
+    wsum = _pairwise_sum_nb(w_buf, 0, count)
+    yaw_lo, yaw_hi = wrapped_interval_from_angles(yaw_buf[:count])
+    pitch_lo = INF
+    pitch_hi = -INF
+    for i in range(count):
+        pitch_lo = min(pitch_lo, pitch_buf[i])
+        pitch_hi = max(pitch_hi, pitch_buf[i])
+
+    vx = cx / wsum - px; vy = cy / wsum - py; vz = cz / wsum - pz
+    center_idx = idx_from_yaw_pitch_nb(math.atan2(vz, vx), -math.atan2(vy, math.hypot(vx, vz)), yaw_bins, pitch_bins)
+    # like the per_target loop, the centre pixel is checked against the coarse buffer
+    chosen = idx_buf[0]
+    if top_base[center_idx] == tid:
+        hit, t = _unit_block_hit_t_nb(tx, ty, tz, px, py, pz, dx[center_idx], dy[center_idx], dz[center_idx])
+        if hit:
+            chosen = center_idx
+    return count, chosen, wsum, yaw_lo, yaw_hi, pitch_lo, pitch_hi
+
+@nb.njit(cache=True, parallel=True)
+def _scan_targets_parallel_nb(position, dx, dy, dz, weights, depth_base, top_base,
+                              adb_yaw_min, yaw_span, yaw_bins,
+                              adb_pitch_min, pitch_span, pitch_bins,
+                              cone_bounds, cone_bins, target_pos, target_oid,
+                              block_pos, face_start, face_axis, face_rect, face_oid,
+                              max_depth, slice_threshold,
+                              depth_scratch, top_scratch, mask_scratch, idx_scratch, f64_scratch, f32_scratch):
+    """
+    One pass of the per_target loop of scan_targets for every target at once, one target per prange iteration.
+
+    Each iteration copies the coarse buffers (depth_base, top_base) into the scratch rows of its thread,
+    refines that copy in the target's cone alone and reads the target's visible pixels back.
+    cone_bins (T, 6) = (iy0, iy1, iy0b, iy1b, ip0, ip1) with iy0b = -1 unless the cone wraps in yaw.
+    Returns per target the visible sample count, the chosen pixel, the solid angle and
+    (yaw_lo, yaw_hi, pitch_lo, pitch_hi).
+    """
+    px = position[0]; py = position[1]; pz = position[2]
+    n_targets = target_oid.shape[0]
+    n = depth_base.shape[0]
+    count = np.zeros(n_targets, dtype=np.int64)
+    chosen = np.full(n_targets, -1, dtype=np.int64)
+    wsum = np.zeros(n_targets, dtype=np.float64)
+    bounds = np.zeros((n_targets, 4), dtype=np.float64)
+
+    for t in nb.prange(n_targets):
+        w = nb.get_thread_id()
+        depth = depth_scratch[w]
+        top_idx = top_scratch[w]
+        cone_mask = mask_scratch[w]
+        depth[:] = depth_base
+        top_idx[:] = top_base
+
+        ip0 = cone_bins[t, 4]; ip1 = cone_bins[t, 5]
+        for r in range(2):
+            if cone_bins[t, 2 * r] >= 0:
+                cone_mask[ip0:ip1 + 1, cone_bins[t, 2 * r]:cone_bins[t, 2 * r + 1] + 1] = True
+
+        # the aim buffers double as the refine's selection scratch
+        _refine_depth_in_cones_body(position, dx, dy, dz, depth, top_idx,
+                                    adb_yaw_min, yaw_span, yaw_bins,
+                                    adb_pitch_min, pitch_span, pitch_bins,
+                                    cone_bounds[t:t + 1], cone_mask, n,
+                                    block_pos, face_start, face_axis, face_rect, face_oid,
+                                    max_depth, slice_threshold, idx_scratch[w], f64_scratch[w])
+
+        c, ci, ws, ylo, yhi, plo, phi = _target_aim_nb(
+            px, py, pz, dx, dy, dz, weights, top_idx, top_base, target_oid[t],
+            target_pos[t, 0] * 1.0, target_pos[t, 1] * 1.0, target_pos[t, 2] * 1.0,
+            yaw_bins, pitch_bins, idx_scratch[w], f64_scratch[w], f32_scratch[w, 0], f32_scratch[w, 1])
+        count[t] = c
+        chosen[t] = ci
+        wsum[t] = ws
+        bounds[t, 0] = ylo; bounds[t, 1] = yhi
+        bounds[t, 2] = plo; bounds[t, 3] = phi
+
+        for r in range(2):
+            if cone_bins[t, 2 * r] >= 0:
+                cone_mask[ip0:ip1 + 1, cone_bins[t, 2 * r]:cone_bins[t, 2 * r + 1] + 1] = False
+
+    return count, chosen, wsum, bounds
+
+def _collect_target_stats(adb: HighResADB, position: Vec3, target_occluder_ids: Sequence[int], n_occluders: int):
+    slot_of_id = np.full(max(int(n_occluders), 1), -1, dtype=np.int64)
+    for slot, oid in enumerate(target_occluder_ids):
+        slot_of_id[int(oid)] = slot
+    return _target_visibility_stats_nb(float(position[0]), float(position[1]), float(position[2]),
+                                       adb.dx, adb.dy, adb.dz,
+                                       adb.depth, adb.top_occluder_idx, adb.sample_solid_angle,
+                                       slot_of_id, len(target_occluder_ids))
+
+def _target_info_from_stats(adb: HighResADB, position: Vec3, target_pos: BlockPos, target_id: int,
+                           stats, slot: int) -> Optional[TargetInfo]:
+    count, first_idx, wsum, centroid, yaw_lo, yaw_hi, pitch_lo, pitch_hi = stats
+    if count[slot] == 0:
+        return None
+
+    cx, cy, cz = centroid[slot]
+    vx, vy, vz = cx - position[0], cy - position[1], cz - position[2]
+    hyp = math.hypot(vx, vz)
+    yaw_rad_centroid = math.atan2(vz, vx)
+    pitch_rad_centroid = -math.atan2(vy, hyp)
+
+    center_idx = adb.idx_from_yaw_pitch(yaw_rad_centroid, pitch_rad_centroid)
+    if adb.top_occluder_idx[center_idx] == int(target_id) and adb.depth[center_idx] < np.inf:
+        chosen_idx = center_idx
+    else:
+        chosen_idx = int(first_idx[slot])
+
+    dx = adb.dx[chosen_idx]; dy = adb.dy[chosen_idx]; dz = adb.dz[chosen_idx]
+
+    yaw_rad_final = math.atan2(dz, dx)
+    pitch_rad_final = -math.atan2(dy, math.hypot(dx, dz))
+    yaw_deg, pitch_deg = to_minecraft_angles_degrees(yaw_rad_final, pitch_rad_final)
+
+    return TargetInfo(
+        target_pos,
+        (dx, dy, dz),
+        (yaw_deg, pitch_deg),
+        (float(yaw_lo[slot]), float(yaw_hi[slot])),
+        (float(pitch_lo[slot]), float(pitch_hi[slot])),
+        float(wsum[slot])
+    )
+
+def _aim_at_target(adb: HighResADB, position: np.ndarray, target_pos: BlockPos, target_id: int,
+                   center_top_idx: np.ndarray) -> Optional[TargetInfo]:
+    """Aim of scan_target and the per_target loop on the refined ADB, in the ADB's scratch buffers.
+
+    The centre of the visible samples is kept if center_top_idx names the target there, else the first visible
+    sample is used.
+    """
+    px, py, pz = (float(v) for v in position)
+    tx, ty, tz = (float(v) for v in target_pos)
+    count, cx, cy, cz = _target_hits_nb(px, py, pz, adb.dx, adb.dy, adb.dz, adb.sample_solid_angle,
+                                        adb.top_occluder_idx, int(target_id), tx, ty, tz,
+                                        adb._scratch_idx, adb._scratch_w)
+    if count == 0:
+        return None
+
+    idxs = adb._scratch_idx[:count]
+    f32 = adb._scratch_f32
+    dxv = np.take(adb.dx, idxs, out=f32[0, :count], mode="clip")
+    dyv = np.take(adb.dy, idxs, out=f32[1, :count], mode="clip")
+    dzv = np.take(adb.dz, idxs, out=f32[2, :count], mode="clip")
+    ang = f32[3, :count]
+    yaw_min, yaw_max = wrapped_interval_from_angles(np.arctan2(dzv, dxv, out=ang))
+    pitch_all = np.negative(np.arctan2(dyv, np.hypot(dxv, dzv, out=ang), out=ang), out=ang)
+    pitch_min, pitch_max = float(np.min(pitch_all)), float(np.max(pitch_all))
+
+    wsum = _pairwise_sum_nb(adb._scratch_w, 0, count)
+    vx, vy, vz = cx / wsum - px, cy / wsum - py, cz / wsum - pz
+    center_idx = adb.idx_from_yaw_pitch(math.atan2(vz, vx), -math.atan2(vy, math.hypot(vx, vz)))
+
+    chosen_idx = int(idxs[0])
+    if center_top_idx[center_idx] == int(target_id):
+        hit, _ = _unit_block_hit_t_nb(tx, ty, tz, px, py, pz,
+                                      adb.dx[center_idx], adb.dy[center_idx], adb.dz[center_idx])
+        if hit:
+            chosen_idx = center_idx
+
+    dx = adb.dx[chosen_idx]; dy = adb.dy[chosen_idx]; dz = adb.dz[chosen_idx]
+    yaw_rad_final = math.atan2(dz, dx)
+    pitch_rad_final = -math.atan2(dy, math.hypot(dx, dz))
+    yaw_deg, pitch_deg = to_minecraft_angles_degrees(yaw_rad_final, pitch_rad_final)
+
+    return TargetInfo(
+        target_pos,
+        (dx, dy, dz),
+        (yaw_deg, pitch_deg),
+        (yaw_min, yaw_max),
+        (pitch_min, pitch_max),
+        wsum
+    )
+
+
 # ------------------------------
 # block scanning and parsing
 # ------------------------------
@@ -2369,6 +3894,99 @@ def _parse_block_string(bs: str) -> Tuple[str, str, Dict[str, Any]]:
         simple = short
     return base, simple, meta
 
+class BlockPalette:
+    """Interned block states: each distinct block string is parsed once and keeps its index for the session."""
+
+    def __init__(self):
+        self._index: Dict[str, int] = {}
+        self.states: List[Tuple[str, str, Dict[str, Any]]] = []
+        self._base_masks: Dict[FrozenSet[str], np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    def __getitem__(self, i: int) -> Tuple[str, str, Dict[str, Any]]:
+        return self.states[i]
+
+    def intern(self, bs: str) -> int:
+        i = self._index.get(bs)
+        if i is None:
+            i = len(self.states)
+            self.states.append(_parse_block_string(bs))
+            self._index[bs] = i
+        return i
+
+    def encode(self, block_strings: Sequence[str]) -> np.ndarray:
+        with instrumentation.stage("parse") as st:
+            n_states = len(self.states)
+            codes = np.fromiter((self.intern(bs) for bs in block_strings), dtype=np.int32, count=len(block_strings))
+            st.note(blocks=len(block_strings), parsed=len(self.states) - n_states)
+        return codes
+
+    def base_mask(self, bases) -> np.ndarray:
+        """Per-entry mask of the states whose base id is in `bases`, memoized until the palette grows."""
+        key = frozenset(bases)
+        mask = self._base_masks.get(key)
+        if mask is None or mask.shape[0] != len(self.states):
+            mask = np.fromiter((s[0] in key for s in self.states), dtype=np.bool_, count=len(self.states))
+            self._base_masks[key] = mask
+        return mask
+
+class BlockSnapshot:
+    """Palette-encoded blocks: int32 (N, 3) positions plus the palette index of every block.
+
+    Iterates and indexes as (pos, base, simple, meta) tuples, so it can stand in for the block lists
+    the scanner takes; palette metas are shared between blocks and must not be mutated.
+    """
+
+    def __init__(self, positions: np.ndarray, states: np.ndarray, palette: BlockPalette):
+        self.positions = np.ascontiguousarray(np.asarray(positions, dtype=np.int32).reshape((-1, 3)))
+        self.states = np.ascontiguousarray(np.asarray(states, dtype=np.int32))
+        self.palette = palette
+
+    @classmethod
+    def from_strings(cls, positions: np.ndarray, block_strings: Sequence[str],
+                     palette: Optional[BlockPalette] = None) -> BlockSnapshot:
+        palette = get_block_palette() if palette is None else palette
+        return cls(positions, palette.encode(block_strings), palette)
+
+    def __len__(self) -> int:
+        return self.states.shape[0]
+
+    def __getitem__(self, i: int) -> Tuple[BlockPos, str, str, Dict[str, Any]]:
+        x, y, z = self.positions[i].tolist()
+        return ((x, y, z),) + self.palette[int(self.states[i])]
+
+    def __iter__(self):
+        states = self.palette.states
+        for (x, y, z), s in zip(self.positions.tolist(), self.states.tolist()):
+            yield ((x, y, z),) + states[s]
+
+    def base_mask(self, bases) -> np.ndarray:
+        """Per-block mask of the blocks whose base id is in `bases`, looked up once per palette entry."""
+        return self.palette.base_mask(bases)[self.states]
+
+    def solid_mask(self) -> np.ndarray:
+        return ~self.base_mask(('minecraft:air', 'minecraft:water'))
+
+    def pos_to_id(self) -> Dict[BlockPos, int]:
+        return {(x, y, z): i for i, (x, y, z) in enumerate(self.positions.tolist())}
+
+    def without(self, positions) -> BlockSnapshot:
+        """Snapshot minus the blocks at `positions` (e.g. ones that were just mined)."""
+        drop = {tuple(p) for p in positions}
+        if not drop:
+            return self
+        keep = np.fromiter(((x, y, z) not in drop for (x, y, z) in self.positions.tolist()),
+                           dtype=np.bool_, count=len(self))
+        return BlockSnapshot(self.positions[keep], self.states[keep], self.palette)
+
+    def copy(self) -> BlockSnapshot:
+        return BlockSnapshot(self.positions.copy(), self.states.copy(), self.palette)
+
+    def set_state(self, indices, bs: str) -> None:
+        self.states[np.asarray(indices, dtype=np.int64)] = self.palette.intern(bs)
+
 
 # ------------------------------
 # candidate gathering in cone
@@ -2402,11 +4020,262 @@ def gather_candidate_polygons_in_cone(
                 cand.append(p_copy)
     return cand
 
+# ------------------------------
+# occlusion dependency tables
+# ------------------------------
+
+@nb.njit(cache=True)
+def _pencil_crosses_cell_nb(eye_c, face_c, cx, cy, cz):
+    """True if every segment from the eye box to the face patch (corner arrays (8, 3), (4, 3)) passes through
+    the interior of cell (cx, cy, cz): on some axis plane inside the cell, all their crossings lie inside it."""
+    cell = np.empty(3, dtype=np.float64)
+    cell[0] = cx; cell[1] = cy; cell[2] = cz
+    margin = 1e-6
+    for b in range(3):
+        u = (b + 1) % 3
+        v = (b + 2) % 3
+        for k in range(4):
+            s = cell[b] + (k + 0.5) * 0.25
+            eye_below = True
+            eye_above = True
+            for i in range(8):
+                eye_below = eye_below and eye_c[i, b] < s
+                eye_above = eye_above and eye_c[i, b] > s
+            face_below = True
+            face_above = True
+            for j in range(4):
+                face_below = face_below and face_c[j, b] < s
+                face_above = face_above and face_c[j, b] > s
+            if not ((eye_below and face_above) or (eye_above and face_below)):
+                continue
+            # the pencil's cross-section is the hull of the corner-to-corner crossings
+            inside = True
+            for i in range(8):
+                for j in range(4):
+                    t = (s - eye_c[i, b]) / (face_c[j, b] - eye_c[i, b])
+                    cu = eye_c[i, u] + t * (face_c[j, u] - eye_c[i, u])
+                    cv = eye_c[i, v] + t * (face_c[j, v] - eye_c[i, v])
+                    if not (cell[u] + margin < cu < cell[u] + 1.0 - margin
+                            and cell[v] + margin < cv < cell[v] + 1.0 - margin):
+                        inside = False
+                        break
+                if not inside:
+                    break
+            if inside:
+                return True
+    return False
+
+@nb.njit(cache=True)
+def _occlusion_table_nb(offsets, index, radius, eye_lo, eye_hi, patches):
+    """
+    Occlusion dependencies of every stencil cell for an eye anywhere in the box [eye_lo, eye_hi] of the
+    eye block (offsets relative to the eye block, index the (2r+1)^3 grid of stencil slots or -1).
+
+    masks[i, f, p] is the bit set of stencil cells that each block every ray from the eye box to patch p
+    of face f (2 * axis + side) of cell i, facing[i, f] whether such rays exist. With a full cube in any of
+    them for every patch of every facing face, cell i is hidden from the whole box.
+    """
+    n = offsets.shape[0]
+    words = (n + 63) // 64
+    masks = np.zeros((n, 6, patches * patches, words), dtype=np.uint64)
+    facing = np.zeros((n, 6), dtype=np.bool_)
+
+    eye_c = np.empty((8, 3), dtype=np.float64)
+    for k in range(8):
+        for a in range(3):
+            eye_c[k, a] = eye_hi[a] if (k >> a) & 1 else eye_lo[a]
+    face_c = np.empty((4, 3), dtype=np.float64)
+    o = np.empty(3, dtype=np.int64)
+    lo = np.empty(3, dtype=np.int64)
+    hi = np.empty(3, dtype=np.int64)
+
+    for i in range(n):
+        for a in range(3):
+            o[a] = offsets[i, a]
+        if o[0] == 0 and o[1] == 0 and o[2] == 0:
+            # rays start inside the eye block: never hidden
+            facing[i, :] = True
+            continue
+        for a in range(3):
+            for side in range(2):
+                f = 2 * a + side
+                plane = o[a] + side
+                if not ((side == 0 and eye_lo[a] < plane) or (side == 1 and eye_hi[a] > plane)):
+                    continue
+                facing[i, f] = True
+                u = (a + 1) % 3
+                v = (a + 2) % 3
+
+                # cells in the box around the eye box and the face
+                for c in range(3):
+                    f_lo = plane if c == a else o[c]
+                    f_hi = plane if c == a else o[c] + 1
+                    lo[c] = max(int(math.floor(min(eye_lo[c], f_lo))), -radius)
+                    hi[c] = min(int(math.ceil(max(eye_hi[c], f_hi))) - 1, radius)
+
+                for cx in range(lo[0], hi[0] + 1):
+                    for cy in range(lo[1], hi[1] + 1):
+                        for cz in range(lo[2], hi[2] + 1):
+                            if cx == 0 and cy == 0 and cz == 0:
+                                continue
+                            if cx == o[0] and cy == o[1] and cz == o[2]:
+                                continue
+                            j = index[cx + radius, cy + radius, cz + radius]
+                            if j < 0:
+                                continue
+                            word = j >> 6
+                            bit = np.uint64(1) << np.uint64(j & 63)
+                            # a full cube against the face covers all of it
+                            neighbour = (cx - o[0]) + (cy - o[1]) + (cz - o[2]) == (1 if side == 1 else -1) \
+                                and ((a == 0 and cy == o[1] and cz == o[2]) or (a == 1 and cx == o[0] and cz == o[2])
+                                     or (a == 2 and cx == o[0] and cy == o[1]))
+                            for pu in range(patches):
+                                for pv in range(patches):
+                                    p = pu * patches + pv
+                                    if not neighbour:
+                                        for q in range(4):
+                                            face_c[q, a] = plane
+                                            face_c[q, u] = o[u] + (pu + (q & 1)) / patches
+                                            face_c[q, v] = o[v] + (pv + (q >> 1)) / patches
+                                        if not _pencil_crosses_cell_nb(eye_c, face_c, cx, cy, cz):
+                                            continue
+                                    masks[i, f, p, word] |= bit
+    return masks, facing
+
+@nb.njit(cache=True)
+def _occluded_targets_nb(masks, facing, index, radius, positions, full_cube, target_rows, ex, ey, ez):
+    """Targets a table proves hidden from eye block (ex, ey, ez): every patch of every facing face has a
+    full cube among its blockers. Targets outside the stencil are never hidden."""
+    words = masks.shape[3]
+    side_len = 2 * radius + 1
+    occupied = np.zeros(words, dtype=np.uint64)
+    for i in range(positions.shape[0]):
+        if not full_cube[i]:
+            continue
+        ox = positions[i, 0] - ex + radius
+        oy = positions[i, 1] - ey + radius
+        oz = positions[i, 2] - ez + radius
+        if ox < 0 or oy < 0 or oz < 0 or ox >= side_len or oy >= side_len or oz >= side_len:
+            continue
+        j = index[ox, oy, oz]
+        if j >= 0:
+            occupied[j >> 6] |= np.uint64(1) << np.uint64(j & 63)
+
+    hidden = np.zeros(target_rows.shape[0], dtype=np.bool_)
+    for t in range(target_rows.shape[0]):
+        r = target_rows[t]
+        ox = positions[r, 0] - ex + radius
+        oy = positions[r, 1] - ey + radius
+        oz = positions[r, 2] - ez + radius
+        if ox < 0 or oy < 0 or oz < 0 or ox >= side_len or oy >= side_len or oz >= side_len:
+            continue
+        k = index[ox, oy, oz]
+        if k < 0:
+            continue
+        blocked = True
+        for f in range(6):
+            if not facing[k, f]:
+                continue
+            for p in range(masks.shape[2]):
+                hit = False
+                for w in range(words):
+                    if masks[k, f, p, w] & occupied[w]:
+                        hit = True
+                        break
+                if not hit:
+                    blocked = False
+                    break
+            if not blocked:
+                break
+        hidden[t] = blocked
+    return hidden
+
+def _stencil(stencil_d2: int) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Block offsets with squared length <= stencil_d2 (the order of _positions_within_reach) and their slots."""
+    radius = int(math.isqrt(stencil_d2))
+    r = np.arange(-radius, radius + 1)
+    grid = np.stack(np.meshgrid(r, r, r, indexing="ij"), axis=-1).reshape((-1, 3))
+    offsets = np.ascontiguousarray(grid[(grid * grid).sum(axis=1) <= stencil_d2], dtype=np.int64)
+    index = np.full((2 * radius + 1,) * 3, -1, dtype=np.int64)
+    index[offsets[:, 0] + radius, offsets[:, 1] + radius, offsets[:, 2] + radius] = np.arange(len(offsets))
+    return offsets, index, radius
+
+def stencil_d2_for_reach(reach: float) -> int:
+    """The stencil of _positions_within_reach(reach) as a squared block offset."""
+    return int(math.floor((reach - 0.5) ** 2))
+
+class OcclusionTable:
+    """Which stencil cells can occlude each face of every other stencil cell, for one eye sub-block bin.
+
+    Pure geometry: built once per (stencil, eye bin), kept on disk next to the compiled kernels, and turned
+    into visibility by bit tests against the full cubes of a snapshot.
+    """
+
+    def __init__(self, stencil_d2: int, eye_bin: Tuple[int, int, int],
+                 bins: int = OCCLUSION_EYE_BINS, patches: int = OCCLUSION_FACE_PATCHES,
+                 masks: Optional[np.ndarray] = None, facing: Optional[np.ndarray] = None):
+        self.stencil_d2 = int(stencil_d2)
+        self.eye_bin = tuple(int(b) for b in eye_bin)
+        self.bins = int(bins)
+        self.patches = int(patches)
+        self.offsets, self.index, self.radius = _stencil(self.stencil_d2)
+        if masks is None or facing is None:
+            eye_lo = np.array(self.eye_bin, dtype=np.float64) / self.bins
+            masks, facing = _occlusion_table_nb(self.offsets, self.index, self.radius,
+                                                eye_lo, eye_lo + 1.0 / self.bins, self.patches)
+        self.masks = masks
+        self.facing = facing
+
+    @staticmethod
+    def file_name(stencil_d2: int, eye_bin: Tuple[int, int, int], bins: int, patches: int) -> str:
+        bx, by, bz = eye_bin
+        return (f"occlusion_v{OCCLUSION_TABLE_VERSION}_d{stencil_d2}_q{bins}_m{patches}"
+                f"_{bx}{by}{bz}.npz")
+
+    @classmethod
+    def load_or_build(cls, directory: Optional[str], stencil_d2: int, eye_bin: Tuple[int, int, int],
+                      bins: int = OCCLUSION_EYE_BINS, patches: int = OCCLUSION_FACE_PATCHES) -> OcclusionTable:
+        """Read the table from `directory`, or build it and write it there (an unwritable directory only
+        means the next process builds it again)."""
+        path = None if directory is None else os.path.join(directory, cls.file_name(stencil_d2, eye_bin, bins, patches))
+        if path is not None:
+            try:
+                with np.load(path) as data:
+                    return cls(stencil_d2, eye_bin, bins, patches, data["masks"], data["facing"])
+            except (OSError, KeyError, ValueError):
+                pass
+        table = cls(stencil_d2, eye_bin, bins, patches)
+        if path is not None:
+            try:
+                os.makedirs(directory, exist_ok=True)
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    np.savez_compressed(f, masks=table.masks, facing=table.facing)
+                os.replace(tmp, path)
+            except OSError:
+                pass
+        return table
+
+    def hidden(self, positions: np.ndarray, full_cube: np.ndarray, target_rows: np.ndarray,
+               position: Vec3) -> np.ndarray:
+        """Per target row, whether the full cubes of `positions` hide it from `position`."""
+        ex, ey, ez = (int(math.floor(v)) for v in position)
+        return _occluded_targets_nb(self.masks, self.facing, self.index, self.radius, positions, full_cube,
+                                    target_rows, ex, ey, ez)
+
+def occlusion_eye_bin(position: Vec3, bins: int = OCCLUSION_EYE_BINS) -> Tuple[int, int, int]:
+    return tuple(min(int((float(v) - math.floor(float(v))) * bins), bins - 1) for v in position)
+
+def occlusion_table_dir() -> str:
+    """Where the tables are cached: next to the scanner's compiled kernels."""
+    return os.path.join(build_bvh_sah_nb._cache._cache_path, "occlusion_tables")
+
 # ------------------------------
 # library internal objects
 # ------------------------------
 
-@lru_cache(maxsize=1)
+# two: the script's ADB and the warm-up's (warmup.WARMUP_GRANULARITY) must not evict each other
+@lru_cache(maxsize=2)
 def get_adb(yaw_bins, pitch_bins) -> HighResADB:
     return HighResADB(yaw_bins, pitch_bins)
 
@@ -2414,168 +4283,86 @@ def get_adb(yaw_bins, pitch_bins) -> HighResADB:
 def get_blockcache() -> BlockGeometryCache:
     return BlockGeometryCache()
 
+@lru_cache(maxsize=1)
+def get_block_palette() -> BlockPalette:
+    return BlockPalette()
+
+@lru_cache(maxsize=16)
+def get_occlusion_table(stencil_d2: int, eye_bin: Tuple[int, int, int]) -> OcclusionTable:
+    return OcclusionTable.load_or_build(occlusion_table_dir(), stencil_d2, eye_bin)
+
 
 # ------------------------------
 # library api
 # ------------------------------
 
+@instrumentation.timed("scan_target")
 def scan_target(
     position: Tuple[float, float, float],
     target: Tuple[int, int, int],
-    occluders: List[Tuple[BlockPos, str, str, Optional[Dict[str, Any]]]],
+    occluders: Union[BlockSnapshot, List[Tuple[BlockPos, str, str, Optional[Dict[str, Any]]]]],
     adb_granularity: Tuple[int, int] = (256, 124),
+    raster_method: str = "auto",
+    reach: Optional[float] = None,
 ) -> Optional[TargetInfo]:
+    """reach: rays end there, so only blocks a player can reach from `position` are seen (None: unbounded)."""
 
     if not occluders:
         return None
 
-    pos_to_occluder_id: Dict[BlockPos, int] = {tuple(entry[0]): i for i, entry in enumerate(occluders)}
+    pos_to_occluder_id = _pos_to_occluder_id(occluders)
 
     tpos = target
     if tuple(tpos) not in pos_to_occluder_id:
         return None
 
+    max_depth = _max_depth(reach)
     tid = pos_to_occluder_id[tuple(tpos)]
-    tentry = next((entry for entry in occluders if entry[0] == tpos), None)
-    if tentry is None:
+    open_faces, open_boxes = _target_exposure(occluders, [tid], position, max_depth)
+    if not open_faces[0]:
         return None
-    tbase, tshort, tmeta = tentry[1], tentry[2], tentry[3]
+    open_box = open_boxes[0]
 
     block_geom_cache = get_blockcache()
 
     adb = get_adb(adb_granularity[0], adb_granularity[1])
-    adb.reset_depth()
 
-    n_occluders = sum(1 for pos, base, _, _ in occluders if base not in ('minecraft:air', 'minecraft:water'))
-    coarse_aabbs = np.empty((n_occluders, 6), dtype=np.float64)
-    coarse_ids = np.empty(n_occluders, dtype=np.int32)
-
-    i = 0
-    for pos, base, _, _ in occluders:
-        if base in ('minecraft:air', 'minecraft:water'):
-            continue
-        coarse_aabbs[i, :] = make_aabb_from_block(pos)
-        coarse_ids[i] = pos_to_occluder_id[tuple(pos)]
-        i += 1
+    coarse_aabbs, coarse_ids = _coarse_occluders(occluders, pos_to_occluder_id)
 
     position = np.ascontiguousarray(np.array(position, dtype=np.float64))
 
-
-    adb.rasterize_occluders(coarse_aabbs, position, occluder_ids=coarse_ids, max_depth=float('inf'))
-
-    depth_baseline = adb.depth.copy()
-    idx_baseline = adb.top_occluder_idx.copy()
-
-    def restore_baseline():
-        adb.depth[:] = depth_baseline
-        adb.top_occluder_idx[:] = idx_baseline
-
-    restore_baseline()
-    target_aabb = np.asarray(make_aabb_from_block(tpos))
+    roi = adb.roi_indices([make_aabb_from_block(tpos)], position)
+    adb.rasterize_coarse(coarse_aabbs, coarse_ids, position, method=raster_method, roi=roi, max_depth=max_depth)
 
     block_geom_cache.analytic_refine_depth_in_target_cone(
         adb=adb,
         position=position,
-        target_aabb=target_aabb,
+        target_aabb=open_box,
         blocks=occluders,
-        max_depth=float('inf'),
+        max_depth=max_depth,
         yaw_margin_deg=0.5,
         pitch_margin_deg=0.5,
         pos_to_occluder_id=pos_to_occluder_id,
     )
 
-    mask_top = (adb.top_occluder_idx == int(tid))
-    xmin, xmax, ymin, ymax, zmin, zmax = (float(v) for v in target_aabb)
-    tmin_targ, tmax_targ = ray_aabb_intersection_vec(
-        *position,
-        adb.dx, adb.dy, adb.dz,
-        xmin, xmax, ymin, ymax, zmin, zmax
-    )
-    ttarget = np.where(~np.isnan(tmin_targ), np.where(tmin_targ >= 0.0, tmin_targ, tmax_targ), np.nan)
-    mask_tvalid = ~np.isnan(ttarget)
-    mask_visible = mask_top & mask_tvalid
-    if not np.any(mask_visible):
-        return None
-
-    idxs = np.nonzero(mask_visible)[0]
-    hits_n = len(idxs)
-    tvis = ttarget[idxs]
-    dxv, dyv, dzv = adb.dx[idxs], adb.dy[idxs], adb.dz[idxs]
-    hits_x = position[0] + dxv * tvis
-    hits_y = position[1] + dyv * tvis
-    hits_z = position[2] + dzv * tvis
-    hit_points = np.stack((hits_x, hits_y, hits_z), axis=1)
-
-    face_ids, uvs_arr = face_and_uv_for_points_vec(target_aabb,
-                                                   hits_x.astype(np.float64),
-                                                   hits_y.astype(np.float64),
-                                                   hits_z.astype(np.float64))
-
-    yaw_all = np.arctan2(adb.dz[idxs], adb.dx[idxs])
-    pitch_all = -np.arctan2(adb.dy[idxs], np.hypot(adb.dx[idxs], adb.dz[idxs]))
-    yaw_min, yaw_max = wrapped_interval_from_angles(yaw_all)
-    pitch_min, pitch_max = float(np.min(pitch_all)), float(np.max(pitch_all))
-
-    weights = adb.sample_solid_angle[idxs]
-    wsum = float(np.sum(weights))
-    centroid_world = tuple(np.sum(hit_points * weights[:, None], axis=0) / wsum)
-    centroid_uv = tuple(np.sum(uvs_arr * weights[:, None], axis=0) / wsum)
-    solid_angle = float(np.sum(weights))
-
-    best_candidate = {
-        'target_pos': tpos,
-        'target_base': tbase,
-        'idxs': idxs,
-        'sample_count': hits_n,
-        'solid_angle': solid_angle,
-        'centroid_world': centroid_world,
-        'centroid_uv': centroid_uv,
-        'face_ids': face_ids,
-        'yaw_bounds': (yaw_min, yaw_max),
-        'pitch_bounds': (pitch_min, pitch_max),
-    }
-
-    cx, cy, cz = centroid_world
-    vx, vy, vz = cx - position[0], cy - position[1], cz - position[2]
-    hyp = math.hypot(vx, vz)
-    yaw_rad_centroid = math.atan2(vz, vx)
-    pitch_rad_centroid = -math.atan2(vy, hyp)
-
-    center_idx = adb.idx_from_yaw_pitch(yaw_rad_centroid, pitch_rad_centroid)
-
-    if (adb.top_occluder_idx[center_idx] == int(tid)) and (not np.isnan(ttarget[center_idx])):
-        chosen_idx = center_idx
-    else:
-        chosen_idx = int(idxs[0]) if idxs.size > 0 else None
-
-    if chosen_idx is None:
-        return None
-
-    if chosen_idx is None:
-        return None
-
-    t = ttarget[chosen_idx]
-    dx = adb.dx[chosen_idx]; dy = adb.dy[chosen_idx]; dz = adb.dz[chosen_idx]
-
-    yaw_rad_final = math.atan2(dz, dx)
-    pitch_rad_final = -math.atan2(dy, math.hypot(dx, dz))
-    yaw_deg, pitch_deg = to_minecraft_angles_degrees(yaw_rad_final, pitch_rad_final)
-
-    return TargetInfo(
-        best_candidate['target_pos'],
-        (dx, dy, dz),
-        (yaw_deg, pitch_deg),
-        best_candidate['yaw_bounds'],
-        best_candidate['pitch_bounds']
-    )
+    with instrumentation.stage("aim"):
+        return _aim_at_target(adb, position, tpos, tid, adb.top_occluder_idx)
 
+@instrumentation.timed("scan_targets")
 def scan_targets(
     position: Tuple[float, float, float],
     target_ids: List[str],
-    occluders: List[Tuple[BlockPos, str, str, Optional[Dict[str, Any]]]],
+    occluders: Union[BlockSnapshot, List[Tuple[BlockPos, str, str, Optional[Dict[str, Any]]]]],
     adb_granularity: Tuple[int, int] = (256, 124),
     previous_target: Tuple[float, float, float] = (0.0, 0.0, 0.0),
+    mode: str = "per_target",
+    raster_method: str = "auto",
+    reach: Optional[float] = None,
 ) -> Optional[TargetInfo]:
+    """reach: rays end there, so only blocks a player can reach from `position` are seen (None: unbounded)."""
+
+    if mode not in SCAN_MODES:
+        raise ValueError(f"mode must be one of {SCAN_MODES}, got {mode!r}")
 
     if not occluders:
         return None
@@ -2583,16 +4370,23 @@ def scan_targets(
     if previous_target is None:
         previous_target = (0.0, 0.0, 0.0)
 
-    pos_to_occluder_id: Dict[BlockPos, int] = {tuple(entry[0]): i for i, entry in enumerate(occluders)}
+    pos_to_occluder_id = _pos_to_occluder_id(occluders)
+    max_depth = _max_depth(reach)
 
     target_set = set(target_ids)
     entries = []
     pos_pylist = []
 
-    for (pos, base, short_type, meta) in occluders:
-        if base in target_set:
-            entries.append((pos, base, short_type, meta, pos_to_occluder_id[tuple(pos)]))
-            pos_pylist.append(pos)
+    # targets with no open face towards the eye are hidden whatever the rasters say
+    rows = _target_rows(occluders, target_set)
+    open_faces, open_boxes = _target_exposure(occluders, rows, position, max_depth)
+    instrumentation.note(targets=len(rows), exposed=int(np.count_nonzero(open_faces)))
+    for i, faces, box in zip(rows, open_faces.tolist(), open_boxes):
+        if not faces:
+            continue
+        pos, base, short_type, meta = occluders[i]
+        entries.append((pos, base, short_type, meta, pos_to_occluder_id[tuple(pos)], box))
+        pos_pylist.append(pos)
 
     if not entries:
         return None
@@ -2606,8 +4400,8 @@ def scan_targets(
 
     dists = distances_to_blocks_nb(previous_target_arr, pos_arr)
 
-    targets: List[Tuple[BlockPos, str, str, Dict[str, Any], int, float]] = [
-        (entries[i][0], entries[i][1], entries[i][2], entries[i][3], entries[i][4], float(dists[i]))
+    targets: List[Tuple[BlockPos, str, str, Dict[str, Any], int, float, np.ndarray]] = [
+        (entries[i][0], entries[i][1], entries[i][2], entries[i][3], entries[i][4], float(dists[i]), entries[i][5])
         for i in range(len(entries))
     ]
 
@@ -2619,132 +4413,428 @@ def scan_targets(
     block_geom_cache = get_blockcache()
 
     adb = get_adb(adb_granularity[0], adb_granularity[1])
-    adb.reset_depth()
 
-    n_occluders = sum(1 for pos, base, _, _ in occluders if base not in ('minecraft:air', 'minecraft:water'))
-    coarse_aabbs = np.empty((n_occluders, 6), dtype=np.float64)
-    coarse_ids = np.empty(n_occluders, dtype=np.int32)
-
-    i = 0
-    for pos, base, _, _ in occluders:
-        if base in ('minecraft:air', 'minecraft:water'):
-            continue
-        coarse_aabbs[i, :] = make_aabb_from_block(pos)
-        coarse_ids[i] = pos_to_occluder_id[tuple(pos)]
-        i += 1
+    coarse_aabbs, coarse_ids = _coarse_occluders(occluders, pos_to_occluder_id)
 
-    adb.rasterize_occluders(coarse_aabbs, position, occluder_ids=coarse_ids, max_depth=float('inf'))
+    roi = adb.roi_indices([make_aabb_from_block(t[0]) for t in targets], position)
+    adb.rasterize_coarse(coarse_aabbs, coarse_ids, position, method=raster_method, roi=roi, max_depth=max_depth)
 
-    depth_baseline = adb.depth.copy()
-    idx_baseline = adb.top_occluder_idx.copy()
+    targets.sort(key=lambda t: t[5])
 
-    def restore_baseline():
-        adb.depth[:] = depth_baseline
-        adb.top_occluder_idx[:] = idx_baseline
+    if mode == "single_pass":
+        return _scan_targets_single_pass(adb, block_geom_cache, position, occluders, targets, pos_to_occluder_id,
+                                         max_depth)
+    if mode == "parallel":
+        return _scan_targets_parallel(adb, block_geom_cache, position, occluders, targets, pos_to_occluder_id,
+                                      max_depth)
 
-    best_candidate: Optional[Dict[str, Any]] = None
-    targets.sort(key=lambda t: t[-1])
+    adb.save_baseline()
 
-    for tpos, tbase, tshort, tmeta, tid, dist in targets:
-        restore_baseline()
-        target_aabb = np.asarray(make_aabb_from_block(tpos))
+    for tpos, tbase, tshort, tmeta, tid, dist, open_box in targets:
+        adb.restore_baseline()
 
         block_geom_cache.analytic_refine_depth_in_target_cone(
             adb=adb,
             position=position,
-            target_aabb=target_aabb,
+            target_aabb=open_box,
             blocks=occluders,
-            max_depth=float('inf'),
+            max_depth=max_depth,
             yaw_margin_deg=0.5,
             pitch_margin_deg=0.5,
             pos_to_occluder_id=pos_to_occluder_id,
         )
 
-        mask_top = (adb.top_occluder_idx == int(tid))
-        xmin, xmax, ymin, ymax, zmin, zmax = (float(v) for v in target_aabb)
-        tmin_targ, tmax_targ = ray_aabb_intersection_vec(
-            *position,
-            adb.dx, adb.dy, adb.dz,
-            xmin, xmax, ymin, ymax, zmin, zmax
-        )
-        ttarget = np.where(~np.isnan(tmin_targ), np.where(tmin_targ >= 0.0, tmin_targ, tmax_targ), np.nan)
-        mask_tvalid = ~np.isnan(ttarget)
-        mask_visible = mask_top & mask_tvalid
-        if not np.any(mask_visible):
-            continue
-
-        idxs = np.nonzero(mask_visible)[0]
-        hits_n = len(idxs)
-        tvis = ttarget[idxs]
-        dxv, dyv, dzv = adb.dx[idxs], adb.dy[idxs], adb.dz[idxs]
-        hits_x = position[0] + dxv * tvis
-        hits_y = position[1] + dyv * tvis
-        hits_z = position[2] + dzv * tvis
-        hit_points = np.stack((hits_x, hits_y, hits_z), axis=1)
-
-        face_ids, uvs_arr = face_and_uv_for_points_vec(target_aabb,
-                                                   hits_x.astype(np.float64),
-                                                   hits_y.astype(np.float64),
-                                                   hits_z.astype(np.float64))
-
-        yaw_all = np.arctan2(adb.dz[idxs], adb.dx[idxs])
-        pitch_all = -np.arctan2(adb.dy[idxs], np.hypot(adb.dx[idxs], adb.dz[idxs]))
-        yaw_min, yaw_max = wrapped_interval_from_angles(yaw_all)
-        pitch_min, pitch_max = float(np.min(pitch_all)), float(np.max(pitch_all))
-
-        weights = adb.sample_solid_angle[idxs]
-        wsum = float(np.sum(weights))
-        centroid_world = tuple(np.sum(hit_points * weights[:, None], axis=0) / wsum)
-        centroid_uv = tuple(np.sum(uvs_arr * weights[:, None], axis=0) / wsum)
-        solid_angle = float(np.sum(weights))
-
-        candidate = {
-            'target_pos': tpos,
-            'target_base': tbase,
-            'idxs': idxs,
-            'sample_count': hits_n,
-            'solid_angle': solid_angle,
-            'centroid_world': centroid_world,
-            'centroid_uv': centroid_uv,
-            'face_ids': face_ids,
-            'yaw_bounds': (yaw_min, yaw_max),
-            'pitch_bounds': (pitch_min, pitch_max),
-        }
-
-        if best_candidate is None or candidate['solid_angle'] > best_candidate['solid_angle']:
-            best_candidate = candidate
-
-        restore_baseline()
+        with instrumentation.stage("aim"):
+            # the centre pixel is checked against the coarse buffer
+            info = _aim_at_target(adb, position, tpos, tid, adb.idx_baseline)
+        if info is not None:
+            adb.restore_baseline()
+            return info
+    return None
+
+def _scan_targets_single_pass(
+    adb: HighResADB,
+    block_geom_cache: BlockGeometryCache,
+    position: np.ndarray,
+    occluders: Union[BlockSnapshot, List[Tuple[BlockPos, str, str, Optional[Dict[str, Any]]]]],
+    targets: List[Tuple[BlockPos, str, str, Dict[str, Any], int, float, np.ndarray]],
+    pos_to_occluder_id: Dict[BlockPos, int],
+    max_depth: float = float('inf'),
+) -> Optional[TargetInfo]:
+    block_geom_cache.analytic_refine_depth_in_targets_cone(
+        adb=adb,
+        position=position,
+        target_aabbs=[t[6] for t in targets],
+        blocks=occluders,
+        max_depth=max_depth,
+        yaw_margin_deg=0.5,
+        pitch_margin_deg=0.5,
+        pos_to_occluder_id=pos_to_occluder_id,
+    )
 
-        if best_candidate is None:
-            return None
+    with instrumentation.stage("aim"):
+        stats = _collect_target_stats(adb, position, [t[4] for t in targets], len(occluders))
+        for slot, (tpos, tbase, tshort, tmeta, tid, dist, open_box) in enumerate(targets):
+            info = _target_info_from_stats(adb, position, tpos, tid, stats, slot)
+            if info is not None:
+                return info
+    return None
+
+def _scan_targets_parallel(
+    adb: HighResADB,
+    block_geom_cache: BlockGeometryCache,
+    position: np.ndarray,
+    occluders: Union[BlockSnapshot, List[Tuple[BlockPos, str, str, Optional[Dict[str, Any]]]]],
+    targets: List[Tuple[BlockPos, str, str, Dict[str, Any], int, float, np.ndarray]],
+    pos_to_occluder_id: Dict[BlockPos, int],
+    max_depth: float = float('inf'),
+) -> Optional[TargetInfo]:
+    """The per_target loop with one target per core: batches of get_num_threads() targets are refined and
+    aimed concurrently, each on a private copy of the coarse buffers, until a batch holds a visible one."""
+    block_pos, face_start, face_axis, face_rect, face_oid = block_geom_cache.face_table(occluders, pos_to_occluder_id)
+    if face_axis.shape[0] == 0:
+        return None
 
-        cx, cy, cz = best_candidate['centroid_world']
-        vx, vy, vz = cx - position[0], cy - position[1], cz - position[2]
-        hyp = math.hypot(vx, vz)
-        yaw_rad_centroid = math.atan2(vz, vx)
-        pitch_rad_centroid = -math.atan2(vy, hyp)
+    cones = [block_geom_cache._target_cone(adb, position, t[6], 0.5, 0.5) for t in targets]
+    cone_bounds = np.array([c[:4] for c in cones], dtype=np.float64)
+    cone_bins = np.full((len(cones), 6), -1, dtype=np.int64)
+    for i, (_, _, _, _, targ_iy_ranges, targ_ip_min, targ_ip_max) in enumerate(cones):
+        for r, (ty0, ty1) in enumerate(targ_iy_ranges):
+            cone_bins[i, 2 * r:2 * r + 2] = (ty0, ty1)
+        cone_bins[i, 4:] = (targ_ip_min, targ_ip_max)
+    target_pos = np.array([t[0] for t in targets], dtype=np.int64).reshape((-1, 3))
+    target_oid = np.array([t[4] for t in targets], dtype=np.int32)
+
+    n_workers = nb.get_num_threads()
+    scratch = adb.target_scratch(n_workers)
+    for b0 in range(0, len(targets), n_workers):
+        b1 = min(b0 + n_workers, len(targets))
+        with instrumentation.stage("refine") as st:
+            if st.enabled:
+                st.note(occluders=len(occluders), faces=face_axis.shape[0], targets=b1 - b0)
+            count, chosen, wsum, bounds = _scan_targets_parallel_nb(
+                position, adb.dx, adb.dy, adb.dz, adb.sample_solid_angle, adb.depth, adb.top_occluder_idx,
+                float(adb.yaw_min), float(adb.yaw_max - adb.yaw_min), int(adb.yaw_bins),
+                float(adb.pitch_min), float(adb.pitch_max - adb.pitch_min), int(adb.pitch_bins),
+                cone_bounds[b0:b1], cone_bins[b0:b1], target_pos[b0:b1], target_oid[b0:b1],
+                block_pos, face_start, face_axis, face_rect, face_oid,
+                float(max_depth), int(max(1024, adb.N // 8)),
+                *scratch,
+            )
 
-        center_idx = adb.idx_from_yaw_pitch(yaw_rad_centroid, pitch_rad_centroid)
+        with instrumentation.stage("aim"):
+            # the nearest visible target to the previous one wins, as in the per_target loop
+            for slot in range(b1 - b0):
+                if count[slot] == 0:
+                    continue
+                chosen_idx = int(chosen[slot])
+                dx = adb.dx[chosen_idx]; dy = adb.dy[chosen_idx]; dz = adb.dz[chosen_idx]
+
+                yaw_rad_final = math.atan2(dz, dx)
+                pitch_rad_final = -math.atan2(dy, math.hypot(dx, dz))
+                yaw_deg, pitch_deg = to_minecraft_angles_degrees(yaw_rad_final, pitch_rad_final)
+
+                yaw_lo, yaw_hi, pitch_lo, pitch_hi = (float(v) for v in bounds[slot])
+                return TargetInfo(
+                    targets[b0 + slot][0],
+                    (dx, dy, dz),
+                    (yaw_deg, pitch_deg),
+                    (yaw_lo, yaw_hi),
+                    (pitch_lo, pitch_hi),
+                    float(wsum[slot])
+                )
+    return None
+
+def _aabb_dist2(lo: np.ndarray, hi: np.ndarray, position: Vec3) -> np.ndarray:
+    """Squared distance from position to the nearest point of each (lo, hi) box, rows of (x, y, z)."""
+    p = np.asarray(position, dtype=np.float64)
+    gap = np.maximum(np.maximum(lo - p, 0.0), p - hi)
+    return np.einsum("ij,ij->i", gap, gap)
+
+def _max_depth(reach: Optional[float]) -> float:
+    return float('inf') if reach is None else float(reach)
+
+def _pos_to_occluder_id(occluders) -> Dict[BlockPos, int]:
+    if isinstance(occluders, BlockSnapshot):
+        return occluders.pos_to_id()
+    return {tuple(entry[0]): i for i, entry in enumerate(occluders)}
+
+def _target_rows(occluders, target_set) -> List[int]:
+    if isinstance(occluders, BlockSnapshot):
+        return np.flatnonzero(occluders.base_mask(target_set)).tolist()
+    return [i for i, entry in enumerate(occluders) if entry[1] in target_set]
+
+def _target_exposure(occluders, rows: Sequence[int], position: Vec3,
+                     max_depth: float = float('inf')) -> Tuple[np.ndarray, np.ndarray]:
+    """Open, eye-facing faces of the target rows and the box around them (see _target_exposure_nb); targets
+    farther than max_depth or that the occlusion table proves hidden get no faces."""
+    cache = get_blockcache()
+    if isinstance(occluders, BlockSnapshot):
+        positions = occluders.positions
+        state_full = np.zeros(len(occluders.palette), dtype=np.bool_)
+        for st in np.unique(occluders.states).tolist():
+            state_full[st] = cache._shape_kind(occluders.palette[st][0]) == "full_block"
+        full_cube = state_full[occluders.states]
+    else:
+        positions = np.array([entry[0] for entry in occluders], dtype=np.int64).reshape((-1, 3))
+        full_cube = np.array([cache._shape_kind(entry[1]) == "full_block" for entry in occluders], dtype=np.bool_)
+    px, py, pz = (float(v) for v in position)
+    target_rows = np.asarray(rows, dtype=np.int64)
+    faces, boxes = _target_exposure_nb(positions, full_cube, target_rows, px, py, pz)
+    if max_depth < INF and target_rows.size:
+        lo = positions[target_rows].astype(np.float64)
+        faces[_aabb_dist2(lo, lo + 1.0, position) > max_depth * max_depth] = 0
+
+    open_rows = target_rows[faces != 0]
+    if open_rows.size and positions.shape[0]:
+        offsets = positions - np.floor([px, py, pz]).astype(np.int64)
+        stencil_d2 = min(int((offsets * offsets).sum(axis=1).max()), OCCLUSION_MAX_D2)
+        table = get_occlusion_table(stencil_d2, occlusion_eye_bin((px, py, pz)))
+        hidden = table.hidden(positions, full_cube, open_rows, (px, py, pz))
+        faces[np.flatnonzero(faces)[hidden]] = 0
+    return faces, boxes
+
+@nb.njit(cache=True)
+def _target_exposure_nb(positions, full_cube, target_rows, px, py, pz):
+    """
+    Faces of the target blocks a ray from (px, py, pz) can enter: faces the eye is in front of whose
+    neighbour is not a full cube (absent from positions counts as open). A ray entering a block through a
+    face covered by a full cube has passed through that cube first, so targets without such a face are hidden.
+
+    positions (B, 3) int, full_cube (B,) bool, target_rows (T,) rows of positions.
+    Returns per target a bit set of its open faces (bit 2 * axis + side, side 1 = the max face)
+    and the (xmin, xmax, ymin, ymax, zmin, zmax) box around them.
+    """
+    n = positions.shape[0]
+    n_targets = target_rows.shape[0]
+    faces = np.zeros(n_targets, dtype=np.uint8)
+    boxes = np.zeros((n_targets, 6), dtype=np.float64)
+    if n == 0:
+        return faces, boxes
+
+    lo = np.empty(3, dtype=np.int64)
+    hi = np.empty(3, dtype=np.int64)
+    for a in range(3):
+        lo[a] = positions[0, a]
+        hi[a] = positions[0, a]
+    for i in range(1, n):
+        for a in range(3):
+            lo[a] = min(lo[a], positions[i, a])
+            hi[a] = max(hi[a], positions[i, a])
+    covered = np.zeros((hi[0] - lo[0] + 1, hi[1] - lo[1] + 1, hi[2] - lo[2] + 1), dtype=np.bool_)
+    for i in range(n):
+        if full_cube[i]:
+            covered[positions[i, 0] - lo[0], positions[i, 1] - lo[1], positions[i, 2] - lo[2]] = True
+
+    eye = np.empty(3, dtype=np.float64)
+    eye[0] = px; eye[1] = py; eye[2] = pz
+    eye_cell = np.empty(3, dtype=np.int64)
+    for a in range(3):
+        eye_cell[a] = int(math.floor(eye[a]))
+    b = np.empty(3, dtype=np.int64)
+    nb_cell = np.empty(3, dtype=np.int64)
+    for t in range(n_targets):
+        for a in range(3):
+            b[a] = positions[target_rows[t], a]
+            boxes[t, 2 * a] = INF
+            boxes[t, 2 * a + 1] = -INF
+        bits = 0
+        if b[0] == eye_cell[0] and b[1] == eye_cell[1] and b[2] == eye_cell[2]:
+            # the eye is inside the target: every ray starts in it
+            for a in range(3):
+                boxes[t, 2 * a] = b[a]
+                boxes[t, 2 * a + 1] = b[a] + 1
+            faces[t] = 63
+            continue
+        for a in range(3):
+            for side in range(2):
+                # the eye must be strictly in front of the face plane
+                if side == 0 and not (eye[a] < b[a]):
+                    continue
+                if side == 1 and not (eye[a] > b[a] + 1):
+                    continue
+                inside = True
+                for c in range(3):
+                    nb_cell[c] = b[c] + (0 if c != a else (1 if side == 1 else -1))
+                    if nb_cell[c] < lo[c] or nb_cell[c] > hi[c]:
+                        inside = False
+                # a cube around the eye does not hide anything from it
+                is_eye = nb_cell[0] == eye_cell[0] and nb_cell[1] == eye_cell[1] and nb_cell[2] == eye_cell[2]
+                if inside and not is_eye and covered[nb_cell[0] - lo[0], nb_cell[1] - lo[1], nb_cell[2] - lo[2]]:
+                    continue
+                bits |= 1 << (2 * a + side)
+                for c in range(3):
+                    f_lo = b[c] + (side if c == a else 0)
+                    f_hi = b[c] + (side if c == a else 1)
+                    boxes[t, 2 * c] = min(boxes[t, 2 * c], f_lo)
+                    boxes[t, 2 * c + 1] = max(boxes[t, 2 * c + 1], f_hi)
+        faces[t] = bits
+    return faces, boxes
+
+def _coarse_occluders(occluders, pos_to_occluder_id: Dict[BlockPos, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Unit-cube AABBs and occluder ids of every block that is not air or water."""
+    if isinstance(occluders, BlockSnapshot):
+        # snapshot positions are unique, so the occluder id is the row
+        coarse_ids = np.flatnonzero(occluders.solid_mask()).astype(np.int32)
+        lo = occluders.positions[coarse_ids].astype(np.float64)
+        coarse_aabbs = np.empty((coarse_ids.shape[0], 6), dtype=np.float64)
+        coarse_aabbs[:, 0::2] = lo
+        coarse_aabbs[:, 1::2] = lo + 1.0
+        return coarse_aabbs, coarse_ids
 
-        if (adb.top_occluder_idx[center_idx] == int(tid)) and (not np.isnan(ttarget[center_idx])):
-            chosen_idx = center_idx
-        else:
-            chosen_idx = int(idxs[0]) if idxs.size > 0 else None
+    n_occluders = sum(1 for pos, base, _, _ in occluders if base not in ('minecraft:air', 'minecraft:water'))
+    coarse_aabbs = np.empty((n_occluders, 6), dtype=np.float64)
+    coarse_ids = np.empty(n_occluders, dtype=np.int32)
 
-        if chosen_idx is None:
-            return None
+    i = 0
+    for pos, base, _, _ in occluders:
+        if base in ('minecraft:air', 'minecraft:water'):
+            continue
+        coarse_aabbs[i, :] = make_aabb_from_block(pos)
+        coarse_ids[i] = pos_to_occluder_id[tuple(pos)]
+        i += 1
+    return coarse_aabbs, coarse_ids
 
-        dx = adb.dx[chosen_idx]; dy = adb.dy[chosen_idx]; dz = adb.dz[chosen_idx]
+def _rasterize_coarse(
+    adb: HighResADB,
+    position: np.ndarray,
+    occluders: Union[BlockSnapshot, List[Tuple[BlockPos, str, str, Optional[Dict[str, Any]]]]],
+    pos_to_occluder_id: Dict[BlockPos, int],
+    raster_method: str = "auto",
+    roi_aabbs: Optional[Sequence[AABB]] = None,
+    max_depth: float = float('inf'),
+) -> None:
+    coarse_aabbs, coarse_ids = _coarse_occluders(occluders, pos_to_occluder_id)
+
+    roi = None if roi_aabbs is None else adb.roi_indices(roi_aabbs, position)
+    adb.rasterize_coarse(coarse_aabbs, coarse_ids, position, method=raster_method, roi=roi, max_depth=max_depth)
+
+class RankedScan:
+    """Every visible target of one scan, ranked, with a hook to re-check targets after blocks break."""
+
+    def __init__(self,
+        position: Tuple[float, float, float],
+        target_ids: List[str],
+        occluders: Union[BlockSnapshot, List[Tuple[BlockPos, str, str, Optional[Dict[str, Any]]]]],
+        adb_granularity: Tuple[int, int] = (256, 124),
+        top_k: Optional[int] = None,
+        raster_method: str = "auto",
+        reach: Optional[float] = None,
+    ):
+        self.position = np.ascontiguousarray(np.array(position, dtype=np.float64))
+        self.adb_granularity = adb_granularity
+        self.top_k = top_k
+        self.raster_method = raster_method
+        self.max_depth = _max_depth(reach)
+        # invalidate() edits the blocks in place, so keep a private copy
+        self.occluders = occluders.copy() if isinstance(occluders, BlockSnapshot) else list(occluders)
+        self.pos_to_occluder_id = _pos_to_occluder_id(self.occluders)
+
+        target_set = set(target_ids)
+        self._candidates: List[Tuple[BlockPos, int]] = [
+            (tuple(self.occluders[i][0]), self.pos_to_occluder_id[tuple(self.occluders[i][0])])
+            for i in _target_rows(self.occluders, target_set)
+        ]
+        self._visible: Dict[BlockPos, TargetInfo] = {}
+        self.targets: List[TargetInfo] = []
+
+        self._evaluate(self._candidates)
+
+    def is_stale(self, position: Tuple[float, float, float], tolerance: float = 0.05) -> bool:
+        return distance_to_block(position, self.position) > tolerance
+
+    def discard(self, position: BlockPos) -> List[TargetInfo]:
+        pos = tuple(position)
+        self._visible.pop(pos, None)
+        self._candidates = [c for c in self._candidates if c[0] != pos]
+        self._rank()
+        return self.targets
+
+    @instrumentation.timed("ranked_invalidate")
+    def invalidate(self, air_positions) -> List[TargetInfo]:
+        broken = [tuple(p) for p in air_positions if tuple(p) in self.pos_to_occluder_id]
+        if not broken:
+            return self.targets
+
+        broken_set = set(broken)
+        for pos in broken:
+            oid = self.pos_to_occluder_id[pos]
+            if isinstance(self.occluders, BlockSnapshot):
+                self.occluders.set_state(oid, 'minecraft:air')
+            else:
+                self.occluders[oid] = (pos, 'minecraft:air', 'transparent', {})
+            self._visible.pop(pos, None)
+        self._candidates = [c for c in self._candidates if c[0] not in broken_set]
+
+        # only targets whose cone contains a broken block can change
+        px, py, pz = (float(v) for v in self.position)
+        affected = []
+        for (tpos, tid) in self._candidates:
+            tymin, tymax, tpmin, tpmax = angular_bounds_for_aabb_nb(make_aabb_from_block(tpos), self.position)
+            tdist = distance_to_block((px, py, pz), (tpos[0] + 0.5, tpos[1] + 0.5, tpos[2] + 0.5))
+            for bpos in broken:
+                bdist = distance_to_block((px, py, pz), (bpos[0] + 0.5, bpos[1] + 0.5, bpos[2] + 0.5))
+                if bdist > tdist + 1.0:
+                    continue
+                bymin, bymax, bpmin, bpmax = angular_bounds_for_aabb_nb(make_aabb_from_block(bpos), self.position)
+                if (bpmax < tpmin) or (bpmin > tpmax):
+                    continue
+                if not yaw_intervals_overlap(bymin, bymax, tymin, tymax):
+                    continue
+                affected.append((tpos, tid))
+                break
 
-        yaw_rad_final = math.atan2(dz, dx)
-        pitch_rad_final = -math.atan2(dy, math.hypot(dx, dz))
-        yaw_deg, pitch_deg = to_minecraft_angles_degrees(yaw_rad_final, pitch_rad_final)
+        self._evaluate(affected)
+        return self.targets
 
-        return TargetInfo(
-            best_candidate['target_pos'],
-            (dx, dy, dz),
-            (yaw_deg, pitch_deg),
-            best_candidate['yaw_bounds'],
-            best_candidate['pitch_bounds']
-        )
+    def _evaluate(self, candidates: List[Tuple[BlockPos, int]]) -> None:
+        # candidates without an open face are hidden; invalidate() re-checks them once a neighbour breaks
+        open_faces, open_boxes = _target_exposure(self.occluders, [tid for (_, tid) in candidates], self.position,
+                                                  self.max_depth)
+        for (tpos, _), faces in zip(candidates, open_faces.tolist()):
+            if not faces:
+                self._visible.pop(tpos, None)
+        open_boxes = [box for box, faces in zip(open_boxes, open_faces.tolist()) if faces]
+        candidates = [c for c, faces in zip(candidates, open_faces.tolist()) if faces]
+        if candidates:
+            adb = get_adb(self.adb_granularity[0], self.adb_granularity[1])
+            target_aabbs = [make_aabb_from_block(tpos) for (tpos, _) in candidates]
+            _rasterize_coarse(adb, self.position, self.occluders, self.pos_to_occluder_id, self.raster_method,
+                              target_aabbs, self.max_depth)
+            get_blockcache().analytic_refine_depth_in_targets_cone(
+                adb=adb,
+                position=self.position,
+                target_aabbs=open_boxes,
+                blocks=self.occluders,
+                max_depth=self.max_depth,
+                yaw_margin_deg=0.5,
+                pitch_margin_deg=0.5,
+                pos_to_occluder_id=self.pos_to_occluder_id,
+            )
+            with instrumentation.stage("aim"):
+                stats = _collect_target_stats(adb, self.position, [tid for (_, tid) in candidates], len(self.occluders))
+                for slot, (tpos, tid) in enumerate(candidates):
+                    info = _target_info_from_stats(adb, self.position, tpos, tid, stats, slot)
+                    if info is None:
+                        self._visible.pop(tpos, None)
+                    else:
+                        self._visible[tpos] = info
+
+        self._rank()
+
+    def _rank(self) -> None:
+        """targets: the visible targets by solid angle, largest first, cut to top_k."""
+        ranked = sorted(self._visible.values(), key=lambda t: t.solid_angle, reverse=True)
+        self.targets = ranked if self.top_k is None else ranked[:self.top_k]
+
+@instrumentation.timed("scan_targets_ranked")
+def scan_targets_ranked(
+    position: Tuple[float, float, float],
+    target_ids: List[str],
+    occluders: Union[BlockSnapshot, List[Tuple[BlockPos, str, str, Optional[Dict[str, Any]]]]],
+    adb_granularity: Tuple[int, int] = (256, 124),
+    top_k: Optional[int] = None,
+    raster_method: str = "auto",
+    reach: Optional[float] = None,
+) -> RankedScan:
+    return RankedScan(position, target_ids, occluders, adb_granularity, top_k, raster_method, reach)
@@ -0,0 +1,277 @@
+"""Ahead-of-time compilation of the scanner kernels.
+
+The first scan of a session otherwise stalls for seconds while numba compiles every kernel for the
+argument types the scripts use. Call start() at script start to load or compile them in a background
+thread, and run
+
+    python -m visibility_scanner.warmup [--force]
+
+once per deployment (or after updating Python, numba or the scanner) to fill the on-disk cache and
+record which signatures it holds, so later sessions only load machine code. It also builds the
+occlusion tables of the scripts' reach for every eye offset.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import platform
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numba as nb
+import numpy as np
+
+from visibility_scanner import scanner
+from visibility_scanner.scanner import BlockPalette, BlockSnapshot, RASTER_METHODS, SCAN_MODES
+
+# ------------------------------
+# consts
+# ------------------------------
+
+# signatures do not depend on the ADB size; a small one keeps the warm-up cheap, and get_adb caches
+# two sizes, so the script's own ADB (with its arena) survives the warm-up
+WARMUP_GRANULARITY = (64, 32)
+WARMUP_REACH = 4.8
+STAMP_FILE = "warmup_stamp.json"
+SIGNATURES_FILE = "warmup_signatures.pkl"
+
+_WARMUP_TARGETS = ("minecraft:deepslate_diamond_ore", "minecraft:iron_ore")
+_WARMUP_BLOCKS = (
+    "minecraft:stone",
+    "minecraft:deepslate[axis=y]",
+    "minecraft:cobbled_deepslate_slab[type=bottom,waterlogged=false]",
+    "minecraft:stone_brick_stairs[facing=east,half=bottom,shape=straight,waterlogged=false]",
+    "minecraft:glass_pane[east=true,north=false,south=false,waterlogged=false,west=true]",
+)
+
+# ------------------------------
+# kernels and cache location
+# ------------------------------
+
+def kernels() -> Dict[str, Any]:
+    """Every numba dispatcher of the scanner (world_scanners only re-exports these), by name."""
+    return {name: obj for name, obj in vars(scanner).items() if isinstance(obj, nb.core.registry.CPUDispatcher)}
+
+def cache_dir() -> str:
+    """Where numba keeps the scanner's compiled kernels (the package __pycache__, NUMBA_CACHE_DIR or a user dir)."""
+    # every cache=True kernel of a module resolves to the same locator; numba has no public accessor for it
+    return scanner.build_bvh_sah_nb._cache._cache_path
+
+def version_stamp() -> Dict[str, str]:
+    """Everything the cached machine code depends on: interpreter, numba/llvmlite/numpy, CPU and scanner source."""
+    import llvmlite
+    import llvmlite.binding as llvm
+
+    with open(scanner.__file__, "rb") as f:
+        source = hashlib.sha256(f.read()).hexdigest()
+    return {
+        "python": sys.version,
+        "implementation": platform.python_implementation(),
+        "numba": nb.__version__,
+        "llvmlite": llvmlite.__version__,
+        "numpy": np.__version__,
+        "cpu": nb.config.CPU_NAME or llvm.get_host_cpu_name(),
+        "scanner_sha256": source,
+    }
+
+def read_stamp() -> Optional[Dict[str, str]]:
+    try:
+        with open(os.path.join(cache_dir(), STAMP_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def cache_is_current() -> bool:
+    stamp = read_stamp()
+    return stamp is not None and stamp.get("version") == version_stamp()
+
+def purge_cache() -> int:
+    """Delete the scanner's cached kernels, including index files left behind by older sources; returns the count."""
+    removed = 0
+    directory = cache_dir()
+    if not os.path.isdir(directory):
+        return 0
+    for name in os.listdir(directory):
+        if (name.startswith("scanner.") and name.endswith((".nbi", ".nbc"))) or name in (STAMP_FILE, SIGNATURES_FILE):
+            os.remove(os.path.join(directory, name))
+            removed += 1
+    tables = scanner.occlusion_table_dir()
+    if os.path.isdir(tables):
+        for name in os.listdir(tables):
+            os.remove(os.path.join(tables, name))
+            removed += 1
+    return removed
+
+# ------------------------------
+# warm-up
+# ------------------------------
+
+def _scene(reach: float):
+    """A small deterministic stand-in for get_area around a tunnel: full cubes, partial blocks and two ores."""
+    eye = (0.5, 1.62, 0.5)
+    positions = scanner._positions_within_reach(eye[0], eye[1], eye[2], float(reach), -90.0, 90.0)
+    x, y, z = positions[:, 0], positions[:, 1], positions[:, 2]
+    kinds = np.asarray(_WARMUP_BLOCKS, dtype=object)[(np.abs(x * 7 + y * 3 + z * 5) % 17).clip(max=len(_WARMUP_BLOCKS) - 1)]
+    names = np.where((z == 0) & ((y == 0) | (y == 1)), "minecraft:air", kinds).astype(object)
+    names[(x == 2) & (y == 1) & (z == 1)] = _WARMUP_TARGETS[0]
+    names[(x == -2) & (y == 2) & (z == -1)] = _WARMUP_TARGETS[1]
+    return eye, BlockSnapshot.from_strings(positions, names.tolist(), BlockPalette())
+
+def warm_up(granularity: Tuple[int, int] = WARMUP_GRANULARITY, reach: float = WARMUP_REACH,
+            thorough: bool = False) -> Dict[str, Any]:
+    """Compile (or load from the on-disk cache) every kernel the scan pipeline reaches.
+
+    Runs scan_target, scan_targets and scan_targets_ranked on a synthetic scene with a private palette and an
+    ADB size the scripts do not use, so it is safe next to a running script. `thorough` also walks every raster
+    method and scan mode. Signatures recorded by a previous save_cache() are compiled explicitly as well, which
+    covers branches the scene did not hit. Returns the wall time and the number of compiled signatures; kernels
+    only called from other kernels are compiled into their callers and have none of their own.
+    """
+    t0 = time.perf_counter()
+    eye, occluders = _scene(reach)
+    target = next(p for p, base, _, _ in occluders if base == _WARMUP_TARGETS[0])
+
+    methods = RASTER_METHODS if thorough else ("auto",)
+    modes = SCAN_MODES if thorough else SCAN_MODES[:1]
+    for method in methods:
+        scanner.scan_target(eye, target, occluders, adb_granularity=granularity, raster_method=method)
+        for mode in modes:
+            scanner.scan_targets(eye, list(_WARMUP_TARGETS), occluders, adb_granularity=granularity,
+                                 mode=mode, raster_method=method)
+        ranked = scanner.scan_targets_ranked(eye, list(_WARMUP_TARGETS), occluders,
+                                             adb_granularity=granularity, raster_method=method)
+        ranked.discard(target)
+    scanner._expand_neighbors(scanner._dda_ray_voxels(*eye, 2.5, 1.5, 1.5), radius=1)  # get_line
+
+    explicit = compile_saved_signatures()
+    table = kernels()
+    return {
+        "seconds": time.perf_counter() - t0,
+        "kernels": len(table),
+        "signatures": sum(len(k.signatures) for k in table.values()),
+        "explicit": explicit,
+    }
+
+def compile_saved_signatures() -> int:
+    """Compile the signatures recorded by save_cache() if the stamp matches; returns how many were compiled."""
+    if not cache_is_current():
+        return 0
+    try:
+        with open(os.path.join(cache_dir(), SIGNATURES_FILE), "rb") as f:
+            saved: Dict[str, List[Tuple[Any, ...]]] = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, AttributeError, ImportError, EOFError):
+        return 0
+    table = kernels()
+    compiled = 0
+    for name, sigs in saved.items():
+        kernel = table.get(name)
+        if kernel is None:
+            continue
+        for sig in sigs:
+            if sig not in kernel.signatures:
+                kernel.compile(sig)
+                compiled += 1
+    return compiled
+
+def build_occlusion_tables(reach: float = WARMUP_REACH) -> int:
+    """Build (or load) the occlusion tables of the get_area stencil of `reach` for every eye bin; returns the count."""
+    stencil_d2 = scanner.stencil_d2_for_reach(reach)
+    bins = range(scanner.OCCLUSION_EYE_BINS)
+    for eye_bin in ((bx, by, bz) for bx in bins for by in bins for bz in bins):
+        scanner.OcclusionTable.load_or_build(scanner.occlusion_table_dir(), stencil_d2, eye_bin)
+    return scanner.OCCLUSION_EYE_BINS ** 3
+
+def save_cache(force: bool = False) -> Dict[str, Any]:
+    """Fill the on-disk cache for every raster method and scan mode and stamp it with the current versions.
+
+    A stale stamp (or `force`) purges the scanner's cache files first, so kernels compiled by an older Python,
+    numba or scanner source do not pile up next to the new ones.
+    """
+    purged = purge_cache() if force or not cache_is_current() else 0
+    result = warm_up(thorough=True)
+    result["tables"] = build_occlusion_tables()
+    directory = cache_dir()
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, SIGNATURES_FILE), "wb") as f:
+        pickle.dump({name: list(k.signatures) for name, k in kernels().items() if k.signatures}, f)
+    with open(os.path.join(directory, STAMP_FILE), "w", encoding="utf-8") as f:
+        json.dump({"time": time.time(), "version": version_stamp(), "signatures": result["signatures"]}, f, indent=2)
+    return {**result, "purged": purged, "cache_dir": directory}
+
+# ------------------------------
+# background start
+# ------------------------------
+
+_thread: Optional[threading.Thread] = None
+_result: Dict[str, Any] = {}
+
+def start(on_done=None) -> threading.Thread:
+    """Warm the kernels up in a daemon thread (once per process); `on_done(result)` is called when it finishes.
+
+    With a current cache stamp only the recorded signatures are compiled, which loads them from disk without
+    running anything. Otherwise the synthetic scene is scanned, which runs parallel kernels next to the
+    script's own; numba's tbb and omp threading layers allow that, but concurrent launches abort the process
+    under the workqueue fallback, so there the scan is skipped and the first scan compiles instead.
+    """
+    global _thread
+    if _thread is not None:
+        return _thread
+
+    def run():
+        try:
+            if cache_is_current():
+                t0 = time.perf_counter()
+                explicit = compile_saved_signatures()
+                _result.update(seconds=time.perf_counter() - t0, kernels=len(kernels()), explicit=explicit,
+                               signatures=sum(len(k.signatures) for k in kernels().values()))
+            elif layer == "workqueue":
+                _result["skipped"] = "stale cache and workqueue threading layer; run python -m visibility_scanner.warmup"
+            else:
+                _result.update(warm_up())
+        except Exception as e:  # a failed warm-up only means the first scan compiles instead
+            _result["error"] = repr(e)
+        if on_done is not None:
+            on_done(dict(_result))
+
+    # start numba's thread pool here: tbb first started from a worker thread hangs at interpreter exit
+    nb.get_num_threads()
+    layer = nb.threading_layer()
+    _thread = threading.Thread(target=run, name="scanner-warmup", daemon=True)
+    _thread.start()
+    return _thread
+
+def wait(timeout: Optional[float] = None) -> bool:
+    """Block until the background warm-up finished; returns False on timeout or if it was never started."""
+    if _thread is None:
+        return False
+    _thread.join(timeout)
+    return not _thread.is_alive()
+
+def result() -> Dict[str, Any]:
+    return dict(_result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the scanner kernels into numba's on-disk cache.")
+    parser.add_argument("--force", action="store_true", help="purge the cached kernels first, even if the stamp matches")
+    parser.add_argument("--check", action="store_true", help="only report whether the cache stamp is current")
+    args = parser.parse_args()
+
+    if args.check:
+        current = cache_is_current()
+        print(f"{cache_dir()}: {'current' if current else 'stale or missing'}")
+        sys.exit(0 if current else 1)
+
+    out = save_cache(force=args.force)
+    print(f"{out['cache_dir']}: {out['signatures']} signatures of {out['kernels']} kernels in {out['seconds']:.1f}s,"
+          f" {out['tables']} occlusion tables ({out['purged']} stale files purged)")
+
+
+if __name__ == "__main__":
+    main()
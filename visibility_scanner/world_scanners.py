@@ -1,39 +1,206 @@
-from visibility_scanner.scanner import BlockPos, _chunk_list, _parse_block_string, _dda_ray_voxels, _expand_neighbors, _positions_within_reach
+from visibility_scanner import instrumentation
+from visibility_scanner.scanner import BlockPos, BlockPalette, BlockSnapshot, get_block_palette, _chunk_list, _parse_block_string, _dda_ray_voxels, _expand_neighbors, _positions_within_reach
 
+import itertools
 import math
+import time
+from functools import lru_cache
 from typing import List, Optional, Tuple, Any, Dict
 
+import numpy as np
 import minescript as m
 
+# ------------------------------
+# block cache
+# ------------------------------
+
+def pack_block_pos(x: int, y: int, z: int) -> int:
+    """Minecraft's BlockPos.asLong layout: 26 bits x, 26 bits z, 12 bits y, as a signed int64."""
+    v = ((x & 0x3FFFFFF) << 38) | ((z & 0x3FFFFFF) << 12) | (y & 0xFFF)
+    return v - (1 << 64) if v >= (1 << 63) else v
+
+def pack_block_positions(positions: np.ndarray) -> np.ndarray:
+    p = np.asarray(positions, dtype=np.int64).reshape((-1, 3))
+    return ((p[:, 0] & 0x3FFFFFF) << 38) | ((p[:, 2] & 0x3FFFFFF) << 12) | (p[:, 1] & 0xFFF)
+
+class BlockCache:
+    """Session-wide block strings keyed by packed block position, with the time each entry was fetched.
+
+    Entries stay valid until invalidated, evicted (oldest first once `max_entries` is exceeded) or older
+    than the `max_age` a read asks for; code that changes the world (attacking, breaking) must invalidate.
+    """
+
+    def __init__(self, max_entries: int = 1 << 16, clock=time.monotonic):
+        self.max_entries = int(max_entries)
+        self.clock = clock
+        self._entries: Dict[int, Tuple[str, float]] = {}  # fetch order, oldest first
+        self.generation = 0  # bumped whenever a cached block may have changed
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _store(self, key: int, bs: str, now: float) -> None:
+        old = self._entries.pop(key, None)
+        if old is not None and old[0] != bs:
+            self.generation += 1
+        self._entries[key] = (bs, now)
+
+    def _evict(self) -> None:
+        excess = len(self._entries) - self.max_entries
+        if excess > 0:
+            for key in list(itertools.islice(self._entries, excess)):
+                del self._entries[key]
+
+    def get(self, x: int, y: int, z: int, max_age: Optional[float] = None) -> str:
+        key = pack_block_pos(int(x), int(y), int(z))
+        now = self.clock()
+        entry = self._entries.get(key)
+        if entry is not None and (max_age is None or now - entry[1] <= max_age):
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        bs = m.getblock(int(x), int(y), int(z))
+        self._store(key, bs, now)
+        self._evict()
+        return bs
+
+    def get_many(self, positions, max_age: Optional[float] = None) -> List[str]:
+        """Block strings of every position, fetching all misses with as few getblocklist calls as possible."""
+        pos_arr = np.asarray(positions, dtype=np.int64).reshape((-1, 3))
+        pos_list = pos_arr.tolist()
+        keys = pack_block_positions(pos_arr).tolist()
+        now = self.clock()
+        entries = self._entries
+        out: List[Optional[str]] = [None] * len(keys)
+        missing: List[int] = []
+        for i, key in enumerate(keys):
+            entry = entries.get(key)
+            if entry is not None and (max_age is None or now - entry[1] <= max_age):
+                out[i] = entry[0]
+            else:
+                missing.append(i)
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+
+        with instrumentation.stage("getblocklist") as st:
+            for chunk in _chunk_list(missing, 1000):
+                for i, bs in zip(chunk, m.getblocklist([pos_list[i] for i in chunk])):
+                    out[i] = bs
+                    self._store(keys[i], bs, now)
+            st.note(blocks=len(missing))
+        self._evict()
+        return out
+
+    def put(self, x: int, y: int, z: int, bs: str) -> None:
+        """Record a block state learned without a query (e.g. from a block-update event)."""
+        self._store(pack_block_pos(int(x), int(y), int(z)), bs, self.clock())
+        self._evict()
+
+    def invalidate(self, positions) -> None:
+        for p in positions:
+            self._entries.pop(pack_block_pos(int(p[0]), int(p[1]), int(p[2])), None)
+        self.generation += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.generation += 1
+
+@lru_cache(maxsize=1)
+def get_block_cache() -> BlockCache:
+    return BlockCache()
+
+
 # ------------------------------
 # user helper functions
 # ------------------------------
 
+@instrumentation.timed("get_area")
 def get_area(position: Tuple[float, float, float],
     reach: float = 4.8,
     pitch_range: Tuple[float, float] = (-90.0, 90.0),
-) -> List[Tuple[BlockPos, str, str, Optional[Dict[str, Any]]]]:
+    palette: Optional[BlockPalette] = None,
+    cache: Optional[BlockCache] = None,
+    max_age: Optional[float] = None,
+) -> BlockSnapshot:
     px, py, pz = position
     pitch_min, pitch_max = pitch_range
+    cache = get_block_cache() if cache is None else cache
     
     pos_arr = _positions_within_reach(px, py, pz, float(reach),
                                       float(pitch_min), float(pitch_max))
-    positions = pos_arr.tolist()  # back to Python list of lists
-    
-    block_strings = []
-    for chunk in _chunk_list(positions, 1000):
-        res = m.getblocklist(list(chunk))
-        block_strings.extend(res)
-
-    out = []
-    for pos, bs in zip(positions, block_strings):
-        base, simple, meta = _parse_block_string(bs)
-        out.append(((pos[0], pos[1], pos[2]), base, simple, meta))
-    return out
+    block_strings = cache.get_many(pos_arr, max_age)
+
+    # each distinct block state is parsed once per session, not once per block
+    return BlockSnapshot.from_strings(pos_arr, block_strings, palette)
+
+def get_blocks(positions,
+    palette: Optional[BlockPalette] = None,
+    cache: Optional[BlockCache] = None,
+    max_age: Optional[float] = None,
+) -> BlockSnapshot:
+    """Snapshot of arbitrary block positions, read through the block cache in one batch."""
+    cache = get_block_cache() if cache is None else cache
+    pos_arr = np.asarray(positions, dtype=np.int64).reshape((-1, 3))
+    return BlockSnapshot.from_strings(pos_arr, cache.get_many(pos_arr, max_age), palette)
+
+class AreaView:
+    """Sliding-window get_area: keeps the last sphere of blocks and only fetches what changed.
+
+    Blocks come from the shared BlockCache, so when the eye enters a new block only the shell of newly
+    reachable positions is fetched; positions passed to mark_dirty (blocks the script attacked or broke)
+    are invalidated there and re-fetched on the next get().
+    """
+
+    def __init__(self,
+        reach: float = 4.8,
+        pitch_range: Tuple[float, float] = (-90.0, 90.0),
+        palette: Optional[BlockPalette] = None,
+        cache: Optional[BlockCache] = None,
+    ):
+        self.reach = float(reach)
+        self.pitch_range = (float(pitch_range[0]), float(pitch_range[1]))
+        self.palette = get_block_palette() if palette is None else palette
+        self.cache = get_block_cache() if cache is None else cache
+        self._snapshot: Optional[BlockSnapshot] = None
+        self._eye_block: Optional[BlockPos] = None
+        self._generation = -1
+        self.last_fetch_count = 0
+
+    def mark_dirty(self, positions) -> None:
+        self.cache.invalidate(positions)
+
+    def reset(self) -> None:
+        self._snapshot = None
+        self._eye_block = None
+
+    @instrumentation.timed("area_view")
+    def get(self, position: Tuple[float, float, float]) -> BlockSnapshot:
+        px, py, pz = position
+        eye_block = (int(math.floor(px)), int(math.floor(py)), int(math.floor(pz)))
+        full_pitch = self.pitch_range == (-90.0, 90.0)
+        # the full-pitch sphere only depends on the eye block, so an unmoved view over an unchanged cache is reused
+        if (full_pitch and eye_block == self._eye_block and self._generation == self.cache.generation
+                and self._snapshot is not None):
+            self.last_fetch_count = 0
+            return self._snapshot
+
+        pos_arr = _positions_within_reach(px, py, pz, self.reach, self.pitch_range[0], self.pitch_range[1])
+        misses = self.cache.misses
+        block_strings = self.cache.get_many(pos_arr)
+        self.last_fetch_count = self.cache.misses - misses
+
+        self._snapshot = BlockSnapshot.from_strings(pos_arr, block_strings, self.palette)
+        self._eye_block = eye_block if full_pitch else None
+        self._generation = self.cache.generation
+        return self._snapshot
 
 def get_line(
     position: Tuple[float, float, float],
-    target: Tuple[float, float, float]
+    target: Tuple[float, float, float],
+    cache: Optional[BlockCache] = None,
+    max_age: Optional[float] = None,
 ) -> List[Tuple[BlockPos, str, str, Optional[Dict[str, Any]]]]:
     px, py, pz = position
     tx, ty, tz = target
@@ -66,9 +233,7 @@ def get_line(
     visited = list(visited_set)
     visited.sort(key=lambda v: ( (v[0]+0.5 - px)**2 + (v[1]+0.5 - py)**2 + (v[2]+0.5 - pz)**2 ))
 
-    block_strings: List[str] = []
-    for chunk in _chunk_list(visited, 1000):
-        block_strings.extend(m.getblocklist(list(chunk)))
+    block_strings = (get_block_cache() if cache is None else cache).get_many(visited, max_age)
 
     out: List[Tuple[BlockPos, str, str, Optional[Dict[str, Any]]]] = []
     for pos, bs in zip(visited, block_strings):